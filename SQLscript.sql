@@ -51,7 +51,9 @@ CREATE TABLE IF NOT EXISTS `route` (
   `Source` VARCHAR(255) NOT NULL,
   `Destination` VARCHAR(255) NOT NULL,
   `Distance` DECIMAL(10,2) NULL,
-  PRIMARY KEY (`RouteID`)
+  PRIMARY KEY (`RouteID`),
+  -- Route lookups by source/destination (date search, timetable refresh)
+  INDEX `idx_route_source_destination` (`Source` ASC, `Destination` ASC) VISIBLE
 ) ENGINE = InnoDB;
 
 -- -----------------------------------------------------
@@ -68,6 +70,10 @@ CREATE TABLE IF NOT EXISTS `schedule` (
   PRIMARY KEY (`ScheduleID`),
   INDEX `fk_schedule_bus1_idx` (`BusID` ASC) VISIBLE,
   INDEX `fk_schedule_route1_idx` (`RouteID` ASC) VISIBLE,
+  -- Departures of a route in date order, without a filesort
+  INDEX `idx_schedule_route_date` (`RouteID` ASC, `DepartureDate` ASC) VISIBLE,
+  -- Archival: oldest departures first
+  INDEX `idx_schedule_departure_date` (`DepartureDate` ASC) VISIBLE,
   CONSTRAINT `fk_schedule_bus1`
     FOREIGN KEY (`BusID`)
     REFERENCES `bus` (`BusID`)
@@ -119,6 +125,78 @@ CREATE TABLE IF NOT EXISTS `booking` (
     ON UPDATE NO ACTION
 ) ENGINE = InnoDB;
 
+-- -----------------------------------------------------
+-- Table `schedule_inventory`
+-- One summary row per schedule (free seats, lowest fare) for searches, so a date-range
+-- search is an index range scan instead of a COUNT over availableseats per schedule.
+-- Kept in step with availableseats by BookSeat, BookSeatForUser and batch bookings;
+-- (re)built for new schedules with RefreshScheduleInventory.
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `schedule_inventory` (
+  `ScheduleID` INT NOT NULL,
+  `RouteID` INT NOT NULL,
+  `CompanyID` INT NOT NULL,
+  `DepartureDate` DATE NOT NULL,
+  `DepartureTime` TIME NOT NULL,
+  `MinPrice` DECIMAL(10,2) NOT NULL, -- lowest fare on the schedule (today: its single price)
+  `FreeSeats` INT NOT NULL,
+  PRIMARY KEY (`ScheduleID`),
+  -- Searches: route + date range in departure order, covering the filter columns
+  INDEX `idx_inventory_route_date` (`RouteID` ASC, `DepartureDate` ASC, `DepartureTime` ASC, `FreeSeats`, `MinPrice`, `CompanyID`) VISIBLE,
+  CONSTRAINT `fk_inventory_schedule`
+    FOREIGN KEY (`ScheduleID`)
+    REFERENCES `schedule` (`ScheduleID`)
+    ON DELETE CASCADE
+    ON UPDATE NO ACTION
+) ENGINE = InnoDB;
+
+-- -----------------------------------------------------
+-- Table `schedule_history`
+-- Cold storage for departed schedules, moved out of `schedule` in batches by archive.py so the
+-- live tables only hold departures that can still be booked. Route, bus and company are copied
+-- in, and there are no foreign keys, so history survives later changes to those tables.
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `schedule_history` (
+  `ScheduleID` INT NOT NULL,
+  `BusID` INT NOT NULL,
+  `RouteID` INT NOT NULL,
+  `Source` VARCHAR(255) NOT NULL,
+  `Destination` VARCHAR(255) NOT NULL,
+  `BusNumber` VARCHAR(20) NOT NULL,
+  `CompanyName` VARCHAR(255) NOT NULL,
+  `DepartureDate` DATE NOT NULL,
+  `DepartureTime` TIME NOT NULL,
+  `ArrivalTime` TIME NOT NULL,
+  `Price` DECIMAL(10,2) NOT NULL,
+  `SeatCapacity` INT NOT NULL,
+  `SeatsBooked` INT NOT NULL,
+  `ArchivedAt` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`ScheduleID`),
+  INDEX `idx_schedule_history_date` (`DepartureDate` ASC) VISIBLE,
+  INDEX `idx_schedule_history_route` (`Source` ASC, `Destination` ASC, `DepartureDate` ASC) VISIBLE
+) ENGINE = InnoDB ROW_FORMAT = COMPRESSED KEY_BLOCK_SIZE = 8;
+
+-- -----------------------------------------------------
+-- Table `booking_history`
+-- Bookings of archived schedules, same columns as `booking`.
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `booking_history` (
+  `BookingID` INT NOT NULL,
+  `ScheduleID` INT NOT NULL,
+  `UserID` INT NOT NULL,
+  `SeatNumber` INT NOT NULL,
+  `BookingDate` TIMESTAMP NOT NULL,
+  PRIMARY KEY (`BookingID`),
+  INDEX `idx_booking_history_schedule` (`ScheduleID` ASC) VISIBLE,
+  INDEX `idx_booking_history_user` (`UserID` ASC) VISIBLE
+) ENGINE = InnoDB ROW_FORMAT = COMPRESSED KEY_BLOCK_SIZE = 8;
+
+-- Every booking, live or archived (reporting only; the app reads `booking`)
+CREATE OR REPLACE VIEW `booking_all` AS
+  SELECT `BookingID`, `ScheduleID`, `UserID`, `SeatNumber`, `BookingDate` FROM `booking`
+  UNION ALL
+  SELECT `BookingID`, `ScheduleID`, `UserID`, `SeatNumber`, `BookingDate` FROM `booking_history`;
+
 
 --
 -- Data for table `user`
@@ -153,12 +231,14 @@ INSERT INTO `route` (`Source`, `Destination`, `Distance`) VALUES
 
 --
 -- Data for table `schedule`
+-- (sample only: load full timetables, with their seats and inventory, with bulk_loader.py)
+-- Dated relative to the day the script runs: the app only lists departures from today on.
 --
 INSERT INTO `schedule` (`BusID`, `RouteID`, `DepartureDate`, `DepartureTime`, `ArrivalTime`, `Price`) VALUES
-(1, 1, '2025-07-15', '08:00:00', '13:00:00', 45.00),
-(2, 1, '2025-07-15', '10:00:00', '15:30:00', 40.00),
-(3, 2, '2025-07-16', '09:00:00', '17:00:00', 75.50),
-(1, 3, '2025-07-17', '22:00:00', '10:00:00', 120.00);
+(1, 1, CURDATE() + INTERVAL 1 DAY, '08:00:00', '13:00:00', 45.00),
+(2, 1, CURDATE() + INTERVAL 1 DAY, '10:00:00', '15:30:00', 40.00),
+(3, 2, CURDATE() + INTERVAL 2 DAY, '09:00:00', '17:00:00', 75.50),
+(1, 3, CURDATE() + INTERVAL 3 DAY, '22:00:00', '10:00:00', 120.00);
 
 --
 -- Data for table `availableseats`
@@ -218,9 +298,11 @@ BEGIN
         s.ArrivalTime,
         s.Price,
         b.SeatCapacity,
-        (SELECT COUNT(*) FROM availableseats WHERE ScheduleID = s.ScheduleID) AS AvailableSeatsCount
+        i.FreeSeats AS AvailableSeatsCount
     FROM
         schedule s
+    JOIN
+        schedule_inventory i ON i.ScheduleID = s.ScheduleID
     JOIN
         bus b ON s.BusID = b.BusID
     JOIN
@@ -229,8 +311,7 @@ BEGIN
         route r ON s.RouteID = r.RouteID
     WHERE
         r.Source = p_source AND r.Destination = p_destination AND s.DepartureDate = p_travel_date
-    HAVING
-        AvailableSeatsCount > 0; -- Only show schedules with available seats
+        AND i.FreeSeats > 0; -- Only show schedules with available seats
 END //
 
 DELIMITER ;
@@ -246,11 +327,19 @@ CREATE PROCEDURE BookSeat(
     IN p_user_id INT
 )
 BEGIN
+    DECLARE v_available INT DEFAULT 0;
+
     -- Start a transaction
     START TRANSACTION;
 
-    -- Check if the seat is available
-    IF EXISTS (SELECT 1 FROM availableseats WHERE ScheduleID = p_schedule_id AND SeatNumber = p_seat_number) THEN
+    -- Check if the seat is available, locking its row so that concurrent
+    -- bookings of the same seat wait here instead of both booking it
+    SELECT COUNT(*) INTO v_available
+    FROM availableseats
+    WHERE ScheduleID = p_schedule_id AND SeatNumber = p_seat_number
+    FOR UPDATE;
+
+    IF v_available > 0 THEN
         -- Insert into booking table
         INSERT INTO booking (ScheduleID, UserID, SeatNumber, BookingDate)
         VALUES (p_schedule_id, p_user_id, p_seat_number, NOW());
@@ -259,6 +348,10 @@ BEGIN
         DELETE FROM availableseats
         WHERE ScheduleID = p_schedule_id AND SeatNumber = p_seat_number;
 
+        -- Keep the search summary in step, in the same transaction
+        UPDATE schedule_inventory SET FreeSeats = FreeSeats - 1
+        WHERE ScheduleID = p_schedule_id;
+
         -- Commit the transaction
         COMMIT;
     ELSE
@@ -270,6 +363,98 @@ END //
 
 DELIMITER ;
 
+--
+-- Stored Procedure: BookSeatForUser
+-- The whole booking form submission in one call: registers the user if needed, books the
+-- seat like BookSeat and returns the booked schedule's details as a single result set.
+-- p_register_user / p_return_details let the caller skip the steps it has cached.
+--
+DELIMITER //
+
+CREATE PROCEDURE BookSeatForUser(
+    IN p_schedule_id INT,
+    IN p_seat_number INT,
+    IN p_user_id INT,
+    IN p_register_user BOOLEAN,
+    IN p_return_details BOOLEAN
+)
+BEGIN
+    DECLARE v_available INT DEFAULT 0;
+
+    START TRANSACTION;
+
+    -- Auto-register unknown users with placeholder details; an existing UserID is left as is
+    IF p_register_user THEN
+        INSERT INTO user (UserID, FirstName, LastName, Email, PhoneNumber, Password)
+        VALUES (p_user_id, CONCAT('NewUser_', p_user_id), 'Auto', CONCAT('user_', p_user_id, '@example.com'),
+                '000-000-0000', 'password')
+        ON DUPLICATE KEY UPDATE UserID = UserID;
+    END IF;
+
+    SELECT COUNT(*) INTO v_available
+    FROM availableseats
+    WHERE ScheduleID = p_schedule_id AND SeatNumber = p_seat_number
+    FOR UPDATE;
+
+    IF v_available > 0 THEN
+        INSERT INTO booking (ScheduleID, UserID, SeatNumber, BookingDate)
+        VALUES (p_schedule_id, p_user_id, p_seat_number, NOW());
+
+        DELETE FROM availableseats
+        WHERE ScheduleID = p_schedule_id AND SeatNumber = p_seat_number;
+
+        UPDATE schedule_inventory SET FreeSeats = FreeSeats - 1
+        WHERE ScheduleID = p_schedule_id;
+
+        COMMIT;
+
+        IF p_return_details THEN
+            SELECT
+                s.ScheduleID,
+                b.BusNumber,
+                bc.CompanyName,
+                s.DepartureTime,
+                s.ArrivalTime,
+                s.Price,
+                r.Distance,
+                s.DepartureDate,
+                r.Source,
+                r.Destination
+            FROM schedule s
+            JOIN route r ON s.RouteID = r.RouteID
+            JOIN bus b ON s.BusID = b.BusID
+            JOIN buscompany bc ON b.CompanyID = bc.CompanyID
+            WHERE s.ScheduleID = p_schedule_id;
+        END IF;
+    ELSE
+        ROLLBACK;
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Seat not available or already booked.';
+    END IF;
+END //
+
+DELIMITER ;
+
+--
+-- Stored Procedure: RefreshScheduleInventory
+-- Rebuilds the schedule_inventory row of one schedule (or of every schedule when NULL)
+-- from schedule, bus and availableseats. Run it after adding schedules or seats directly.
+--
+DELIMITER //
+
+CREATE PROCEDURE RefreshScheduleInventory(
+    IN p_schedule_id INT
+)
+BEGIN
+    REPLACE INTO schedule_inventory (ScheduleID, RouteID, CompanyID, DepartureDate, DepartureTime, MinPrice, FreeSeats)
+    SELECT s.ScheduleID, s.RouteID, b.CompanyID, s.DepartureDate, s.DepartureTime, s.Price,
+           (SELECT COUNT(*) FROM availableseats a WHERE a.ScheduleID = s.ScheduleID)
+    FROM schedule s
+    JOIN bus b ON s.BusID = b.BusID
+    WHERE p_schedule_id IS NULL OR s.ScheduleID = p_schedule_id;
+END //
+
+DELIMITER ;
+
 
 -- After a booking, you would typically remove the seat from `availableseats`
 -- These are here for initial data setup, but the BookSeat procedure handles this for new bookings.
@@ -277,9 +462,12 @@ DELETE FROM `availableseats` WHERE `ScheduleID` = 1 AND `SeatNumber` = 10;
 DELETE FROM `availableseats` WHERE `ScheduleID` = 1 AND `SeatNumber` = 11;
 DELETE FROM `availableseats` WHERE `ScheduleID` = 3 AND `SeatNumber` = 5;
 
+-- Build the search summary for the sample schedules
+CALL RefreshScheduleInventory(NULL);
+
 -- Trying the call function with sample data entered
-CALL FindAvailableBuses('New York', 'Boston', '2025-07-15');
-CALL FindAvailableBuses('Los Angeles', 'San Francisco', '2025-07-16');
+CALL FindAvailableBuses('New York', 'Boston', CURDATE() + INTERVAL 1 DAY);
+CALL FindAvailableBuses('Los Angeles', 'San Francisco', CURDATE() + INTERVAL 2 DAY);
 
 -- Before running BookSeat, let's verify current available seats for a schedule
 SELECT * FROM availableseats WHERE ScheduleID = 1;
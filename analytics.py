@@ -0,0 +1,255 @@
+import csv
+import io
+import itertools
+import json
+from array import array
+from datetime import date, datetime
+from decimal import Decimal
+
+from modules import ConnectDB
+
+try:
+    import numpy
+except ImportError:  # optional: per-group sums fall back to array-backed columns and Python loops
+    numpy = None
+
+REPORTS = ("occupancy", "lead_time", "bookings")
+
+# group_by dimensions and the columns their keys are made of
+DIMENSIONS = {
+    "route": ("Source", "Destination"),
+    "company": ("CompanyName",),
+    "date": ("DepartureDate",),
+}
+
+# Lead time histogram: (first day, last day or None, label)
+LEAD_TIME_BUCKETS = ((0, 0, "0"), (1, 1, "1"), (2, 3, "2-3"), (4, 7, "4-7"), (8, 14, "8-14"),
+                     (15, 30, "15-30"), (31, 60, "31-60"), (61, 90, "61-90"), (91, None, "91+"))
+_BUCKET_STARTS = [first for first, _, _ in LEAD_TIME_BUCKETS]
+
+
+def parse_group_by(value):
+    """
+    Parses a comma-separated list of DIMENSIONS ('route', 'company,date', ...) into a tuple.
+    An empty value groups everything into one row. Raises ValueError for unknown dimensions.
+    """
+    dimensions = tuple(part.strip() for part in (value or "").split(",") if part.strip())
+    unknown = [dimension for dimension in dimensions if dimension not in DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unknown group_by {', '.join(unknown)}; use {', '.join(DIMENSIONS)}.")
+    return dimensions
+
+
+def _key_columns(group_by):
+    return [column for dimension in group_by for column in DIMENSIONS[dimension]]
+
+
+def _key_function(row_columns, group_by):
+    # Returns row -> group key (a tuple of strings) for rows laid out as row_columns
+    positions = [row_columns.index(column) for column in _key_columns(group_by)]
+    if not positions:
+        return lambda row: ()
+    return lambda row: tuple(str(row[position]) for position in positions)
+
+
+def _cents(price):
+    return int(Decimal(price) * 100)
+
+
+class GroupTotals:
+    def __init__(self, names):
+        """
+        Row counts and sums of the numeric columns `names` per group, fed one chunk at a time.
+
+        Group keys are mapped to dense integer codes once; each chunk's values are then summed
+        per code with numpy.bincount (or array-backed loops without numpy), so memory grows with
+        the number of groups, never with the number of rows streamed through.
+        """
+        self.names = names
+        self.codes = {}  # group key -> code
+        if numpy is not None:
+            self.counts = numpy.zeros(16, dtype=numpy.int64)
+            self.sums = [numpy.zeros(16, dtype=numpy.float64) for _ in names]
+        else:
+            self.counts = array('q')
+            self.sums = [array('d') for _ in names]
+
+    def add(self, keys, columns):
+        """
+        Adds one chunk: keys[i] is the group of row i and columns[n][i] its value of names[n].
+        """
+        codes = self.codes
+        row_codes = [codes.setdefault(key, len(codes)) for key in keys]
+        size = len(codes)
+        if numpy is not None:
+            self._grow(size)
+            row_codes = numpy.asarray(row_codes, dtype=numpy.int64)
+            self.counts[:size] += numpy.bincount(row_codes, minlength=size)
+            for sums, values in zip(self.sums, columns):
+                sums[:size] += numpy.bincount(row_codes, weights=numpy.asarray(values, dtype=numpy.float64), minlength=size)
+            return
+        missing = size - len(self.counts)
+        if missing > 0:
+            self.counts.extend([0] * missing)
+            for sums in self.sums:
+                sums.extend([0.0] * missing)
+        counts = self.counts
+        for code in row_codes:
+            counts[code] += 1
+        for sums, values in zip(self.sums, columns):
+            for code, value in zip(row_codes, values):
+                sums[code] += value
+
+    def _grow(self, size):
+        capacity = len(self.counts)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        counts = numpy.zeros(capacity, dtype=numpy.int64)
+        counts[:len(self.counts)] = self.counts
+        self.counts = counts
+        for index, sums in enumerate(self.sums):
+            grown = numpy.zeros(capacity, dtype=numpy.float64)
+            grown[:len(sums)] = sums
+            self.sums[index] = grown
+
+    def items(self):
+        """
+        Yields (key, count, {name: sum}) for every group, ordered by key.
+        """
+        for key, code in sorted(self.codes.items()):
+            yield key, int(self.counts[code]), {name: float(sums[code]) for name, sums in zip(self.names, self.sums)}
+
+
+def occupancy(chunks, group_by):
+    """
+    Load factor and revenue per group from iter_schedule_occupancy() chunks.
+    Returns (columns, rows).
+    """
+    row_columns = ConnectDB.SCHEDULE_OCCUPANCY_COLUMNS
+    key = _key_function(row_columns, group_by)
+    price, capacity, booked = (row_columns.index(name) for name in ("Price", "SeatCapacity", "SeatsBooked"))
+    totals = GroupTotals(("seats", "booked", "revenue_cents"))
+    for rows in chunks:
+        totals.add([key(row) for row in rows], (
+            [row[capacity] for row in rows],
+            [row[booked] for row in rows],
+            [row[booked] * _cents(row[price]) for row in rows],
+        ))
+
+    columns = _key_columns(group_by) + ["Schedules", "Seats", "SeatsBooked", "LoadFactor", "Revenue"]
+    result = []
+    for group, schedules, sums in totals.items():
+        seats, booked_seats = int(sums["seats"]), int(sums["booked"])
+        load_factor = round(booked_seats / seats, 4) if seats else 0.0
+        result.append(list(group) + [schedules, seats, booked_seats, load_factor, f"{sums['revenue_cents'] / 100:.2f}"])
+    return columns, result
+
+
+def _lead_time_buckets(lead_days):
+    # Bucket index of every lead time (negative lead times, booked after departure, go in the first)
+    if numpy is not None:
+        return numpy.maximum(numpy.searchsorted(_BUCKET_STARTS, lead_days, side="right") - 1, 0)
+    return [max(_bucket_index(days), 0) for days in lead_days]
+
+
+def _bucket_index(days):
+    index = len(_BUCKET_STARTS) - 1
+    while index > 0 and days < _BUCKET_STARTS[index]:
+        index -= 1
+    return index
+
+
+def lead_time(chunks, group_by):
+    """
+    Distribution of booking lead times (days between booking and departure) per group from
+    iter_booking_facts() chunks: bookings, mean lead time and one count per LEAD_TIME_BUCKETS.
+    Returns (columns, rows).
+    """
+    row_columns = ConnectDB.BOOKING_FACT_COLUMNS
+    key = _key_function(row_columns, group_by)
+    lead = row_columns.index("LeadDays")
+    totals = GroupTotals(("lead_days",) + tuple(label for _, _, label in LEAD_TIME_BUCKETS))
+    for rows in chunks:
+        lead_days = [row[lead] or 0 for row in rows]
+        buckets = _lead_time_buckets(lead_days)
+        if numpy is not None:
+            indicators = [buckets == index for index in range(len(LEAD_TIME_BUCKETS))]
+        else:
+            indicators = [[bucket == index for bucket in buckets] for index in range(len(LEAD_TIME_BUCKETS))]
+        totals.add([key(row) for row in rows], [lead_days] + indicators)
+
+    labels = [label for _, _, label in LEAD_TIME_BUCKETS]
+    columns = _key_columns(group_by) + ["Bookings", "MeanLeadDays"] + [f"Days_{label}" for label in labels]
+    result = []
+    for group, bookings, sums in totals.items():
+        mean = round(sums["lead_days"] / bookings, 2) if bookings else 0.0
+        result.append(list(group) + [bookings, mean] + [int(sums[label]) for label in labels])
+    return columns, result
+
+
+def _plain(value):
+    # Database values as CSV/JSON friendly scalars
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def bookings(chunks):
+    """
+    Every booking row from iter_booking_facts() chunks, passed through one chunk at a time.
+    Returns (columns, row chunks).
+    """
+    return list(ConnectDB.BOOKING_FACT_COLUMNS), ([[_plain(value) for value in row] for row in rows] for rows in chunks)
+
+
+def run_report(conn, report, start_date, end_date, group_by=("route",), chunk_size=5000):
+    """
+    Runs one of REPORTS over schedules departing between start_date and end_date with the
+    ConnectDB `conn`. Returns (columns, row chunks): aggregated reports read the whole stream
+    first and come back as a single chunk, 'bookings' streams as it is read. Either way the
+    query has run by the time this returns, so connection and query errors are raised here.
+    """
+    if report == "occupancy":
+        columns, rows = occupancy(conn.iter_schedule_occupancy(start_date, end_date, chunk_size), group_by)
+        return columns, iter([rows])
+    if report == "lead_time":
+        columns, rows = lead_time(conn.iter_booking_facts(start_date, end_date, chunk_size), group_by)
+        return columns, iter([rows])
+    if report == "bookings":
+        columns, chunks = bookings(conn.iter_booking_facts(start_date, end_date, chunk_size))
+        first = next(chunks, None)
+        return columns, itertools.chain([] if first is None else [first], chunks)
+    raise ValueError(f"Unknown report {report}; use {', '.join(REPORTS)}.")
+
+
+def to_csv(columns, chunks):
+    """
+    Yields the report as CSV text, a header line then one string per chunk of rows.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    for rows in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue()
+
+
+def to_jsonl(columns, chunks):
+    """
+    Yields the report as JSON lines (one object per row), one string per chunk of rows.
+    """
+    for rows in chunks:
+        yield "".join(json.dumps(dict(zip(columns, row)), separators=(",", ":")) + "\n" for row in rows)
+
+
+FORMATS = {
+    "csv": (to_csv, "text/csv"),
+    "jsonl": (to_jsonl, "application/x-ndjson"),
+}
@@ -1,10 +1,381 @@
+import os
+import base64
+import json
+import time
+import analytics
+import instrumentation
+from decimal import Decimal, InvalidOperation
+from contextlib import nullcontext
 from modules import ConnectDB
-from flask import Flask, request, render_template, jsonify
+from cache import LRUCache
+from http_cache import ResponseCache
+from pool import ConnectionPool
+from topology import ReplicaSet, parse_replicas
+from statements import StatementRegistry
+from seat_cache import SeatMapCache
+from shared_seats import SharedSeatMapCache
+from timetable import TimetableIndex
+from journeys import JourneyPlanner
+from booking_engine import SeatHoldStore, BookingEngine, BookingError
+from group_commit import GroupCommitQueue
+from overload import AdmissionController, CircuitBreaker, OverloadError, HIGH, NORMAL, LOW
+from pubsub import SeatUpdateBroker, sse_message, SSE_KEEPALIVE
+from flask import Flask, request, render_template, jsonify, g, Response
 from logger import logging
-from datetime import date 
+from datetime import date, datetime, timedelta
 
 app = Flask(__name__)
 
+# Process-wide connection pool shared by every request. Sizes and timeouts can be tuned
+# through environment variables without touching the code.
+db_pool_settings = dict(
+    user=os.environ.get('DB_USER', 'root'),
+    password=os.environ.get('DB_PASSWORD', '0000'),
+    database=os.environ.get('DB_NAME', 'bus_booking_system'),
+    pool_size=int(os.environ.get('DB_POOL_SIZE', 5)),
+    max_overflow=int(os.environ.get('DB_POOL_MAX_OVERFLOW', 10)),
+    timeout=float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+    recycle=int(os.environ.get('DB_POOL_RECYCLE', 3600)),
+    pre_ping=os.environ.get('DB_POOL_PRE_PING', '1') == '1',
+)
+db_pool = ConnectionPool.for_mysql(
+    host=os.environ.get('DB_HOST', 'localhost'),
+    port=int(os.environ.get('DB_PORT', 3306)),
+    **db_pool_settings,
+)
+app.extensions['db_pool'] = db_pool
+
+# Circuit breaker on getting a primary connection: after DB_CIRCUIT_FAILURES consecutive connect
+# errors or pool timeouts, requests fail fast for DB_CIRCUIT_RESET_SECONDS, then a probe request
+# is let through (DB_CIRCUIT_FAILURES=0 turns it off). Read APIs serve their last cached responses
+# meanwhile.
+db_breaker = None
+if int(os.environ.get('DB_CIRCUIT_FAILURES', 5)) > 0:
+    db_breaker = CircuitBreaker(
+        failure_threshold=int(os.environ.get('DB_CIRCUIT_FAILURES', 5)),
+        reset_timeout=float(os.environ.get('DB_CIRCUIT_RESET_SECONDS', 10)),
+        half_open_probes=int(os.environ.get('DB_CIRCUIT_HALF_OPEN_PROBES', 1)),
+    )
+app.extensions['db_breaker'] = db_breaker
+
+# Optional read replicas (DB_REPLICAS=host:port,...), each with a pool configured like the one
+# above. Read-only queries are spread over them; writes and the reads of a session that has just
+# booked (for DB_READ_YOUR_WRITES_SECONDS) go to the primary.
+db_replicas = None
+if os.environ.get('DB_REPLICAS'):
+    db_replicas = ReplicaSet(
+        [(name, ConnectionPool.for_mysql(host=host, port=port, **db_pool_settings))
+         for name, host, port in parse_replicas(os.environ['DB_REPLICAS'])],
+        strategy=os.environ.get('DB_REPLICA_STRATEGY', 'round_robin'),
+        max_lag_seconds=float(os.environ.get('DB_REPLICA_MAX_LAG_SECONDS', 5)),
+        check_interval=float(os.environ.get('DB_REPLICA_CHECK_SECONDS', 5)),
+        sticky_seconds=int(os.environ.get('DB_READ_YOUR_WRITES_SECONDS', 10)),
+    )
+    db_replicas.start()
+app.extensions['db_replicas'] = db_replicas
+READ_YOUR_WRITES_COOKIE = 'db_primary_until'
+
+# Opt-in server-side prepared statements for the read queries (DB_PREPARED_STATEMENTS=1)
+statement_registry = None
+if os.environ.get('DB_PREPARED_STATEMENTS', '0') == '1':
+    statement_registry = StatementRegistry(max_statements=int(os.environ.get('DB_PREPARED_STATEMENTS_PER_CONNECTION', 64)))
+app.extensions['statements'] = statement_registry
+
+# Seat maps of hot schedules, kept as bitmaps and updated whenever book_seat commits
+# With SEAT_SHM_NAME set, the maps live in shared memory, one copy for all worker processes
+if os.environ.get('SEAT_SHM_NAME'):
+    seat_cache = SharedSeatMapCache(
+        os.environ['SEAT_SHM_NAME'],
+        slots=int(os.environ.get('SEAT_SHM_SLOTS', 4096)),
+        max_seats=int(os.environ.get('SEAT_SHM_MAX_SEATS', 128)),
+    )
+else:
+    seat_cache = SeatMapCache(max_entries=int(os.environ.get('SEAT_CACHE_SIZE', 1024)))
+app.extensions['seat_cache'] = seat_cache
+
+# Serialized /api/available_dates and /api/available_seats responses with versioned ETags
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get('HTTP_CACHE_SIZE', 2048)),
+    compress_min_bytes=int(os.environ.get('HTTP_COMPRESS_MIN_BYTES', 1024)),
+)
+app.extensions['response_cache'] = response_cache
+
+# Departure dates per (source, destination), served from memory by /api/available_dates
+timetable = TimetableIndex(refresh_interval=int(os.environ.get('TIMETABLE_REFRESH_SECONDS', 60)),
+                           on_change=response_cache.on_timetable_change)
+app.extensions['timetable'] = timetable
+
+# UserIDs known to exist and schedule details, so a booking is usually a single CALL
+user_cache = LRUCache(max_entries=int(os.environ.get('USER_CACHE_SIZE', 10000)))
+app.extensions['user_cache'] = user_cache
+schedule_cache = LRUCache(max_entries=int(os.environ.get('SCHEDULE_CACHE_SIZE', 4096)))
+app.extensions['schedule_cache'] = schedule_cache
+
+# Pushes seat deltas to everyone viewing a schedule (see /api/seat_updates)
+seat_broker = SeatUpdateBroker(max_pending=int(os.environ.get('SEAT_STREAM_MAX_PENDING', 100)))
+app.extensions['seat_broker'] = seat_broker
+seat_broker.add_listener(response_cache.on_seat_event)
+SEAT_STREAM_HEARTBEAT_SECONDS = float(os.environ.get('SEAT_STREAM_HEARTBEAT_SECONDS', 15))
+
+# Route graph for multi-leg journeys (see /api/journeys); free seats follow the booking events
+journey_planner = JourneyPlanner(
+    refresh_interval=int(os.environ.get('JOURNEY_REFRESH_SECONDS', 60)),
+    min_transfer_minutes=int(os.environ.get('JOURNEY_MIN_TRANSFER_MINUTES', 15)),
+    max_legs=int(os.environ.get('JOURNEY_MAX_LEGS', 3)),
+    search_window_hours=int(os.environ.get('JOURNEY_SEARCH_HOURS', 48)),
+)
+seat_broker.add_listener(journey_planner.on_seat_event)
+app.extensions['journey_planner'] = journey_planner
+
+# Bookings made by other worker processes reach this one's seat streams and caches
+if isinstance(seat_cache, SharedSeatMapCache):
+    seat_cache.start_watcher(seat_broker.publish, interval=float(os.environ.get('SEAT_SHM_POLL_MS', 50)) / 1000,
+                             on_lost=response_cache.bump_all)
+
+# Seat holds taken while a user fills in the form, and the booking flow that honours them
+booking_engine = BookingEngine(SeatHoldStore(ttl=int(os.environ.get('SEAT_HOLD_TTL_SECONDS', 300))))
+app.extensions['booking_engine'] = booking_engine
+
+# Asynchronous bookings (/api/book_async) applied in groups, one commit per group
+def group_commit_connection():
+    return ConnectDB(
+        pool=app.extensions['db_pool'],
+        seat_cache=app.extensions['seat_cache'],
+        broker=app.extensions['seat_broker'],
+        user_cache=app.extensions['user_cache'],
+        breaker=app.extensions['db_breaker'],
+    )
+
+group_commit = GroupCommitQueue(
+    group_commit_connection,
+    max_batch=int(os.environ.get('GROUP_COMMIT_MAX_BATCH', 64)),
+    max_wait=float(os.environ.get('GROUP_COMMIT_MAX_WAIT_MS', 2)) / 1000,
+    workers=int(os.environ.get('GROUP_COMMIT_WORKERS', 1)),
+    max_pending=int(os.environ.get('GROUP_COMMIT_MAX_PENDING', 10000)),
+    ticket_ttl=int(os.environ.get('BOOKING_TICKET_TTL_SECONDS', 300)),
+)
+app.extensions['group_commit'] = group_commit
+BOOKING_TICKET_MAX_WAIT_SECONDS = float(os.environ.get('BOOKING_TICKET_MAX_WAIT_SECONDS', 30))
+
+# Analytics exports (/api/analytics/<report>) stream long queries on a small pool of their own,
+# so a running export never holds a connection the booking path is waiting for. Reads go to the
+# replicas when there are any. When all ANALYTICS_MAX_CONCURRENT connections are busy, further
+# exports wait ANALYTICS_QUEUE_TIMEOUT seconds and are then refused with 503.
+analytics_pool = ConnectionPool.for_mysql(
+    host=os.environ.get('DB_HOST', 'localhost'),
+    port=int(os.environ.get('DB_PORT', 3306)),
+    **dict(db_pool_settings,
+           pool_size=int(os.environ.get('ANALYTICS_MAX_CONCURRENT', 1)),
+           max_overflow=0,
+           timeout=float(os.environ.get('ANALYTICS_QUEUE_TIMEOUT', 5))),
+)
+app.extensions['analytics_pool'] = analytics_pool
+ANALYTICS_CHUNK_SIZE = int(os.environ.get('ANALYTICS_CHUNK_SIZE', 5000))
+ANALYTICS_DEFAULT_DAYS = int(os.environ.get('ANALYTICS_DEFAULT_DAYS', 30))
+
+# Admission control: at most ADMISSION_MAX_CONCURRENT requests to the routes in ADMISSION_RULES are
+# worked on at once (0 turns it off). Bookings may use every slot, ordinary reads 80% of them and
+# seat map polls and exports half, so under load the polls are shed first. A request waits for a
+# slot at most ADMISSION_QUEUE_MS_HIGH/NORMAL/LOW milliseconds, then gets a 503. ADMISSION_GROUP_LIMITS
+# ("seat_map=16,read=32") caps groups on their own.
+ADMISSION_RULES = {
+    ('/', 'POST'): ('booking', HIGH),
+    ('/api/book_batch', 'POST'): ('booking', HIGH),
+    ('/api/holds', 'POST'): ('booking', HIGH),
+    ('/api/holds/<token>/confirm', 'POST'): ('booking', HIGH),
+    ('/api/book_async', 'POST'): ('booking', HIGH),
+    ('/api/available_dates', 'GET'): ('read', NORMAL),
+    ('/api/search', 'GET'): ('read', NORMAL),
+    ('/api/journeys', 'GET'): ('read', NORMAL),
+    ('/api/available_seats', 'GET'): ('seat_map', LOW),
+    ('/api/seat_updates', 'GET'): ('seat_map', LOW),
+    ('/api/analytics/<report>', 'GET'): ('analytics', LOW),
+}
+ADMISSION_RETRY_AFTER_SECONDS = 1
+
+def parse_group_limits(value):
+    # "seat_map=16,read=32" -> {'seat_map': 16, 'read': 32}
+    limits = {}
+    for part in filter(None, (part.strip() for part in value.split(','))):
+        group, _, limit = part.partition('=')
+        limits[group.strip()] = int(limit)
+    return limits
+
+admission = None
+if int(os.environ.get('ADMISSION_MAX_CONCURRENT', 64)) > 0:
+    admission = AdmissionController(
+        max_concurrent=int(os.environ.get('ADMISSION_MAX_CONCURRENT', 64)),
+        group_limits=parse_group_limits(os.environ.get('ADMISSION_GROUP_LIMITS', '')),
+        queue_timeouts={
+            HIGH: float(os.environ.get('ADMISSION_QUEUE_MS_HIGH', 5000)) / 1000,
+            NORMAL: float(os.environ.get('ADMISSION_QUEUE_MS_NORMAL', 1000)) / 1000,
+            LOW: float(os.environ.get('ADMISSION_QUEUE_MS_LOW', 250)) / 1000,
+        },
+    )
+app.extensions['admission'] = admission
+
+# Last successful /api/search result per query, served (marked "stale") while the database is unreachable
+last_known_searches = LRUCache(max_entries=int(os.environ.get('STALE_SEARCH_CACHE_SIZE', 1024)))
+app.extensions['last_known_searches'] = last_known_searches
+
+# Upper bound on the number of seats accepted by one /api/book_batch request
+MAX_BATCH_SEATS = int(os.environ.get('MAX_BATCH_SEATS', 100))
+
+# /api/search limits: widest date range and page sizes
+SEARCH_MAX_DAYS = int(os.environ.get('SEARCH_MAX_DAYS', 92))
+SEARCH_PAGE_SIZE = int(os.environ.get('SEARCH_PAGE_SIZE', 20))
+SEARCH_MAX_PAGE_SIZE = int(os.environ.get('SEARCH_MAX_PAGE_SIZE', 100))
+
+# Opt-in cProfile dumps (logs/profiles/*.prof) of requests slower than PROFILE_SLOW_REQUESTS_MS
+PROFILE_SLOW_REQUESTS_MS = float(os.environ.get('PROFILE_SLOW_REQUESTS_MS', 0))
+slow_request_profiler = None
+if PROFILE_SLOW_REQUESTS_MS > 0:
+    slow_request_profiler = instrumentation.SlowRequestProfiler(
+        PROFILE_SLOW_REQUESTS_MS, sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', 1.0)))
+
+def get_db():
+    """
+    Returns the ConnectDB bound to the current request, creating it on first use.
+    The underlying connection is borrowed lazily and returned to the pool on teardown.
+    """
+    if 'db' not in g:
+        g.db = ConnectDB(
+            pool=app.extensions['db_pool'],
+            seat_cache=app.extensions['seat_cache'],
+            broker=app.extensions['seat_broker'],
+            user_cache=app.extensions['user_cache'],
+            schedule_cache=app.extensions['schedule_cache'],
+            replicas=app.extensions['db_replicas'],
+            read_from_primary=g.get('read_from_primary', False),
+            statements=app.extensions['statements'],
+            breaker=app.extensions['db_breaker'],
+        )
+    return g.db
+
+@app.teardown_appcontext
+def release_db(exception=None):
+    # Return the request's connection to the pool, even if the request failed.
+    conn = g.pop('db', None)
+    if conn is not None:
+        conn.close_connection()
+
+def route_label():
+    # The URL rule ('/api/holds/<token>'), not the raw path, keeps the metric cardinality bounded
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+@app.before_request
+def start_request_timing():
+    g.request_started = time.perf_counter()
+    g.request_stats = instrumentation.start_request()
+    g.request_profiler = slow_request_profiler.start() if slow_request_profiler is not None else None
+
+@app.after_request
+def remember_response_status(response):
+    g.response_status = response.status_code
+    return response
+
+def overloaded_response():
+    # Shed requests get a 503 (the booking form re-renders with the message) and a Retry-After
+    message = "The service is busy, please try again in a moment."
+    if request.url_rule is not None and request.url_rule.rule == '/':
+        response = app.make_response((render_template("index.html", error_message=message), 503))
+    else:
+        response = jsonify({"error": message})
+        response.status_code = 503
+    response.headers['Retry-After'] = str(ADMISSION_RETRY_AFTER_SECONDS)
+    return response
+
+@app.before_request
+def admit_request():
+    rule = ADMISSION_RULES.get((route_label(), request.method))
+    if admission is None or rule is None:
+        return None
+    group, priority = rule
+    try:
+        admission.acquire(group, priority)
+    except OverloadError as e:
+        logging.warning("Shed %s %s: %s", request.method, route_label(), e)
+        return overloaded_response()
+    g.admission_group = group
+    return None
+
+@app.teardown_request
+def release_admission(exception=None):
+    # Streamed responses (seat updates, analytics) give their slot back once the view returns
+    group = g.pop('admission_group', None)
+    if group is not None:
+        admission.release(group)
+
+def admission_slot(rule, method):
+    """
+    Context manager holding an admission slot for a request to `rule` outside Flask's request
+    hooks (asgi.py). Raises OverloadError when the request is shed.
+    """
+    group_priority = ADMISSION_RULES.get((rule, method))
+    if admission is None or group_priority is None:
+        return nullcontext()
+    return admission.slot(*group_priority)
+
+def reads_own_writes(cookie_value):
+    """
+    True while the read-your-writes window set by remember_writes() is open.
+    """
+    try:
+        return float(cookie_value) > time.time()
+    except (TypeError, ValueError):
+        return False
+
+@app.before_request
+def route_session_reads():
+    g.read_from_primary = reads_own_writes(request.cookies.get(READ_YOUR_WRITES_COOKIE))
+
+@app.after_request
+def remember_writes(response):
+    # After a booking, the session reads from the primary until replicas have surely caught up
+    replicas = app.extensions['db_replicas']
+    db = g.get('db')
+    if replicas is not None and db is not None and db.wrote:
+        response.set_cookie(READ_YOUR_WRITES_COOKIE, f"{replicas.sticky_until():.3f}",
+                            max_age=replicas.sticky_seconds, httponly=True, samesite='Lax')
+    return response
+
+@app.teardown_request
+def record_request_timing(exception=None):
+    started = g.pop('request_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    route = route_label()
+    # No status recorded means the view raised, which Flask turns into a 500
+    instrumentation.record_request(route, request.method, g.pop('response_status', 500), elapsed, g.pop('request_stats', None))
+    profiler = g.pop('request_profiler', None)
+    if profiler is not None:
+        slow_request_profiler.finish(profiler, route, elapsed)
+
+def ensure_user_registered(conn, user_id_int):
+    """
+    Makes sure the UserID exists, auto-registering it with placeholder details if not.
+    Returns False if the user could not be registered.
+    """
+    if conn.check_user_exists(user_id_int):
+        logging.info("User ID %s already exists. Proceeding with booking.", user_id_int)
+        return True
+    logging.info("User ID %s does not exist. Attempting to register new user.", user_id_int)
+    # AUTO-REGISTRATION: Using placeholder data for other user fields
+    registered_successfully = conn.register_user(
+        user_id=user_id_int,
+        first_name=f"NewUser_{user_id_int}", # Placeholder
+        last_name="Auto",                     # Placeholder
+        email=f"user_{user_id_int}@example.com", # Placeholder
+        phone_number="000-000-0000",          # Placeholder
+        password="password"                   # VERY IMPORTANT: Use secure hashing in production!
+    )
+    if not registered_successfully:
+        logging.error("Failed to auto-register user %s. Could be duplicate ID if not auto-incremented.", user_id_int)
+        return False
+    logging.info("User ID %s successfully auto-registered.", user_id_int)
+    return True
+
 @app.route('/',methods= ['GET','POST'])
 def home_page():
     # Logging for GET request (rendering the initial form)
@@ -15,18 +386,17 @@ def home_page():
         # This block handles POST requests (form submission for booking)
         logging.info("Starting the bus booking process for POST request.")
         
-        # Initialize connection within the request context
-        # This ensures a fresh connection for each POST request
-        conn = ConnectDB() 
+        # Borrow a pooled connection for this request; it is returned on teardown
+        conn = get_db()
         try:
             conn.connect_to_db() # Establish the database connection.
             logging.info("Successfully connected to the database for current request.")
         except ConnectionError as e: # Catch the specific ConnectionError from modules.py
-            logging.error(f"Failed to connect to DB for POST request: {e}", exc_info=True)
+            logging.error("Failed to connect to DB for POST request: %s", e, exc_info=True)
             # Render an error message if connection fails
             return render_template("index.html", error_message="Error connecting to database. Please try again later.")
         except Exception as e:
-            logging.error(f"An unexpected error occurred during DB connection: {e}", exc_info=True)
+            logging.error("An unexpected error occurred during DB connection: %s", e, exc_info=True)
             return render_template("index.html", error_message="An unexpected error occurred. Please try again later.")
 
         # Getting inputs from index.html (including the new hidden fields)
@@ -36,13 +406,13 @@ def home_page():
         travel_date = request.form.get('travelDate') 
         schedule_id = request.form.get('selectedScheduleId') 
         seat_number = request.form.get('seatNumber')
+        hold_token = request.form.get('holdToken') # Set when the seat was held from the seat picker
 
-        logging.info(f"Booking attempt - User ID: {user_id}, Source: {source}, Destination: {destination}, Travel Date: {travel_date}, Schedule ID: {schedule_id}, Seat Number: {seat_number}")
+        logging.info("Booking attempt - User ID: %s, Source: %s, Destination: %s, Travel Date: %s, Schedule ID: %s, Seat Number: %s", user_id, source, destination, travel_date, schedule_id, seat_number)
 
         # Basic validation for essential booking parameters
         if not all([user_id, source, destination, travel_date, schedule_id, seat_number]):
             logging.warning("Missing required booking parameters in POST request.")
-            conn.close_connection()
             return render_template("index.html", error_message="Please select all booking details (Source, Destination, Date, Seat).")
 
         try:
@@ -52,49 +422,33 @@ def home_page():
             user_id_int = int(user_id) # Convert UserID to int
         except ValueError:
             logging.error("Invalid input for Seat Number, Schedule ID, or User ID (not integers).")
-            conn.close_connection()
             return render_template("index.html", error_message="Invalid input for Seat Number, Schedule ID, or User ID.")
 
         try:
-            # Check if UserID exists. If not, attempt to register.
-            if not conn.check_user_exists(user_id_int):
-                logging.info(f"User ID {user_id_int} does not exist. Attempting to register new user.")
-                # AUTO-REGISTRATION: Using placeholder data for other user fields
-                registered_successfully = conn.register_user(
-                    user_id=user_id_int,
-                    first_name=f"NewUser_{user_id_int}", # Placeholder
-                    last_name="Auto",                     # Placeholder
-                    email=f"user_{user_id_int}@example.com", # Placeholder
-                    phone_number="000-000-0000",          # Placeholder
-                    password="password"                   # VERY IMPORTANT: Use secure hashing in production!
-                )
-                if not registered_successfully:
-                    logging.error(f"Failed to auto-register user {user_id_int}. Could be duplicate ID if not auto-incremented.")
-                    conn.close_connection()
-                    return render_template("index.html", error_message=f"Failed to register User ID {user_id_int}. It might already exist or there's a DB issue.")
+            # Attempt to book the seat. Unknown UserIDs are registered by the same CALL, which also
+            # returns (and caches) the schedule details shown below.
+            # A seat held by another user is refused; the user's own hold is consumed.
+            engine = app.extensions['booking_engine']
+            try:
+                if hold_token:
+                    # The hold decides which seat is booked; report that one, not the form's fields
+                    hold = engine.confirm(conn, hold_token, user_id_int)
+                    schedule_id_int, seat_number_int = hold.schedule_id, hold.seat_number
                 else:
-                    logging.info(f"User ID {user_id_int} successfully auto-registered.")
-            else:
-                logging.info(f"User ID {user_id_int} already exists. Proceeding with booking.")
-
-            # Attempt to book the seat (now that user is guaranteed to exist)
-            booking = conn.book_seat(
-                schedule_id=schedule_id_int, 
-                seat_number=seat_number_int, 
-                user_id=user_id_int # Use the integer UserID
-            ) 
-            logging.info(f"Booking Status for seat {seat_number_int}, user {user_id_int}: {booking}")
+                    engine.book(conn, schedule_id_int, seat_number_int, user_id_int)
+                booking = True
+            except BookingError as e:
+                logging.info("Booking refused for seat %s, user %s: %s", seat_number_int, user_id_int, e)
+                booking = False
+            logging.info("Booking Status for seat %s, user %s: %s", seat_number_int, user_id_int, booking)
         except Exception as e:
-            logging.error(f"Error during user check/registration or booking: {e}", exc_info=True)
+            logging.error("Error during user check/registration or booking: %s", e, exc_info=True)
             return render_template("index.html", error_message="Error occurred during user validation or booking.")
-        finally:
-            # Ensure database connection is closed even if booking fails or errors occur
-            conn.close_connection()
-            logging.info("Database connection closed for current request.")
         
         if booking == True:
             try:
                 # Fetch complete bus details for the booked schedule to display on result.html
+                # (normally cached by the booking call; otherwise reuses the request's pooled connection)
                 bus_details_data = conn.get_schedule_details_by_id(schedule_id_int)
 
                 if bus_details_data:
@@ -118,81 +472,585 @@ def home_page():
                     logging.info("Booking confirmed! Rendering result.html with detailed bus information.")
                     return render_template("result.html", bus_details=bus_details_data)
                 else:
-                    logging.warning(f"Booking confirmed but could not retrieve details for ScheduleID {schedule_id_int}.")
+                    logging.warning("Booking confirmed but could not retrieve details for ScheduleID %s.", schedule_id_int)
                     return render_template("result.html", bus_details={"message": "Booking Confirmed! Details could not be retrieved.", "ScheduleID": schedule_id_int})
             except Exception as e:
-                logging.error(f"Error preparing result.html after successful booking: {e}", exc_info=True)
+                logging.error("Error preparing result.html after successful booking: %s", e, exc_info=True)
                 return render_template("result.html", message="Booking confirmed! An error occurred displaying details.")
         else:
             logging.info("Booking failed. Rendering index.html with error message.")
             return render_template("index.html", error_message="Booking failed. Please try again, perhaps the seat is taken or another issue occurred.")
             
-# New API endpoint to get available dates for a given source and destination
-@app.route('/api/available_dates')
-def get_available_dates():
-    source = request.args.get('source')
-    destination = request.args.get('destination')
-    logging.info(f"API request for available dates - Source: {source}, Destination: {destination}")
+# The read APIs are written as plain functions of the query arguments returning
+# (payload, status), so the async server in asgi.py can serve them without a Flask request.
+# They need an app context (for get_db), which both servers provide.
+
+def available_dates_result(args):
+    source = args.get('source')
+    destination = args.get('destination')
+    start_date = args.get('from')
+    end_date = args.get('to')
+    logging.info("API request for available dates - Source: %s, Destination: %s", source, destination)
 
     if not source or not destination:
         logging.warning("Missing source or destination for /api/available_dates request.")
-        return jsonify([]) # Return an empty list if parameters are missing
-
-    conn = ConnectDB()
-    try:
-        conn.connect_to_db()
-        available_dates_data = conn.get_available_bus_schedules(source, destination)
-        logging.info(f"Found {len(available_dates_data)} available schedules for {source} to {destination}.")
-        formatted_data = []
-        for item in available_dates_data:
-            if isinstance(item.get('TravelDate'), date):
-                item['TravelDate'] = item['TravelDate'].strftime('%Y-%m-%d')
-            formatted_data.append(item)
-        return jsonify(formatted_data)
+        return [], 200 # Return an empty list if parameters are missing
+
+    timetable = app.extensions['timetable']
+    try:
+        # Only touches the database when the index is missing or due for a refresh
+        timetable.ensure_fresh(get_db())
+        available_dates_data = timetable.lookup(source, destination, start_date, end_date)
+        logging.info("Found %s available schedules for %s to %s.", len(available_dates_data), source, destination)
+        return available_dates_data, 200
     except ConnectionError as e:
-        logging.error(f"API - Connection error fetching available dates: {e}", exc_info=True)
-        return jsonify([]), 500 # Internal server error
+        logging.error("API - Connection error fetching available dates: %s", e, exc_info=True)
+        return [], 500 # Internal server error
     except Exception as e:
-        logging.error(f"API - Error fetching available dates: {e}", exc_info=True)
-        return jsonify([]), 500
-    finally:
-        conn.close_connection()
-        logging.info("API - Database connection closed for /api/available_dates.")
+        logging.error("API - Error fetching available dates: %s", e, exc_info=True)
+        return [], 500
 
-# New API endpoint to get available seats for a specific schedule ID
-@app.route('/api/available_seats')
-def get_available_seats():
-    schedule_id = request.args.get('schedule_id')
-    logging.info(f"API request for available seats - Schedule ID: {schedule_id}")
+def available_seats_result(args):
+    schedule_id = args.get('schedule_id')
+    logging.info("API request for available seats - Schedule ID: %s", schedule_id)
 
     if not schedule_id:
         logging.warning("Missing schedule_id for /api/available_seats request.")
-        return jsonify({"total_seats": 0, "occupied_seats": []})
+        return {"total_seats": 0, "occupied_seats": []}, 200
 
     try:
         schedule_id_int = int(schedule_id)
     except ValueError:
-        logging.error(f"Invalid schedule_id received: {schedule_id}")
-        return jsonify({"total_seats": 0, "occupied_seats": []}), 400 # Bad request
+        logging.error("Invalid schedule_id received: %s", schedule_id)
+        return {"total_seats": 0, "occupied_seats": []}, 400 # Bad request
+
+    # Seats held by other users are reported separately so the picker can grey them out
+    try:
+        viewer_id = int(args['user_id']) if args.get('user_id') else None
+    except ValueError:
+        viewer_id = None
 
-    conn = ConnectDB()
+    # No explicit connect: a cached seat map is served without borrowing a connection
+    conn = get_db()
     try:
-        conn.connect_to_db()
         seat_data = conn.get_seat_availability(schedule_id_int)
-        logging.info(f"Seat availability for Schedule ID {schedule_id_int}: {seat_data}")
-        return jsonify(seat_data)
+        logging.info("Seat availability for Schedule ID %s: %s total, %s occupied", schedule_id_int, seat_data['total_seats'], len(seat_data['occupied_seats']))
+        held_seats = app.extensions['booking_engine'].holds.held_seats(schedule_id_int, exclude_user_id=viewer_id)
+        return dict(seat_data, held_seats=held_seats), 200
     except ConnectionError as e:
-        logging.error(f"API - Connection error fetching available seats: {e}", exc_info=True)
-        return jsonify({"total_seats": 0, "occupied_seats": []}), 500
+        logging.error("API - Connection error fetching available seats: %s", e, exc_info=True)
+        return {"total_seats": 0, "occupied_seats": []}, 500
     except Exception as e:
-        logging.error(f"API - Error fetching available seats: {e}", exc_info=True)
-        return jsonify({"total_seats": 0, "occupied_seats": []}), 500
-    finally:
+        logging.error("API - Error fetching available seats: %s", e, exc_info=True)
+        return {"total_seats": 0, "occupied_seats": []}, 500
+
+def available_dates_cache_key(args):
+    """
+    Returns (cache key, version) of an /api/available_dates response, or (None, None) when it
+    should not be cached (bad arguments or an index that cannot be loaded; the result
+    function then reports the error).
+    """
+    source, destination = args.get('source'), args.get('destination')
+    if not source or not destination:
+        return None, None
+    try:
+        # New schedules bump the route version, so top the index up before reading it
+        app.extensions['timetable'].ensure_fresh(get_db())
+    except Exception:
+        return None, None
+    key = ('dates', source, destination, args.get('from'), args.get('to'))
+    return key, app.extensions['response_cache'].version('route', source, destination)
+
+def available_seats_cache_key(args):
+    """
+    Same as available_dates_cache_key for /api/available_seats. Seats held by other users are
+    part of the key, since holds come and go without a booking.
+    """
+    try:
+        schedule_id = int(args.get('schedule_id', ''))
+        viewer_id = int(args['user_id']) if args.get('user_id') else None
+    except ValueError:
+        return None, None
+    held_seats = app.extensions['booking_engine'].holds.held_seats(schedule_id, exclude_user_id=viewer_id)
+    key = ('seats', schedule_id, tuple(held_seats))
+    return key, app.extensions['response_cache'].version('schedule', schedule_id)
+
+def cached_response(result_function, cache_key_function, args, headers):
+    """
+    Serves result_function(args) through the response cache: (status, headers, body).
+    `headers` are the request headers (If-None-Match, Accept-Encoding).
+    """
+    cache = app.extensions['response_cache']
+    key, version = cache_key_function(args)
+    if key is None:
+        return cache.uncached(*result_function(args))
+    return cache.respond(key, version, lambda: result_function(args),
+                         if_none_match=headers.get('If-None-Match'), accept_encoding=headers.get('Accept-Encoding', ''))
+
+def format_time_of_day(value):
+    # MySQL TIME columns arrive as timedelta
+    if isinstance(value, timedelta):
+        minutes = int(value.total_seconds()) // 60
+        return f"{minutes // 60:02d}:{minutes % 60:02d}"
+    return value.strftime('%H:%M') if hasattr(value, 'strftime') else value
+
+def encode_search_cursor(row):
+    departure = row['DepartureTime']
+    if isinstance(departure, timedelta):
+        seconds = int(departure.total_seconds())
+        departure = f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    key = [row['TravelDate'].isoformat(), str(departure), row['ScheduleID']]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+def decode_search_cursor(cursor):
+    travel_date, departure_time, schedule_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return date.fromisoformat(travel_date), departure_time, int(schedule_id)
+
+def parse_search_args(args):
+    """
+    Validates the /api/search query arguments into search_schedules() keyword arguments.
+    Raises ValueError with a message for the client.
+    """
+    source, destination = args.get('source'), args.get('destination')
+    if not source or not destination:
+        raise ValueError("source and destination are required.")
+    try:
+        start_date = date.fromisoformat(args['from']) if args.get('from') else date.today()
+        end_date = date.fromisoformat(args['to']) if args.get('to') else start_date + timedelta(days=30)
+    except ValueError:
+        raise ValueError("from/to must be dates (YYYY-MM-DD).")
+    if end_date < start_date or (end_date - start_date).days > SEARCH_MAX_DAYS:
+        raise ValueError(f"The date range must be ordered and span at most {SEARCH_MAX_DAYS} days.")
+
+    search = {"source": source, "destination": destination, "start_date": start_date, "end_date": end_date}
+    try:
+        for name in ('min_price', 'max_price'):
+            if args.get(name):
+                search[name] = Decimal(args[name])
+    except InvalidOperation:
+        raise ValueError("min_price/max_price must be numbers.")
+    try:
+        for name in ('depart_after', 'depart_before'):
+            if args.get(name):
+                search[name] = datetime.strptime(args[name], '%H:%M').strftime('%H:%M:%S')
+    except ValueError:
+        raise ValueError("depart_after/depart_before must be times (HH:MM).")
+    if args.get('company'):
+        search['company'] = args['company']
+    try:
+        search['min_seats'] = max(1, int(args.get('min_seats', 1)))
+        search['limit'] = min(max(1, int(args.get('limit', SEARCH_PAGE_SIZE))), SEARCH_MAX_PAGE_SIZE)
+    except ValueError:
+        raise ValueError("min_seats/limit must be integers.")
+    if args.get('cursor'):
+        try:
+            search['after'] = decode_search_cursor(args['cursor'])
+        except (ValueError, TypeError):
+            raise ValueError("Invalid cursor.")
+    return search
+
+def search_result(args):
+    try:
+        search = parse_search_args(args)
+    except ValueError as e:
+        logging.warning("Invalid /api/search request: %s", e)
+        return {"error": str(e)}, 400
+
+    last_known_key = tuple(sorted(args.items()))
+    try:
+        rows, has_more = get_db().search_schedules(**search)
+    except ConnectionError as e:
+        logging.error("API - Connection error searching schedules: %s", e, exc_info=True)
+        last_known = app.extensions['last_known_searches'].get(last_known_key)
+        if last_known is not None:
+            return dict(last_known, stale=True), 200
+        return {"error": "Error connecting to database."}, 500
+    except Exception as e:
+        logging.error("API - Error searching schedules: %s", e, exc_info=True)
+        return {"error": "Error searching schedules."}, 500
+
+    results = [{
+        "ScheduleID": row['ScheduleID'],
+        "TravelDate": row['TravelDate'].isoformat(),
+        "DepartureTime": format_time_of_day(row['DepartureTime']),
+        "ArrivalTime": format_time_of_day(row['ArrivalTime']),
+        "Price": str(row['MinPrice']),
+        "FreeSeats": row['FreeSeats'],
+        "CompanyName": row['CompanyName'],
+        "BusNumber": row['BusNumber'],
+    } for row in rows]
+    next_cursor = encode_search_cursor(rows[-1]) if has_more else None
+    result = {"results": results, "next_cursor": next_cursor}
+    app.extensions['last_known_searches'].put(last_known_key, result)
+    return result, 200
+
+def parse_journey_args(args):
+    """
+    Validates the /api/journeys query arguments into JourneyPlanner.plan() keyword arguments.
+    Raises ValueError with a message for the client.
+    """
+    source, destination = args.get('source'), args.get('destination')
+    if not source or not destination:
+        raise ValueError("source and destination are required.")
+    try:
+        travel_date = date.fromisoformat(args['date']) if args.get('date') else date.today()
+        after = datetime.strptime(args['after'], '%H:%M').time() if args.get('after') else datetime.min.time()
+    except ValueError:
+        raise ValueError("date must be YYYY-MM-DD and after HH:MM.")
+    optimize = args.get('optimize', 'earliest')
+    if optimize not in ('earliest', 'cheapest'):
+        raise ValueError("optimize must be 'earliest' or 'cheapest'.")
+    plan = {"source": source, "destination": destination, "departure": datetime.combine(travel_date, after), "optimize": optimize}
+    try:
+        if args.get('max_transfers'):
+            plan['max_legs'] = min(max(0, int(args['max_transfers'])) + 1, app.extensions['journey_planner'].max_legs)
+        if args.get('min_transfer'):
+            plan['min_transfer_minutes'] = max(0, int(args['min_transfer']))
+        plan['seats'] = max(1, int(args.get('seats', 1)))
+    except ValueError:
+        raise ValueError("max_transfers/min_transfer/seats must be integers.")
+    return plan
+
+def journeys_result(args):
+    try:
+        plan = parse_journey_args(args)
+    except ValueError as e:
+        logging.warning("Invalid /api/journeys request: %s", e)
+        return {"error": str(e)}, 400
+
+    planner = app.extensions['journey_planner']
+    try:
+        planner.ensure_fresh(get_db())
+    except ConnectionError as e:
+        logging.error("API - Connection error loading the journey planner: %s", e, exc_info=True)
+        return {"error": "Error connecting to database."}, 500
+    except Exception as e:
+        logging.error("API - Error loading the journey planner: %s", e, exc_info=True)
+        return {"error": "Error planning journeys."}, 500
+    return {"journeys": planner.plan(**plan)}, 200
+
+# New API endpoint to get available dates for a given source and destination
+# Optional `from`/`to` (YYYY-MM-DD) query parameters limit the result to a date range.
+# Like /api/available_seats, it is served from the response cache with an ETag (304 on If-None-Match).
+@app.route('/api/available_dates')
+def get_available_dates():
+    status, headers, body = cached_response(available_dates_result, available_dates_cache_key, request.args, request.headers)
+    return Response(body, status=status, headers=headers)
+
+# Departures over a date range with optional filters, served from schedule_inventory:
+# /api/search?source=..&destination=..[&from=&to=&min_price=&max_price=&depart_after=HH:MM
+# &depart_before=HH:MM&company=&min_seats=&limit=&cursor=]. Pass back `next_cursor` for the next page.
+@app.route('/api/search')
+def search_schedules():
+    payload, status = search_result(request.args)
+    return jsonify(payload), status
+
+# Journeys with changes, planned in memory over the whole timetable:
+# /api/journeys?source=..&destination=..[&date=YYYY-MM-DD&after=HH:MM&optimize=earliest|cheapest
+# &max_transfers=&min_transfer=<minutes>&seats=]. Returns the best journey per number of changes.
+@app.route('/api/journeys')
+def plan_journeys():
+    payload, status = journeys_result(request.args)
+    return jsonify(payload), status
+
+# New API endpoint to get available seats for a specific schedule ID
+@app.route('/api/available_seats')
+def get_available_seats():
+    status, headers, body = cached_response(available_seats_result, available_seats_cache_key, request.args, request.headers)
+    return Response(body, status=status, headers=headers)
+
+# Server-sent event stream of seat changes for one schedule.
+# Sends a `snapshot` event (same payload as /api/available_seats), then a `booked` event with the
+# seat numbers every time a booking on the schedule commits. A `resync` event means the client
+# fell behind and should re-fetch the seat map.
+@app.route('/api/seat_updates')
+def seat_updates():
+    try:
+        schedule_id_int = int(request.args.get('schedule_id', ''))
+    except ValueError:
+        return jsonify({"error": "Expected an integer schedule_id."}), 400
+
+    # Subscribe before reading the snapshot so no booking falls between the two
+    subscription = app.extensions['seat_broker'].subscribe(schedule_id_int)
+    snapshot, status = available_seats_result(request.args)
+    get_db().close_connection() # Do not keep a pooled connection for the lifetime of the stream
+    if status != 200:
+        subscription.close()
+        return jsonify(snapshot), status
+
+    def stream():
+        try:
+            yield sse_message("snapshot", snapshot)
+            while True:
+                event = subscription.get(timeout=SEAT_STREAM_HEARTBEAT_SECONDS)
+                if subscription.overflowed:
+                    yield sse_message("resync", {"schedule_id": schedule_id_int})
+                    return
+                yield SSE_KEEPALIVE if event is None else sse_message(event["type"], event)
+        finally:
+            subscription.close()
+
+    logging.info("Seat update stream opened for ScheduleID %s.", schedule_id_int)
+    return Response(stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Batch booking endpoint: reserve several seats (on one or more schedules) in one transaction.
+# Body: {"user_id": 1, "seats": [{"schedule_id": 1, "seat_number": 12}, ...], "all_or_nothing": false}
+@app.route('/api/book_batch', methods=['POST'])
+def book_batch():
+    payload = request.get_json(silent=True) or {}
+    seats = payload.get('seats')
+    logging.info("API batch booking request - User ID: %s, Seats: %s", payload.get('user_id'), len(seats) if isinstance(seats, list) else 0)
+
+    try:
+        user_id_int = int(payload.get('user_id'))
+        requested = [(int(seat['schedule_id']), int(seat['seat_number'])) for seat in seats]
+    except (TypeError, ValueError, KeyError):
+        logging.error("Invalid batch booking payload.")
+        return jsonify({"error": "Expected user_id and a list of {schedule_id, seat_number} seats."}), 400
+    if not requested:
+        return jsonify({"error": "No seats requested."}), 400
+    if len(requested) > MAX_BATCH_SEATS:
+        return jsonify({"error": f"At most {MAX_BATCH_SEATS} seats can be booked per request."}), 400
+
+    # Same rule as a direct booking: seats held by another user are refused
+    all_or_nothing = bool(payload.get('all_or_nothing'))
+    holds = app.extensions['booking_engine'].holds
+    holders = {seat: holds.holder(*seat) for seat in dict.fromkeys(requested)}
+    refused = {seat for seat, holder in holders.items() if holder is not None and holder != user_id_int}
+    bookable = [] if refused and all_or_nothing else [seat for seat in holders if seat not in refused]
+
+    conn = get_db()
+    try:
+        if not ensure_user_registered(conn, user_id_int):
+            return jsonify({"error": f"Failed to register User ID {user_id_int}."}), 500
+        booked_results = conn.book_seats(user_id_int, bookable, all_or_nothing=all_or_nothing)
+    except ConnectionError as e:
+        logging.error("API - Connection error during batch booking: %s", e, exc_info=True)
+        return jsonify({"error": "Error connecting to database."}), 500
+    except Exception as e:
+        logging.error("API - Error during batch booking: %s", e, exc_info=True)
+        return jsonify({"error": "Error occurred during booking."}), 500
+
+    by_seat = {(result['schedule_id'], result['seat_number']): result for result in booked_results}
+    results = []
+    for seat in holders:
+        if seat in by_seat:
+            result = by_seat[seat]
+            if result['status'] == 'booked' and holders[seat] == user_id_int:
+                holds.release_seat(*seat)
+        else:
+            result = {"schedule_id": seat[0], "seat_number": seat[1], "status": "held" if seat in refused else "not_booked"}
+        results.append(result)
+    booked = sum(1 for result in results if result['status'] == 'booked')
+    return jsonify({"booked": booked, "requested": len(results), "results": results})
+
+def booking_error_response(error):
+    status_codes = {"unavailable": 409, "held": 409, "expired": 410, "forbidden": 403, "busy": 503}
+    return jsonify({"error": str(error), "reason": error.reason}), status_codes.get(error.reason, 500)
+
+# Seat holds: claim a seat while the booking form is being filled in.
+# Body: {"user_id": 1, "schedule_id": 1, "seat_number": 12}
+@app.route('/api/holds', methods=['POST'])
+def create_hold():
+    payload = request.get_json(silent=True) or {}
+    try:
+        user_id_int = int(payload.get('user_id'))
+        schedule_id_int = int(payload.get('schedule_id'))
+        seat_number_int = int(payload.get('seat_number'))
+    except (TypeError, ValueError):
+        logging.error("Invalid seat hold payload.")
+        return jsonify({"error": "Expected integer user_id, schedule_id and seat_number."}), 400
+
+    try:
+        hold = app.extensions['booking_engine'].hold(get_db(), schedule_id_int, seat_number_int, user_id_int)
+    except BookingError as e:
+        return booking_error_response(e)
+    except ConnectionError as e:
+        logging.error("API - Connection error placing seat hold: %s", e, exc_info=True)
+        return jsonify({"error": "Error connecting to database."}), 500
+    return jsonify(hold.as_dict()), 201
+
+@app.route('/api/holds/<token>', methods=['DELETE'])
+def release_hold(token):
+    released = app.extensions['booking_engine'].holds.release(token)
+    return jsonify({"released": released}), 200 if released else 404
+
+# Confirm a hold into a booking. Body: {"user_id": 1}
+@app.route('/api/holds/<token>/confirm', methods=['POST'])
+def confirm_hold(token):
+    payload = request.get_json(silent=True) or {}
+    try:
+        user_id_int = int(payload.get('user_id'))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Expected integer user_id."}), 400
+
+    conn = get_db()
+    try:
+        # Registers the user if needed, in the same CALL as the booking
+        hold = app.extensions['booking_engine'].confirm(conn, token, user_id_int)
+    except BookingError as e:
+        return booking_error_response(e)
+    except ConnectionError as e:
+        logging.error("API - Connection error confirming seat hold: %s", e, exc_info=True)
+        return jsonify({"error": "Error connecting to database."}), 500
+    return jsonify({"status": "booked", "schedule_id": hold.schedule_id, "seat_number": hold.seat_number})
+
+# Asynchronous booking: queued for the next group commit, answered with a ticket at once.
+# Body: {"user_id": 1, "schedule_id": 1, "seat_number": 12}
+@app.route('/api/book_async', methods=['POST'])
+def book_async():
+    payload = request.get_json(silent=True) or {}
+    try:
+        user_id_int = int(payload.get('user_id'))
+        schedule_id_int = int(payload.get('schedule_id'))
+        seat_number_int = int(payload.get('seat_number'))
+    except (TypeError, ValueError):
+        logging.error("Invalid asynchronous booking payload.")
+        return jsonify({"error": "Expected integer user_id, schedule_id and seat_number."}), 400
+
+    # Same rule as a direct booking: a seat held by another user is refused
+    holder = app.extensions['booking_engine'].holds.holder(schedule_id_int, seat_number_int)
+    if holder is not None and holder != user_id_int:
+        return booking_error_response(BookingError("held", f"Seat {seat_number_int} on schedule {schedule_id_int} is held by another user."))
+    try:
+        ticket = app.extensions['group_commit'].submit(schedule_id_int, seat_number_int, user_id_int)
+    except BookingError as e:
+        return booking_error_response(e)
+    return jsonify(ticket.as_dict()), 202, {'Location': f"/api/book_async/{ticket.token}"}
+
+# Booking ticket status. ?wait=<seconds> holds the request until the booking is applied (long poll).
+@app.route('/api/book_async/<token>')
+def booking_ticket(token):
+    ticket = app.extensions['group_commit'].get(token)
+    if ticket is None:
+        return jsonify({"error": "Unknown or expired booking ticket."}), 404
+    try:
+        wait = min(max(0.0, float(request.args.get('wait', 0))), BOOKING_TICKET_MAX_WAIT_SECONDS)
+    except ValueError:
+        return jsonify({"error": "wait must be a number of seconds."}), 400
+    if wait:
+        ticket.wait(wait)
+    return jsonify(ticket.as_dict())
+
+def parse_analytics_args(args):
+    """
+    Validates the /api/analytics query arguments into run_report() keyword arguments.
+    Raises ValueError with a message for the client.
+    """
+    try:
+        end_date = date.fromisoformat(args['to']) if args.get('to') else date.today()
+        start_date = date.fromisoformat(args['from']) if args.get('from') else end_date - timedelta(days=ANALYTICS_DEFAULT_DAYS)
+    except ValueError:
+        raise ValueError("from/to must be dates (YYYY-MM-DD).")
+    if end_date < start_date:
+        raise ValueError("from must not be after to.")
+    return {"start_date": start_date, "end_date": end_date, "group_by": analytics.parse_group_by(args.get('group_by', 'route'))}
+
+# Analytics export: GET /api/analytics/occupancy|lead_time|bookings?from=&to=&group_by=route,company,date&format=csv|jsonl
+# Rows are read from the database in chunks and the response is streamed, so exports of any size
+# run in constant memory.
+@app.route('/api/analytics/<report>')
+def analytics_export(report):
+    if report not in analytics.REPORTS:
+        return jsonify({"error": f"Unknown report; use {', '.join(analytics.REPORTS)}."}), 404
+    output_format = request.args.get('format', 'csv')
+    if output_format not in analytics.FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(analytics.FORMATS)}."}), 400
+    try:
+        options = parse_analytics_args(request.args)
+    except ValueError as e:
+        logging.warning("Invalid /api/analytics request: %s", e)
+        return jsonify({"error": str(e)}), 400
+
+    # No replicas: every export must borrow from analytics_pool, so ANALYTICS_MAX_CONCURRENT holds
+    # and long streams never tie up the replica pools serving the booking path's reads
+    conn = ConnectDB(pool=app.extensions['analytics_pool'])
+    try:
+        columns, chunks = analytics.run_report(conn, report, chunk_size=ANALYTICS_CHUNK_SIZE, **options)
+    except ConnectionError as e:
         conn.close_connection()
-        logging.info("API - Database connection closed for /api/available_seats.")
+        logging.warning("API - Analytics export %s refused: %s", report, e)
+        return jsonify({"error": "Too many exports are running; try again shortly."}), 503
+    except Exception as e:
+        conn.close_connection()
+        logging.error("API - Error running analytics report %s: %s", report, e, exc_info=True)
+        return jsonify({"error": "Error running the report."}), 500
+
+    formatter, mimetype = analytics.FORMATS[output_format]
+
+    def stream():
+        try:
+            yield from formatter(columns, chunks)
+        finally:
+            conn.close_connection()
+
+    logging.info("Analytics export %s (%s to %s) started.", report, options['start_date'], options['end_date'])
+    headers = {
+        'Content-Disposition': f'attachment; filename="{report}_{options["start_date"]}_{options["end_date"]}.{output_format}"',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    }
+    return Response(stream(), mimetype=mimetype, headers=headers)
+
+# Connection pool metrics: in-use/idle connections, waits, timeouts and checkout latency
+@app.route('/api/pool_stats')
+def get_pool_stats():
+    return jsonify(app.extensions['db_pool'].stats())
+
+# Seat update streams: open subscribers and events published
+@app.route('/api/seat_stream_stats')
+def get_seat_stream_stats():
+    return jsonify(app.extensions['seat_broker'].stats())
+
+# Seat map cache metrics: entries, hits, misses and evictions
+@app.route('/api/seat_cache_stats')
+def get_seat_cache_stats():
+    return jsonify(app.extensions['seat_cache'].stats())
+
+# Prometheus scrape endpoint: request/query latency histograms, round trips per request,
+# and the pool, cache, stream and hold statistics as gauges
+@app.route('/metrics')
+def metrics():
+    extra = []
+    extra += instrumentation.render_gauges('db_pool', app.extensions['db_pool'].stats(), "Connection pool")
+    extra += instrumentation.render_gauges('analytics_pool', app.extensions['analytics_pool'].stats(), "Analytics connection pool")
+    extra += instrumentation.render_gauges('seat_cache', app.extensions['seat_cache'].stats(), "Seat map cache")
+    extra += instrumentation.render_gauges('seat_stream', app.extensions['seat_broker'].stats(), "Seat update streams")
+    extra += instrumentation.render_gauges('user_cache', app.extensions['user_cache'].stats(), "Known UserID cache")
+    extra += instrumentation.render_gauges('schedule_cache', app.extensions['schedule_cache'].stats(), "Schedule details cache")
+    extra += instrumentation.render_gauges('seat_holds', app.extensions['booking_engine'].holds.stats(), "Seat holds")
+    if app.extensions['statements'] is not None:
+        extra += instrumentation.render_gauges('prepared_statements', app.extensions['statements'].stats(), "Prepared statements")
+    if app.extensions['db_replicas'] is not None:
+        extra += instrumentation.render_gauges('db_replicas', app.extensions['db_replicas'].stats(), "Read replicas")
+    extra += instrumentation.render_gauges('http_cache', app.extensions['response_cache'].stats(), "Response cache")
+    extra += instrumentation.render_gauges('journey_planner', app.extensions['journey_planner'].stats(), "Journey planner")
+    extra += instrumentation.render_gauges('group_commit', app.extensions['group_commit'].stats(), "Group commit booking queue")
+    if app.extensions['admission'] is not None:
+        extra += instrumentation.render_gauges('admission', app.extensions['admission'].stats(), "Admission control")
+    if app.extensions['db_breaker'] is not None:
+        extra += instrumentation.render_gauges('db_circuit', app.extensions['db_breaker'].stats(), "Database circuit breaker")
+    return Response(instrumentation.REGISTRY.render(extra), mimetype='text/plain; version=0.0.4')
+
+
+def warm_caches():
+    """
+    Builds the in-memory timetable index and journey planner before the first request is served.
+    Failures are logged and they are built lazily on first use instead.
+    """
+    with app.app_context():
+        try:
+            app.extensions['timetable'].refresh(get_db())
+        except Exception as e:
+            logging.warning("Could not build the timetable index at startup: %s", e)
+        try:
+            app.extensions['journey_planner'].refresh(get_db())
+        except Exception as e:
+            logging.warning("Could not build the journey planner at startup: %s", e)
 
 
 if __name__== '__main__':
     logging.info("Flask application starting...")
+    warm_caches()
     app.run(host= '0.0.0.0', port= 8080, debug=True)
     logging.info("Flask application stopped.") 
@@ -0,0 +1,85 @@
+"""
+Archives departed schedules: moves schedules that left more than --keep-days days ago, with
+their bookings, from the live tables into schedule_history and booking_history, and deletes
+their seats and inventory rows.
+
+The live tables then only hold departures that can still be booked, so their indexes (and the
+buffer pool pages the hot queries touch) stay the size of the bookable timetable rather than
+growing with every day of history. The history tables use compressed InnoDB rows; the
+booking_all view reads live and archived bookings together.
+
+Work is done in transactions of --batch-size schedules, oldest first, with a --pause between
+them so bookings are never blocked for long. Run it once a day (e.g. from cron), or leave it
+running with --every SECONDS.
+
+    python archive.py
+    python archive.py --keep-days 7 --batch-size 200 --every 3600
+"""
+import argparse
+import json
+import os
+import time
+from datetime import date, timedelta
+
+from modules import ConnectDB
+from pool import ConnectionPool
+
+
+def archive(conn, before, batch_size, pause=0.0, max_batches=None):
+    """
+    Moves batches until nothing departing before `before` is left (or max_batches ran).
+    Returns a summary dict.
+    """
+    started = time.perf_counter()
+    schedules = bookings = batches = 0
+    while max_batches is None or batches < max_batches:
+        moved, moved_bookings = conn.archive_departed_schedules(before, batch_size=batch_size)
+        if not moved:
+            break
+        batches += 1
+        schedules += moved
+        bookings += moved_bookings
+        print(f"  {schedules} schedules, {bookings} bookings archived", flush=True)
+        if pause:
+            time.sleep(pause)
+    elapsed = time.perf_counter() - started
+    return {
+        "before": before.isoformat(),
+        "batches": batches,
+        "schedules": schedules,
+        "bookings": bookings,
+        "seconds": round(elapsed, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default=os.environ.get('DB_HOST', 'localhost'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('DB_PORT', 3306)))
+    parser.add_argument('--user', default=os.environ.get('DB_USER', 'root'))
+    parser.add_argument('--password', default=os.environ.get('DB_PASSWORD', '0000'))
+    parser.add_argument('--database', default=os.environ.get('DB_NAME', 'bus_booking_system'))
+    parser.add_argument('--keep-days', type=int, default=1, help='keep departures of the last N days in the live tables')
+    parser.add_argument('--batch-size', type=int, default=500, help='schedules per transaction')
+    parser.add_argument('--pause', type=float, default=0.1, help='seconds to wait between batches')
+    parser.add_argument('--max-batches', type=int, help='stop after this many batches')
+    parser.add_argument('--every', type=float, help='keep running, archiving every N seconds')
+    args = parser.parse_args()
+
+    pool = ConnectionPool.for_mysql(host=args.host, port=args.port, user=args.user, password=args.password,
+                                    database=args.database, pool_size=1, max_overflow=0)
+    while True:
+        conn = ConnectDB(pool=pool)
+        try:
+            before = date.today() - timedelta(days=args.keep_days)
+            summary = archive(conn, before, args.batch_size, pause=args.pause, max_batches=args.max_batches)
+        finally:
+            conn.close_connection()
+        print(json.dumps(summary, indent=2), flush=True)
+        if args.every is None:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,270 @@
+"""
+Production entry point: an asyncio (ASGI) server for the booking app.
+
+The read APIs (/api/available_dates, /api/available_seats, /api/search and /api/journeys) are
+served natively on the event loop. Their blocking ConnectDB work runs on a bounded thread
+pool sized to the connection pool, so one worker process multiplexes many concurrent polls
+instead of dedicating a thread to each one while it waits. Dates and seat maps go through the
+same response cache (ETag / 304) as under Flask. The seat update stream
+(/api/seat_updates) is also served natively: each open stream is an asyncio task waiting on
+the seat broker, not a blocked thread. Every other route is passed through to the Flask app.
+
+Concurrency is capped per worker (READ_API_MAX_CONCURRENCY); a request that cannot start within
+READ_API_QUEUE_TIMEOUT seconds gets a 503, and one that takes longer than READ_API_TIMEOUT
+seconds gets a 504. The DB work of each request also takes a slot from the app's admission
+controller (app.ADMISSION_RULES), shared with the routes served by Flask, so seat map polls give
+way to bookings under load; a request shed there gets a 503 as well.
+
+Run with:
+    uvicorn asgi:application --host 0.0.0.0 --port 8080 --workers 4
+or simply:
+    python asgi.py
+"""
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import CookieError, SimpleCookie
+from urllib.parse import parse_qsl
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import g
+
+import instrumentation
+from app import (app, available_dates_result, available_seats_result, search_result, journeys_result, warm_caches,
+                 available_dates_cache_key, available_seats_cache_key, cached_response, reads_own_writes,
+                 admission_slot, READ_YOUR_WRITES_COOKIE, SEAT_STREAM_HEARTBEAT_SECONDS, ADMISSION_RETRY_AFTER_SECONDS)
+from logger import logging
+from overload import OverloadError
+from pubsub import sse_message, SSE_KEEPALIVE
+
+READ_ROUTES = {
+    '/api/available_dates': available_dates_result,
+    '/api/available_seats': available_seats_result,
+    '/api/search': search_result,
+    '/api/journeys': journeys_result,
+}
+
+# Read routes answered from the response cache (ETag / 304, pre-serialized bodies)
+CACHED_READ_ROUTES = {
+    '/api/available_dates': available_dates_cache_key,
+    '/api/available_seats': available_seats_cache_key,
+}
+
+
+class BookingASGIApp:
+    def __init__(self, flask_app, max_concurrency=1000, queue_timeout=5.0, request_timeout=10.0, db_threads=None):
+        """
+        ASGI application serving READ_ROUTES asynchronously and delegating the rest to flask_app.
+
+        max_concurrency -- read requests allowed in flight (waiting for or holding a DB thread).
+        queue_timeout   -- seconds a read request may wait for a concurrency slot before a 503.
+        request_timeout -- seconds a read request may take in total before a 504.
+        db_threads      -- threads running blocking ConnectDB calls; defaults to the pool capacity.
+        """
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.request_timeout = request_timeout
+        if db_threads is None:
+            pool = flask_app.extensions['db_pool']
+            db_threads = pool.pool_size + pool.max_overflow
+        self.executor = ThreadPoolExecutor(max_workers=db_threads, thread_name_prefix='read-api')
+        self._semaphore = None  # created lazily, inside the running event loop
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http' and scope['path'] in READ_ROUTES and scope['method'] == 'GET':
+            await self._read_api(scope, send)
+        elif scope['type'] == 'http' and scope['path'] == '/api/seat_updates' and scope['method'] == 'GET':
+            await self._seat_updates(scope, receive, send)
+        else:
+            await self.wsgi(scope, receive, send)
+
+    @staticmethod
+    def _reads_own_writes(scope):
+        # Same read-your-writes cookie as the Flask routes (see app.remember_writes)
+        for name, value in scope.get('headers', ()):
+            if name == b'cookie':
+                try:
+                    morsel = SimpleCookie(value.decode('latin-1')).get(READ_YOUR_WRITES_COOKIE)
+                except CookieError:
+                    return False
+                return morsel is not None and reads_own_writes(morsel.value)
+        return False
+
+    def _run_in_app_context(self, handler, args, read_from_primary=False, path=None):
+        # Runs on an executor thread; leaving the app context returns the pooled connection.
+        with admission_slot(path, 'GET'), self.flask_app.app_context():
+            g.read_from_primary = read_from_primary
+            return handler(args)
+
+    def _run_instrumented(self, handler, args, read_from_primary=False, path=None):
+        # Like _run_in_app_context, but also returns the DB round trips made for this request
+        stats = instrumentation.start_request()
+        payload, status = self._run_in_app_context(handler, args, read_from_primary, path)
+        return payload, status, stats
+
+    def _run_cached(self, handler, cache_key_function, args, headers, read_from_primary=False, path=None):
+        # Same, for CACHED_READ_ROUTES: returns (status, headers, body) ready to send
+        stats = instrumentation.start_request()
+        with admission_slot(path, 'GET'), self.flask_app.app_context():
+            g.read_from_primary = read_from_primary
+            status, response_headers, body = cached_response(handler, cache_key_function, args, headers)
+        return status, response_headers, body, stats
+
+    async def _read_api(self, scope, send):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        args = dict(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+        handler = READ_ROUTES[scope['path']]
+        read_from_primary = self._reads_own_writes(scope)
+        started = time.perf_counter()
+        stats = None
+
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            logging.warning("ASGI - %s shed after waiting %ss for a slot.", scope['path'], self.queue_timeout)
+            await self._send_json(send, {"error": "Server busy, please retry."}, 503, [(b'retry-after', b'1')])
+            instrumentation.record_request(scope['path'], 'GET', 503, time.perf_counter() - started, None)
+            return
+
+        response, extra_headers = None, ()
+        try:
+            loop = asyncio.get_running_loop()
+            if scope['path'] in CACHED_READ_ROUTES:
+                headers = {name.decode('latin-1').title(): value.decode('latin-1') for name, value in scope.get('headers', ())}
+                future = loop.run_in_executor(self.executor, self._run_cached, handler, CACHED_READ_ROUTES[scope['path']], args, headers,
+                                              read_from_primary, scope['path'])
+                status, response_headers, body, stats = await asyncio.wait_for(future, self.request_timeout)
+                response = (response_headers, body)
+            else:
+                future = loop.run_in_executor(self.executor, self._run_instrumented, handler, args, read_from_primary, scope['path'])
+                payload, status, stats = await asyncio.wait_for(future, self.request_timeout)
+        except asyncio.TimeoutError:
+            # The executor thread finishes in the background; only the client stops waiting.
+            logging.error("ASGI - %s timed out after %ss.", scope['path'], self.request_timeout)
+            payload, status, response = {"error": "Request timed out."}, 504, None
+        except OverloadError as e:
+            logging.warning("ASGI - %s shed: %s", scope['path'], e)
+            payload, status, response = {"error": "Server busy, please retry."}, 503, None
+            extra_headers = [(b'retry-after', str(ADMISSION_RETRY_AFTER_SECONDS).encode())]
+        finally:
+            self._semaphore.release()
+        if response is not None:
+            await self._send_body(send, status, *response)
+        else:
+            await self._send_json(send, payload, status, extra_headers)
+        instrumentation.record_request(scope['path'], 'GET', status, time.perf_counter() - started, stats)
+
+    async def _seat_updates(self, scope, receive, send):
+        # Same protocol as the Flask /api/seat_updates route: snapshot, then booked deltas.
+        args = dict(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+        try:
+            schedule_id = int(args.get('schedule_id', ''))
+        except ValueError:
+            await self._send_json(send, {"error": "Expected an integer schedule_id."}, 400)
+            return
+
+        loop = asyncio.get_running_loop()
+        subscription = self.flask_app.extensions['seat_broker'].subscribe_async(schedule_id, loop)
+        disconnected = asyncio.ensure_future(self._wait_for_disconnect(receive))
+        next_event = None
+        try:
+            snapshot_future = loop.run_in_executor(self.executor, self._run_in_app_context, available_seats_result, args,
+                                                   self._reads_own_writes(scope), scope['path'])
+            snapshot, status = await asyncio.wait_for(snapshot_future, self.request_timeout)
+            if status != 200:
+                await self._send_json(send, snapshot, status)
+                return
+
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache'), (b'x-accel-buffering', b'no'),
+            ]})
+            await self._send_chunk(send, sse_message("snapshot", snapshot))
+            while True:
+                if next_event is None:
+                    next_event = asyncio.ensure_future(subscription.get())
+                done, _ = await asyncio.wait(
+                    {next_event, disconnected}, timeout=SEAT_STREAM_HEARTBEAT_SECONDS, return_when=asyncio.FIRST_COMPLETED
+                )
+                if disconnected in done:
+                    break
+                if subscription.overflowed:
+                    await self._send_chunk(send, sse_message("resync", {"schedule_id": schedule_id}))
+                    break
+                if next_event in done:
+                    event = next_event.result()
+                    next_event = None
+                    await self._send_chunk(send, sse_message(event["type"], event))
+                else:
+                    await self._send_chunk(send, SSE_KEEPALIVE)
+            await send({'type': 'http.response.body', 'body': b''})
+        except asyncio.TimeoutError:
+            await self._send_json(send, {"error": "Request timed out."}, 504)
+        except OverloadError as e:
+            logging.warning("ASGI - %s shed: %s", scope['path'], e)
+            await self._send_json(send, {"error": "Server busy, please retry."}, 503,
+                                  [(b'retry-after', str(ADMISSION_RETRY_AFTER_SECONDS).encode())])
+        finally:
+            subscription.close()
+            disconnected.cancel()
+            if next_event is not None:
+                next_event.cancel()
+
+    async def _wait_for_disconnect(self, receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    async def _send_chunk(self, send, text):
+        await send({'type': 'http.response.body', 'body': text.encode('utf-8'), 'more_body': True})
+
+    async def _send_body(self, send, status, headers, body):
+        raw_headers = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+        if status != 304:
+            raw_headers.append((b'content-length', str(len(body)).encode()))
+        await send({'type': 'http.response.start', 'status': status, 'headers': raw_headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _send_json(self, send, payload, status, extra_headers=()):
+        body = json.dumps(payload).encode('utf-8')
+        headers = [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+        headers.extend(extra_headers)
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await asyncio.get_running_loop().run_in_executor(self.executor, warm_caches)
+                logging.info("ASGI application started.")
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                self.flask_app.extensions['db_pool'].dispose()
+                logging.info("ASGI application stopped.")
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+application = BookingASGIApp(
+    app,
+    max_concurrency=int(os.environ.get('READ_API_MAX_CONCURRENCY', 1000)),
+    queue_timeout=float(os.environ.get('READ_API_QUEUE_TIMEOUT', 5)),
+    request_timeout=float(os.environ.get('READ_API_TIMEOUT', 10)),
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(
+        'asgi:application',
+        host=os.environ.get('HOST', '0.0.0.0'),
+        port=int(os.environ.get('PORT', 8080)),
+        workers=int(os.environ.get('WEB_CONCURRENCY', 1)),
+    )
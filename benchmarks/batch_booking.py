@@ -0,0 +1,67 @@
+"""
+Compares the throughput of booking seats one CALL BookSeat at a time (one commit per seat)
+with ConnectDB.book_seats (one transaction per batch).
+
+Runs against a real MySQL database loaded with SQLscript.sql. A scratch schedule is created
+on bus 1 / route 1 for the run and removed afterwards, so the sample data is left untouched.
+
+    python benchmarks/batch_booking.py --seats 400 --batch-size 20
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import ConnectDB  # noqa: E402
+from scratch import BENCH_USER_ID, add_db_arguments, create_scratch_schedule, reset_seats, drop_scratch_schedule  # noqa: E402
+
+
+def run_per_seat(conn, schedule_id, seats):
+    started = time.perf_counter()
+    booked = sum(1 for seat_number in range(1, seats + 1) if conn.book_seat(schedule_id, seat_number, BENCH_USER_ID))
+    return booked, time.perf_counter() - started
+
+
+def run_batched(conn, schedule_id, seats, batch_size):
+    started = time.perf_counter()
+    booked = 0
+    for first in range(1, seats + 1, batch_size):
+        batch = [(schedule_id, seat_number) for seat_number in range(first, min(first + batch_size, seats + 1))]
+        booked += sum(1 for result in conn.book_seats(BENCH_USER_ID, batch) if result['status'] == 'booked')
+    return booked, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_db_arguments(parser)
+    parser.add_argument('--seats', type=int, default=400, help='seats booked per run')
+    parser.add_argument('--batch-size', type=int, default=20, help='seats per book_seats() call')
+    args = parser.parse_args()
+
+    conn = ConnectDB(host=args.host, user=args.user, password=args.password, database=args.database)
+    schedule_id = create_scratch_schedule(conn, args.seats)
+    try:
+        per_seat_booked, per_seat_elapsed = run_per_seat(conn, schedule_id, args.seats)
+        reset_seats(conn, schedule_id, args.seats)
+        batched_booked, batched_elapsed = run_batched(conn, schedule_id, args.seats, args.batch_size)
+    finally:
+        drop_scratch_schedule(conn, schedule_id)
+        conn.close_connection()
+
+    result = {
+        "seats": args.seats,
+        "batch_size": args.batch_size,
+        "per_seat": {"booked": per_seat_booked, "seconds": round(per_seat_elapsed, 4),
+                     "seats_per_sec": round(per_seat_booked / per_seat_elapsed, 1)},
+        "batched": {"booked": batched_booked, "seconds": round(batched_elapsed, 4),
+                    "seats_per_sec": round(batched_booked / batched_elapsed, 1)},
+    }
+    result["speedup"] = round(per_seat_elapsed / batched_elapsed, 2)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""
+Load test for the booking engine: many threads race to hold and confirm seats on ONE schedule.
+
+Every thread loops over random seats of a scratch schedule, taking a hold through
+BookingEngine.hold and confirming it with BookingEngine.confirm (or booking directly with
+--no-holds). When the run ends, the database is checked for the booking invariants:
+
+  * no seat has more than one row in 'booking';
+  * booked seats + remaining 'availableseats' rows == seats on the schedule;
+  * the free-seat count in 'schedule_inventory' == remaining 'availableseats' rows;
+  * the number of confirmations reported by the engine == rows in 'booking'.
+
+The script exits with status 1 if any invariant is violated.
+
+    python benchmarks/booking_load.py --threads 64 --attempts 50
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from booking_engine import BookingEngine, BookingError, SeatHoldStore  # noqa: E402
+from modules import ConnectDB  # noqa: E402
+from pool import ConnectionPool  # noqa: E402
+from seat_cache import SeatMapCache  # noqa: E402
+from scratch import add_db_arguments, create_scratch_schedule, drop_scratch_schedule, latency_summary  # noqa: E402
+
+
+def worker(worker_id, args, pool, seat_cache, engine, schedule_id, results, start_barrier):
+    rng = random.Random(worker_id)
+    outcomes = Counter()
+    latencies = []
+    user_id = 1 + worker_id % 3  # the three sample users
+    start_barrier.wait()
+    for _ in range(args.attempts):
+        conn = ConnectDB(pool=pool, seat_cache=seat_cache)
+        seat_number = rng.randint(1, args.seats)
+        started = time.perf_counter()
+        try:
+            if args.no_holds:
+                engine.book(conn, schedule_id, seat_number, user_id)
+            else:
+                hold = engine.hold(conn, schedule_id, seat_number, user_id)
+                engine.confirm(conn, hold.token, user_id)
+            outcome = "booked"
+        except BookingError as e:
+            outcome = e.reason
+        except ConnectionError:
+            outcome = "connection_error"
+        finally:
+            conn.close_connection()
+        latencies.append(time.perf_counter() - started)
+        outcomes[outcome] += 1
+    results.append((outcomes, latencies))  # list.append is atomic; merged after join()
+
+
+def check_invariants(conn, schedule_id, seats, confirmed):
+    db_conn = conn.connect_to_db()
+    cursor = db_conn.cursor()
+    cursor.execute(
+        "SELECT SeatNumber, COUNT(*) FROM booking WHERE ScheduleID = %s GROUP BY SeatNumber HAVING COUNT(*) > 1;",
+        (schedule_id,),
+    )
+    double_booked = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT COUNT(*) FROM booking WHERE ScheduleID = %s;", (schedule_id,))
+    booking_rows = cursor.fetchone()[0]
+    cursor.execute("SELECT COUNT(*) FROM availableseats WHERE ScheduleID = %s;", (schedule_id,))
+    available_rows = cursor.fetchone()[0]
+    cursor.execute("SELECT FreeSeats FROM schedule_inventory WHERE ScheduleID = %s;", (schedule_id,))
+    free_seats = cursor.fetchone()[0]
+    db_conn.commit()
+    cursor.close()
+
+    violations = []
+    if double_booked:
+        violations.append(f"double-booked seats: {double_booked}")
+    if booking_rows + available_rows != seats:
+        violations.append(f"booked ({booking_rows}) + available ({available_rows}) != seats ({seats})")
+    if free_seats != available_rows:
+        violations.append(f"schedule_inventory.FreeSeats ({free_seats}) != available ({available_rows})")
+    if booking_rows != confirmed:
+        violations.append(f"engine confirmed {confirmed} bookings but 'booking' has {booking_rows} rows")
+    return {"booking_rows": booking_rows, "available_rows": available_rows, "inventory_free_seats": free_seats,
+            "violations": violations}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_db_arguments(parser)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--attempts', type=int, default=50, help='booking attempts per thread')
+    parser.add_argument('--seats', type=int, default=40, help='seats on the scratch schedule (at most the bus capacity, 40)')
+    parser.add_argument('--no-holds', action='store_true', help='book directly instead of hold + confirm')
+    args = parser.parse_args()
+
+    pool = ConnectionPool.for_mysql(host=args.host, port=args.port, user=args.user, password=args.password, database=args.database,
+                                    pool_size=args.threads, max_overflow=0)
+    admin = ConnectDB(pool=pool)
+    schedule_id = create_scratch_schedule(admin, args.seats)
+    admin.close_connection()
+
+    seat_cache = SeatMapCache()
+    engine = BookingEngine(SeatHoldStore(ttl=30))
+    results = []
+    start_barrier = threading.Barrier(args.threads)
+    threads = [
+        threading.Thread(target=worker, args=(i, args, pool, seat_cache, engine, schedule_id, results, start_barrier))
+        for i in range(args.threads)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    outcomes = Counter()
+    latencies = []
+    for worker_outcomes, worker_latencies in results:
+        outcomes.update(worker_outcomes)
+        latencies.extend(worker_latencies)
+
+    admin = ConnectDB(pool=pool)
+    try:
+        invariants = check_invariants(admin, schedule_id, args.seats, outcomes["booked"])
+    finally:
+        drop_scratch_schedule(admin, schedule_id)
+        admin.close_connection()
+
+    attempts = args.threads * args.attempts
+    report = {
+        "threads": args.threads,
+        "attempts": attempts,
+        "mode": "direct" if args.no_holds else "hold+confirm",
+        "seconds": round(elapsed, 3),
+        "attempts_per_sec": round(attempts / elapsed, 1),
+        "latency_ms": latency_summary(latencies),
+        "outcomes": dict(outcomes),
+        "invariants": invariants,
+        "pool": pool.stats(),
+    }
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if invariants["violations"] else 0)
+
+
+if __name__ == '__main__':
+    main()
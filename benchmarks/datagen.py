@@ -0,0 +1,188 @@
+"""
+Synthetic data generator for the benchmarks.
+
+Appends companies, buses, routes, schedules, seats and bookings to MySQL or to the SQLite
+stand-in, scaling to millions of rows: with the defaults below (200 routes, 365 days,
+4 departures a day, ~40 seats a bus) it writes ~290k schedules and ~11.7M seat rows
+(availableseats + booking), then rebuilds the search summary (schedule_inventory). The same --seed and --start-date always produce the same data.
+
+IDs continue from the current maximum of each table, so the sample data in SQLscript.sql
+(and any earlier run) is left in place. Rows are written in chunks of --chunk-size with one
+commit per chunk.
+
+    python benchmarks/datagen.py --backend sqlite --reset --routes 50 --days 90
+    python benchmarks/datagen.py --backend mysql --routes 200 --days 365
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scratch import add_backend_arguments, connection_creator  # noqa: E402
+
+SEAT_CAPACITIES = (30, 40, 50)
+DEPARTURE_HOURS = (6, 8, 10, 12, 14, 16, 18, 20, 22)
+# Child table -> parent tables whose pending rows are written first (foreign keys)
+PARENTS = {'availableseats': ('schedule',), 'booking': ('schedule',)}
+
+
+def max_id(cursor, table, column):
+    cursor.execute(f"SELECT COALESCE(MAX({column}), 0) FROM {table};")
+    return cursor.fetchone()[0]
+
+
+class Loader:
+    def __init__(self, connection, chunk_size):
+        """
+        Buffers rows per INSERT statement and writes them with executemany, committing per chunk.
+        """
+        self.connection = connection
+        self.cursor = connection.cursor()
+        self.chunk_size = chunk_size
+        self.counts = {}
+        self._pending = {}  # table -> (statement, rows)
+
+    def add(self, table, statement, row):
+        _, rows = self._pending.setdefault(table, (statement, []))
+        rows.append(row)
+        if len(rows) >= self.chunk_size:
+            self.flush(table)
+
+    def flush(self, table=None):
+        for name in ([table] if table else list(self._pending)):
+            for parent in PARENTS.get(name, ()):
+                self.flush(parent)
+            statement, rows = self._pending.pop(name, (None, []))
+            if rows:
+                self.cursor.executemany(statement, rows)
+                self.connection.commit()
+                self.counts[name] = self.counts.get(name, 0) + len(rows)
+                print(f"  {name}: {self.counts[name]} rows", file=sys.stderr, end='\r')
+
+
+def generate(connection, args):
+    rng = random.Random(args.seed)
+    loader = Loader(connection, args.chunk_size)
+    cursor = loader.cursor
+
+    first_user = max_id(cursor, 'user', 'UserID') + 1
+    first_company = max_id(cursor, 'buscompany', 'CompanyID') + 1
+    first_bus = max_id(cursor, 'bus', 'BusID') + 1
+    first_route = max_id(cursor, 'route', 'RouteID') + 1
+    first_schedule = max_id(cursor, 'schedule', 'ScheduleID') + 1
+
+    for user_id in range(first_user, first_user + args.users):
+        loader.add('user', "INSERT INTO user (UserID, FirstName, LastName, Email, PhoneNumber, Password) "
+                           "VALUES (%s, %s, %s, %s, %s, %s);",
+                   (user_id, f"Bench{user_id}", "User", f"bench_{user_id}@example.com", "000-000-0000", "password"))
+    for company_id in range(first_company, first_company + args.companies):
+        loader.add('buscompany', "INSERT INTO buscompany (CompanyID, CompanyName, ContactNumber, Email) VALUES (%s, %s, %s, %s);",
+                   (company_id, f"Bench Lines {company_id}", "0000000000", f"info{company_id}@example.com"))
+    capacities = {}
+    for bus_id in range(first_bus, first_bus + args.buses):
+        capacities[bus_id] = rng.choice(SEAT_CAPACITIES)
+        loader.add('bus', "INSERT INTO bus (BusID, CompanyID, BusNumber, SeatCapacity) VALUES (%s, %s, %s, %s);",
+                   (bus_id, rng.randrange(first_company, first_company + args.companies), f"BN{bus_id:07d}", capacities[bus_id]))
+
+    cities = [f"City {index:03d}" for index in range(args.cities)]
+    pairs = [(source, destination) for source in cities for destination in cities if source != destination]
+    routes = rng.sample(pairs, min(args.routes, len(pairs)))
+    for route_id, (source, destination) in enumerate(routes, start=first_route):
+        loader.add('route', "INSERT INTO route (RouteID, Source, Destination, Distance) VALUES (%s, %s, %s, %s);",
+                   (route_id, source, destination, rng.randint(20, 900)))
+    loader.flush()
+
+    schedule_id = first_schedule
+    start = args.start_date
+    for day in range(args.days):
+        departure_date = start + datetime.timedelta(days=day)
+        for route_id in range(first_route, first_route + len(routes)):
+            for hour in rng.sample(DEPARTURE_HOURS, min(args.departures, len(DEPARTURE_HOURS))):
+                bus_id = rng.randrange(first_bus, first_bus + args.buses)
+                duration = rng.randint(1, 9)
+                loader.add('schedule', "INSERT INTO schedule (ScheduleID, BusID, RouteID, DepartureDate, DepartureTime, "
+                                       "ArrivalTime, Price) VALUES (%s, %s, %s, %s, %s, %s, %s);",
+                           (schedule_id, bus_id, route_id, departure_date.isoformat(),
+                            f"{hour:02d}:00:00", f"{(hour + duration) % 24:02d}:00:00", rng.randint(300, 9000) / 100))
+                for seat_number in range(1, capacities[bus_id] + 1):
+                    if rng.random() < args.booked_fraction:
+                        loader.add('booking', "INSERT INTO booking (ScheduleID, UserID, SeatNumber) VALUES (%s, %s, %s);",
+                                   (schedule_id, rng.randrange(first_user, first_user + args.users), seat_number))
+                    else:
+                        loader.add('availableseats', "INSERT INTO availableseats (ScheduleID, SeatNumber) VALUES (%s, %s);",
+                                   (schedule_id, seat_number))
+                schedule_id += 1
+    loader.flush()
+    print(file=sys.stderr)
+
+    # Search summary rows for everything just loaded
+    cursor.execute("CALL RefreshScheduleInventory(%s);", (None,))
+    connection.commit()
+    cursor.execute("SELECT COUNT(*) FROM schedule_inventory;")
+    loader.counts['schedule_inventory'] = cursor.fetchone()[0]
+    return loader.counts
+
+
+def reset(connection, args):
+    cursor = connection.cursor()
+    if args.backend == 'sqlite':
+        import sqlite_standin
+        sqlite_standin.create_schema(connection)
+    for table in ('booking_history', 'schedule_history', 'schedule_inventory', 'booking', 'availableseats', 'schedule', 'route', 'bus', 'buscompany', 'user'):
+        cursor.execute(f"DELETE FROM {table};")
+    connection.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_backend_arguments(parser)
+    parser.add_argument('--reset', action='store_true', help='delete all existing rows first (creates the schema on sqlite)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--cities', type=int, default=40)
+    parser.add_argument('--routes', type=int, default=200)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--departures', type=int, default=4, help='departures per route per day')
+    parser.add_argument('--start-date', type=datetime.date.fromisoformat, default=datetime.date.today())
+    parser.add_argument('--companies', type=int, default=20)
+    parser.add_argument('--buses', type=int, default=500)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--booked-fraction', type=float, default=0.3, help='share of seats already booked')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='rows per INSERT batch and commit')
+    args = parser.parse_args()
+
+    connection = connection_creator(args)()
+    if args.backend == 'sqlite' and not args.reset:
+        import sqlite_standin
+        sqlite_standin.create_schema(connection)
+    cursor = connection.cursor()
+    if args.backend == 'mysql':
+        # Generated rows are consistent by construction; skip per-row FK checks while loading
+        cursor.execute("SET SESSION foreign_key_checks = 0;")
+    if args.reset:
+        reset(connection, args)
+
+    started = time.perf_counter()
+    try:
+        counts = generate(connection, args)
+    finally:
+        if args.backend == 'mysql':
+            cursor.execute("SET SESSION foreign_key_checks = 1;")
+        connection.close()
+    elapsed = time.perf_counter() - started
+    print(json.dumps({
+        "backend": args.backend,
+        "seed": args.seed,
+        "rows": counts,
+        "total_rows": sum(counts.values()),
+        "seconds": round(elapsed, 1),
+        "rows_per_sec": round(sum(counts.values()) / elapsed),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Compares bookings/sec of the synchronous booking path (one CALL BookSeatForUser and one commit
+per seat, as the booking form does) with the group-commit queue behind /api/book_async
+(group_commit.GroupCommitQueue: many bookings per transaction, one commit per group).
+
+--clients threads each book their own share of --seats seats on a scratch schedule, first
+synchronously, then by submitting to the queue and waiting for the ticket. Runs against a real
+MySQL database loaded with SQLscript.sql; the scratch schedule is removed afterwards. The gap
+grows with the cost of a commit (innodb_flush_log_at_trx_commit=1, sync_binlog=1 on slow disks).
+
+    python benchmarks/group_booking.py --clients 32 --seats 2000 --max-batch 64
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from group_commit import GroupCommitQueue  # noqa: E402
+from modules import ConnectDB  # noqa: E402
+from pool import ConnectionPool  # noqa: E402
+from scratch import (BENCH_USER_ID, add_db_arguments, create_scratch_schedule, drop_scratch_schedule,  # noqa: E402
+                     latency_summary, reset_seats)
+
+
+def run_clients(clients, seats, book_one):
+    """
+    Runs `clients` threads, client i booking seats i+1, i+1+clients, ... with book_one(seat_number),
+    which returns the booking status. Returns (booked, elapsed, latencies).
+    """
+    results = []
+    start_barrier = threading.Barrier(clients)
+
+    def client(number):
+        booked = 0
+        latencies = []
+        start_barrier.wait()
+        for seat_number in range(number + 1, seats + 1, clients):
+            started = time.perf_counter()
+            if book_one(seat_number) == 'booked':
+                booked += 1
+            latencies.append(time.perf_counter() - started)
+        results.append((booked, latencies))  # list.append is atomic; merged after join()
+
+    threads = [threading.Thread(target=client, args=(number,)) for number in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return sum(booked for booked, _ in results), elapsed, [latency for _, latencies in results for latency in latencies]
+
+
+def summarize(booked, elapsed, latencies):
+    return {"booked": booked, "seconds": round(elapsed, 4), "bookings_per_sec": round(booked / elapsed, 1),
+            "latency_ms": latency_summary(latencies)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_db_arguments(parser)
+    parser.add_argument('--clients', type=int, default=32, help='concurrent booking threads')
+    parser.add_argument('--seats', type=int, default=2000, help='seats booked per run')
+    parser.add_argument('--max-batch', type=int, default=64, help='largest group applied in one commit')
+    parser.add_argument('--max-wait-ms', type=float, default=2.0, help='how long an idle worker waits to fill a group')
+    parser.add_argument('--workers', type=int, default=1, help='group commit worker threads')
+    args = parser.parse_args()
+
+    pool = ConnectionPool.for_mysql(host=args.host, port=args.port, user=args.user, password=args.password, database=args.database,
+                                    pool_size=args.clients + args.workers, max_overflow=0)
+    admin = ConnectDB(pool=pool)
+    schedule_id = create_scratch_schedule(admin, args.seats)
+    try:
+        def book_synchronously(seat_number):
+            conn = ConnectDB(pool=pool)
+            try:
+                return conn.book_seat_for_user(schedule_id, seat_number, BENCH_USER_ID)
+            finally:
+                conn.close_connection()
+
+        per_seat = summarize(*run_clients(args.clients, args.seats, book_synchronously))
+        reset_seats(admin, schedule_id, args.seats)
+
+        queue = GroupCommitQueue(lambda: ConnectDB(pool=pool), max_batch=args.max_batch,
+                                 max_wait=args.max_wait_ms / 1000, workers=args.workers)
+
+        def book_through_queue(seat_number):
+            ticket = queue.submit(schedule_id, seat_number, BENCH_USER_ID)
+            ticket.wait()
+            return ticket.status
+
+        grouped = summarize(*run_clients(args.clients, args.seats, book_through_queue))
+        grouped["queue"] = queue.stats()
+        queue.stop()
+    finally:
+        drop_scratch_schedule(admin, schedule_id)
+        admin.close_connection()
+
+    result = {
+        "clients": args.clients,
+        "seats": args.seats,
+        "per_seat_commit": per_seat,
+        "group_commit": grouped,
+        "speedup": round(grouped["bookings_per_sec"] / per_seat["bookings_per_sec"], 2) if per_seat["bookings_per_sec"] else None,
+    }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
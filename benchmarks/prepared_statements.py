@@ -0,0 +1,110 @@
+"""
+Measures ConnectDB's read queries with and without server-side prepared statements
+(statements.StatementRegistry): time per call, and the memory held by the rows a call returns
+(tracemalloc), which shows the saving of namedtuple rows over per-row dicts.
+
+Each query runs --calls times on one pooled connection, first with plain dictionary cursors,
+then with the registry (the first prepared call, which prepares the statement, is a warm-up).
+Use the data from datagen.py so the result sets have a realistic size:
+
+    python benchmarks/datagen.py --reset --routes 50 --days 90
+    python benchmarks/prepared_statements.py --calls 2000
+
+On the SQLite stand-in (--backend sqlite) nothing is prepared server-side, so only the row
+allocation difference shows; run against MySQL for the parse-time saving.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import ConnectDB  # noqa: E402
+from pool import ConnectionPool  # noqa: E402
+from statements import StatementRegistry  # noqa: E402
+from scratch import add_backend_arguments, connection_creator  # noqa: E402
+
+
+def sample_arguments(conn):
+    """
+    A busy route with upcoming departures and one of its schedules.
+    """
+    cursor = conn.connect_to_db().cursor()
+    cursor.execute(
+        "SELECT r.Source, r.Destination, s.ScheduleID, s.DepartureDate FROM schedule s "
+        "JOIN route r ON s.RouteID = r.RouteID WHERE s.DepartureDate >= %s "
+        "ORDER BY s.DepartureDate, s.ScheduleID LIMIT 1;",
+        (date.today(),),
+    )
+    row = cursor.fetchone()
+    cursor.close()
+    conn.connect_to_db().commit()
+    if row is None:
+        sys.exit("No upcoming schedules: load some with datagen.py first.")
+    return row
+
+
+def queries(source, destination, schedule_id, travel_date):
+    return {
+        "find_available_buses": lambda conn: conn.find_available_buses(source, destination, travel_date),
+        "get_available_bus_schedules": lambda conn: conn.get_available_bus_schedules(source, destination),
+        "search_schedules": lambda conn: conn.search_schedules(source, destination, travel_date, travel_date + timedelta(days=30)),
+        "get_seat_availability": lambda conn: conn.get_seat_availability(schedule_id),
+        "get_schedule_details_by_id": lambda conn: conn.get_schedule_details_by_id(schedule_id),
+        "check_user_exists": lambda conn: conn.check_user_exists(1),
+    }
+
+
+def measure(conn, query, calls):
+    query(conn)  # warm-up (prepares the statement when the registry is on)
+    started = time.perf_counter()
+    for _ in range(calls):
+        query(conn)
+    elapsed = time.perf_counter() - started
+
+    # Memory held by the returned rows: keep 100 results alive and see what they occupy
+    tracemalloc.start()
+    results = [query(conn) for _ in range(100)]
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del results
+    return {"us_per_call": round(elapsed / calls * 1e6, 1), "result_bytes": round(held / 100)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_backend_arguments(parser)
+    parser.add_argument('--calls', type=int, default=2000, help='calls per query and mode')
+    args = parser.parse_args()
+
+    pool = ConnectionPool(connection_creator(args), pool_size=1, max_overflow=0)
+    conn = ConnectDB(pool=pool)
+    source, destination, schedule_id, travel_date = sample_arguments(conn)
+    conn.close_connection()
+    if not isinstance(travel_date, date):
+        travel_date = date.fromisoformat(str(travel_date))
+
+    registry = StatementRegistry()
+    report = {"backend": args.backend, "calls": args.calls, "queries": {}}
+    for name, query in queries(source, destination, schedule_id, travel_date).items():
+        plain = ConnectDB(pool=pool)
+        prepared = ConnectDB(pool=pool, statements=registry)
+        try:
+            result = {"plain": measure(plain, query, args.calls)}
+            plain.close_connection()
+            result["prepared"] = measure(prepared, query, args.calls)
+        finally:
+            plain.close_connection()
+            prepared.close_connection()
+        result["speedup"] = round(result["plain"]["us_per_call"] / result["prepared"]["us_per_call"], 2)
+        report["queries"][name] = result
+    report["registry"] = registry.stats()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Checks read/write splitting against a primary and one or more MySQL replicas.
+
+Point it at the primary (--host/--port, as for the other scripts) and the replicas
+(--replica host:port, repeatable). Two local MySQL instances are enough, e.g.
+
+    docker run -d --name primary -p 3306:3306 -e MYSQL_ROOT_PASSWORD=0000 mysql:8 --server-id=1 --log-bin
+    docker run -d --name replica -p 3307:3306 -e MYSQL_ROOT_PASSWORD=0000 mysql:8 --server-id=2
+    (load SQLscript.sql into both, then CHANGE REPLICATION SOURCE TO ... / START REPLICA on the replica)
+
+    python benchmarks/replica_check.py --replica 127.0.0.1:3307
+
+The script reports the lag and latency of each replica, then checks that:
+
+  * read-only ConnectDB queries are served by a replica (round robin spreads them);
+  * after a booking, the same ConnectDB (and a session flagged read_from_primary) reads from
+    the primary and sees the booking;
+  * the replica catches up with the booking within --max-lag seconds.
+
+A replica that is not replicating yet (no replica status) counts as 0s behind, so the routing
+checks also run against two independent servers loaded with the same data; only the last check
+needs real replication. The script exits with status 1 if a check fails.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import ConnectDB  # noqa: E402
+from pool import ConnectionPool  # noqa: E402
+from topology import ReplicaSet, parse_replicas  # noqa: E402
+from scratch import BENCH_USER_ID, add_db_arguments, create_scratch_schedule, drop_scratch_schedule  # noqa: E402
+
+
+def server_id(connection):
+    cursor = connection.cursor()
+    cursor.execute("SELECT @@server_id;")
+    value = cursor.fetchone()[0]
+    cursor.close()
+    connection.commit()
+    return value
+
+
+def seat_booked(connection, schedule_id, seat_number):
+    cursor = connection.cursor()
+    cursor.execute("SELECT COUNT(*) FROM booking WHERE ScheduleID = %s AND SeatNumber = %s;", (schedule_id, seat_number))
+    count = cursor.fetchone()[0]
+    cursor.close()
+    connection.commit()  # ends the snapshot, so the next read sees newly replicated rows
+    return count > 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_db_arguments(parser)
+    parser.add_argument('--replica', action='append', required=True, help='replica as host:port (repeatable)')
+    parser.add_argument('--strategy', choices=ReplicaSet.STRATEGIES, default='round_robin')
+    parser.add_argument('--max-lag', type=float, default=5.0, help='seconds allowed for the replica to catch up')
+    parser.add_argument('--reads', type=int, default=20, help='read queries used to check the routing')
+    args = parser.parse_args()
+
+    credentials = dict(user=args.user, password=args.password, database=args.database)
+    primary = ConnectionPool.for_mysql(host=args.host, port=args.port, **credentials)
+    replicas = ReplicaSet([(name, ConnectionPool.for_mysql(host=host, port=port, **credentials))
+                           for name, host, port in parse_replicas(','.join(args.replica))],
+                          strategy=args.strategy, max_lag_seconds=args.max_lag)
+    replicas.check_replicas()
+    failures = []
+    report = {"replicas": {replica.name: {"healthy": replica.healthy, "lag_seconds": replica.lag_seconds,
+                                          "latency_ms": round((replica.latency or 0) * 1000, 3),
+                                          "ejected_reason": replica.ejected_reason} for replica in replicas.replicas}}
+    if not any(replica.healthy for replica in replicas.replicas):
+        failures.append("no healthy replica")
+
+    connection = primary.acquire()
+    primary_server = server_id(connection)
+    primary.release(connection)
+
+    # Read-only queries go to the replicas
+    served_by = {}
+    for _ in range(args.reads):
+        conn = ConnectDB(pool=primary, replicas=replicas)
+        conn.get_available_bus_schedules('City A', 'City B')
+        target = conn._replica.name if conn._replica is not None else 'primary'
+        served_by[target] = served_by.get(target, 0) + 1
+        conn.close_connection()
+    report["reads_served_by"] = served_by
+    if served_by.get('primary'):
+        failures.append(f"{served_by['primary']} of {args.reads} reads went to the primary")
+
+    # A booking, then reads by the same session
+    setup = ConnectDB(pool=primary)
+    schedule_id = create_scratch_schedule(setup, seats=10)
+    try:
+        conn = ConnectDB(pool=primary, replicas=replicas)
+        status = conn.book_seat_for_user(schedule_id, 1, BENCH_USER_ID)
+        seat_map = conn.get_seat_availability(schedule_id)
+        read_server = server_id(conn._get_read_connection())
+        conn.close_connection()
+        report["booking"] = {"status": status, "read_back_from_primary": read_server == primary_server,
+                             "visible_to_session": 1 in seat_map["occupied_seats"]}
+        if status != 'booked' or read_server != primary_server or 1 not in seat_map["occupied_seats"]:
+            failures.append("the booking session did not read its own write from the primary")
+
+        sticky = ConnectDB(pool=primary, replicas=replicas, read_from_primary=True)
+        if server_id(sticky._get_read_connection()) != primary_server:
+            failures.append("a read_from_primary session was served by a replica")
+        sticky.close_connection()
+
+        # Replication catches up
+        for replica in replicas.replicas:
+            replica_connection = replica.pool.acquire()
+            started = time.perf_counter()
+            while not seat_booked(replica_connection, schedule_id, 1) and time.perf_counter() - started < args.max_lag:
+                time.sleep(0.05)
+            caught_up = seat_booked(replica_connection, schedule_id, 1)
+            replica.pool.release(replica_connection)
+            report["replicas"][replica.name]["booking_replicated_ms"] = (
+                round((time.perf_counter() - started) * 1000, 1) if caught_up else None)
+            if not caught_up:
+                failures.append(f"replica {replica.name} did not apply the booking within {args.max_lag}s")
+    finally:
+        drop_scratch_schedule(setup, schedule_id)
+        setup.close_connection()
+
+    report["failures"] = failures
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
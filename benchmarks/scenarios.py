@@ -0,0 +1,278 @@
+"""
+Scenario driver: replays the three hot paths of the app and reports throughput and latency.
+
+  dates  -- GET /api/available_dates for a random route
+  seats  -- GET /api/available_seats for a random schedule
+  book   -- POST /api/book_batch of one random seat for a random user
+
+Requests go through the Flask test client (--transport testclient, no network) or over HTTP
+(--transport http), either to a server of your own (--url) or to the app served in-process on
+a local port. The app's connection pool is pointed at the selected backend: MySQL, or the
+SQLite stand-in (load it first with datagen.py). On the sqlite backend each run works on a
+copy of the database file, so booking runs always start from the same data.
+
+Results are printed (or written to --output) as JSON; --baseline compares them with an
+earlier result file.
+
+    python benchmarks/datagen.py --backend sqlite --reset --routes 50 --days 90
+    python benchmarks/scenarios.py --backend sqlite --threads 8 --requests 5000 --output run.json
+    python benchmarks/scenarios.py --backend sqlite --threads 8 --requests 5000 --baseline run.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pool import ConnectionPool  # noqa: E402
+from scratch import add_backend_arguments, connection_creator, latency_summary  # noqa: E402
+
+SCENARIOS = ('dates', 'seats', 'book')
+TABLES = ('route', 'schedule', 'availableseats', 'booking', 'user')
+
+
+class Workload:
+    def __init__(self, connection):
+        """
+        Request parameters sampled from the database: routes, the ScheduleID and UserID ranges.
+        """
+        cursor = connection.cursor()
+        cursor.execute("SELECT DISTINCT r.Source, r.Destination FROM route r JOIN schedule s ON s.RouteID = r.RouteID;")
+        self.routes = cursor.fetchall()
+        cursor.execute("SELECT MIN(ScheduleID), MAX(ScheduleID) FROM schedule;")
+        self.schedule_range = cursor.fetchone()
+        cursor.execute("SELECT MIN(UserID), MAX(UserID) FROM user;")
+        self.user_range = cursor.fetchone()
+        self.row_counts = {}
+        for table in TABLES:
+            cursor.execute(f"SELECT COUNT(*) FROM {table};")
+            self.row_counts[table] = cursor.fetchone()[0]
+        connection.commit()
+        cursor.close()
+        if not self.routes or self.schedule_range[0] is None or self.user_range[0] is None:
+            raise SystemExit("The database has no schedules or users; load it with benchmarks/datagen.py first.")
+
+    def request(self, scenario, rng):
+        """
+        Returns (method, path, json_body) for one request of the scenario.
+        """
+        if scenario == 'dates':
+            source, destination = rng.choice(self.routes)
+            return 'GET', f"/api/available_dates?{urllib.parse.urlencode({'source': source, 'destination': destination})}", None
+        schedule_id = rng.randint(*self.schedule_range)
+        if scenario == 'seats':
+            return 'GET', f"/api/available_seats?schedule_id={schedule_id}", None
+        return 'POST', '/api/book_batch', {
+            "user_id": rng.randint(*self.user_range),
+            "seats": [{"schedule_id": schedule_id, "seat_number": rng.randint(1, 50)}],
+        }
+
+
+def test_client_sender(flask_app):
+    client = flask_app.test_client()  # one per thread
+
+    def send(method, path, body):
+        response = client.open(path, method=method, json=body)
+        response.close()
+        return response.status_code
+    return send
+
+
+def http_sender(base_url):
+    def send(method, path, body):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(base_url + path, data=data, method=method,
+                                         headers={'Content-Type': 'application/json'} if data else {})
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+    return send
+
+
+def run_scenario(scenario, workload, make_sender, args):
+    """
+    Runs args.requests requests of one scenario over args.threads threads (after a warm-up).
+    """
+    per_thread = max(1, args.requests // args.threads)
+    results = []
+    start_barrier = threading.Barrier(args.threads + 1)
+
+    def worker(worker_id):
+        rng = random.Random(f"{args.seed}-{scenario}-{worker_id}")
+        send = make_sender()
+        for _ in range(args.warmup // args.threads):
+            send(*workload.request(scenario, rng))
+        statuses = Counter()
+        latencies = []
+        start_barrier.wait()
+        for _ in range(per_thread):
+            method, path, body = workload.request(scenario, rng)
+            started = time.perf_counter()
+            try:
+                status = send(method, path, body)
+            except OSError:
+                status = 'connection_error'
+            latencies.append(time.perf_counter() - started)
+            statuses[status] += 1
+        results.append((statuses, latencies))  # list.append is atomic; merged after join()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    statuses = Counter()
+    latencies = []
+    for worker_statuses, worker_latencies in results:
+        statuses.update(worker_statuses)
+        latencies.extend(worker_latencies)
+    errors = sum(count for status, count in statuses.items() if status == 'connection_error' or status >= 500)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "latency_ms": latency_summary(latencies),
+    }
+
+
+def serve_in_background(flask_app):
+    from werkzeug.serving import make_server
+    server = make_server('127.0.0.1', 0, flask_app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='bench-http', daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(result, baseline):
+    """
+    Per-scenario change in throughput and latency percentiles against a baseline result.
+    """
+    comparison = {}
+    for scenario, current in result["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(scenario)
+        if not before:
+            continue
+        change = {"throughput_rps": f"{(current['throughput_rps'] / before['throughput_rps'] - 1) * 100:+.1f}%"}
+        for name in ("p50", "p95", "p99"):
+            if before["latency_ms"][name]:
+                change[name] = f"{(current['latency_ms'][name] / before['latency_ms'][name] - 1) * 100:+.1f}%"
+        comparison[scenario] = change
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_backend_arguments(parser)
+    parser.add_argument('--transport', choices=('testclient', 'http'), default='testclient')
+    parser.add_argument('--url', help='base URL of a running server (http transport); the app is served in-process otherwise')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='comma-separated subset of: ' + ', '.join(SCENARIOS))
+    parser.add_argument('--requests', type=int, default=2000, help='measured requests per scenario')
+    parser.add_argument('--warmup', type=int, default=200, help='unmeasured requests per scenario')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--in-place', action='store_true', help='sqlite: run against the database file itself, not a copy')
+    parser.add_argument('--output', help='write the JSON result to this file instead of stdout')
+    parser.add_argument('--baseline', help='earlier JSON result to compare with')
+    args = parser.parse_args()
+    scenarios = [name for name in args.scenarios.split(',') if name]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    copy_dir = None
+    if args.backend == 'sqlite' and not args.in_place:
+        import sqlite_standin
+        source = args.sqlite_path or sqlite_standin.DEFAULT_PATH
+        if not os.path.exists(source):
+            raise SystemExit(f"{source} does not exist; load it with benchmarks/datagen.py --backend sqlite --reset first.")
+        sqlite_standin.connect(source).close()  # checkpoints the WAL into the main file
+        copy_dir = tempfile.mkdtemp(prefix='bus_booking_bench_')
+        args.sqlite_path = os.path.join(copy_dir, os.path.basename(source))
+        shutil.copyfile(source, args.sqlite_path)
+
+    creator = connection_creator(args)
+    connection = creator()
+    workload = Workload(connection)
+    connection.close()
+
+    server = None
+    if args.transport == 'http' and args.url:
+        base_url = args.url.rstrip('/')
+        make_sender = lambda: http_sender(base_url)  # noqa: E731
+    else:
+        from app import app as flask_app, warm_caches
+        flask_app.extensions['db_pool'] = ConnectionPool(creator, pool_size=args.threads, max_overflow=0)
+        warm_caches()
+        if args.transport == 'http':
+            server, base_url = serve_in_background(flask_app)
+            make_sender = lambda: http_sender(base_url)  # noqa: E731
+        else:
+            make_sender = lambda: test_client_sender(flask_app)  # noqa: E731
+
+    try:
+        result = {
+            "meta": {
+                "timestamp": datetime.now().isoformat(timespec='seconds'),
+                "git_revision": git_revision(),
+                "python": platform.python_version(),
+                "backend": args.backend,
+                "transport": args.transport,
+                "url": args.url,
+                "threads": args.threads,
+                "seed": args.seed,
+            },
+            "dataset": workload.row_counts,
+            "scenarios": {},
+        }
+        for scenario in scenarios:
+            print(f"running {scenario} ...", file=sys.stderr)
+            result["scenarios"][scenario] = run_scenario(scenario, workload, make_sender, args)
+    finally:
+        if server is not None:
+            server.shutdown()
+        if copy_dir is not None:
+            shutil.rmtree(copy_dir, ignore_errors=True)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            result["comparison"] = compare(result, json.load(baseline_file))
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output + "\n")
+        print(f"results written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
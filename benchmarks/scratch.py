@@ -0,0 +1,91 @@
+"""
+Helpers shared by the benchmark scripts: database arguments, latency percentiles and a
+throw-away schedule (on bus 1 / route 1 of the sample data) that runs can book freely and then drop.
+"""
+import os
+
+BENCH_USER_ID = 1
+
+
+def add_db_arguments(parser):
+    parser.add_argument('--host', default=os.environ.get('DB_HOST', 'localhost'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('DB_PORT', 3306)))
+    parser.add_argument('--user', default=os.environ.get('DB_USER', 'root'))
+    parser.add_argument('--password', default=os.environ.get('DB_PASSWORD', '0000'))
+    parser.add_argument('--database', default=os.environ.get('DB_NAME', 'bus_booking_system'))
+
+
+def add_backend_arguments(parser):
+    """
+    Database arguments plus the choice between MySQL and the SQLite stand-in (sqlite_standin.py).
+    """
+    add_db_arguments(parser)
+    parser.add_argument('--backend', choices=('mysql', 'sqlite'), default='mysql')
+    parser.add_argument('--sqlite-path', default=None, help='SQLite database file (sqlite backend)')
+
+
+def connection_creator(args):
+    """
+    Returns a zero-argument callable opening a connection to the selected backend,
+    suitable for pool.ConnectionPool.
+    """
+    if args.backend == 'sqlite':
+        import sqlite_standin
+        path = args.sqlite_path or sqlite_standin.DEFAULT_PATH
+        return lambda: sqlite_standin.connect(path)
+    import mysql.connector
+    return lambda: mysql.connector.connect(host=args.host, port=args.port, user=args.user, password=args.password, database=args.database)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def latency_summary(latencies):
+    """
+    p50/p95/p99/max of a list of latencies in seconds, in milliseconds.
+    """
+    ordered = sorted(latencies)
+    summary = {name: round(percentile(ordered, q) * 1000, 2) for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))}
+    summary["max"] = round(ordered[-1] * 1000, 2) if ordered else 0.0
+    return summary
+
+
+def create_scratch_schedule(conn, seats):
+    db_conn = conn.connect_to_db()
+    cursor = db_conn.cursor()
+    cursor.execute(
+        "INSERT INTO schedule (BusID, RouteID, DepartureDate, DepartureTime, ArrivalTime, Price) "
+        "VALUES (1, 1, '2099-01-01', '00:00:00', '01:00:00', 0.00);"
+    )
+    schedule_id = cursor.lastrowid
+    db_conn.commit()
+    cursor.close()
+    reset_seats(conn, schedule_id, seats)
+    return schedule_id
+
+
+def reset_seats(conn, schedule_id, seats):
+    db_conn = conn.connect_to_db()
+    cursor = db_conn.cursor()
+    cursor.execute("DELETE FROM booking WHERE ScheduleID = %s;", (schedule_id,))
+    cursor.execute("DELETE FROM availableseats WHERE ScheduleID = %s;", (schedule_id,))
+    cursor.executemany(
+        "INSERT INTO availableseats (ScheduleID, SeatNumber) VALUES (%s, %s);",
+        [(schedule_id, seat_number) for seat_number in range(1, seats + 1)],
+    )
+    cursor.execute("CALL RefreshScheduleInventory(%s);", (schedule_id,))
+    db_conn.commit()
+    cursor.close()
+
+
+def drop_scratch_schedule(conn, schedule_id):
+    db_conn = conn.connect_to_db()
+    cursor = db_conn.cursor()
+    cursor.execute("DELETE FROM booking WHERE ScheduleID = %s;", (schedule_id,))
+    cursor.execute("DELETE FROM availableseats WHERE ScheduleID = %s;", (schedule_id,))
+    cursor.execute("DELETE FROM schedule WHERE ScheduleID = %s;", (schedule_id,))
+    db_conn.commit()
+    cursor.close()
@@ -0,0 +1,399 @@
+"""
+SQLite stand-in for the MySQL database, so the benchmark scenarios can run without a server.
+
+connect() returns a connection exposing the part of the mysql.connector API that ConnectDB and
+ConnectionPool rely on: cursor(dictionary=..., buffered=..., prepared=...), commit, rollback,
+ping, is_connected and close. Queries are translated on the fly (%s placeholders, FOR UPDATE,
+NOW(), '#' comments), stored procedures are emulated in Python (see PROCEDURES), DATE/TIME/DECIMAL
+columns come back as date/timedelta/Decimal like they do from MySQL, and SQLite errors are raised
+as mysql.connector errors with the matching MySQL errno.
+
+It reproduces the query shapes and round trips of the application, not InnoDB: a FOR UPDATE
+takes SQLite's database-wide write lock rather than a row lock, so absolute numbers (and
+contention behaviour in particular) are only comparable between runs on the same backend.
+"""
+import datetime
+import decimal
+import os
+import re
+import sqlite3
+import tempfile
+
+import mysql.connector
+
+DEFAULT_PATH = os.path.join(tempfile.gettempdir(), 'bus_booking_bench.sqlite3')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS user (
+  UserID INTEGER PRIMARY KEY AUTOINCREMENT,
+  FirstName TEXT NOT NULL,
+  LastName TEXT NOT NULL,
+  Email TEXT NOT NULL UNIQUE,
+  PhoneNumber TEXT NULL,
+  Password TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS buscompany (
+  CompanyID INTEGER PRIMARY KEY AUTOINCREMENT,
+  CompanyName TEXT NOT NULL UNIQUE,
+  ContactNumber TEXT NULL,
+  Email TEXT NULL
+);
+CREATE TABLE IF NOT EXISTS bus (
+  BusID INTEGER PRIMARY KEY AUTOINCREMENT,
+  CompanyID INTEGER NOT NULL REFERENCES buscompany (CompanyID),
+  BusNumber TEXT NOT NULL UNIQUE,
+  SeatCapacity INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS fk_bus_buscompany_idx ON bus (CompanyID);
+CREATE TABLE IF NOT EXISTS route (
+  RouteID INTEGER PRIMARY KEY AUTOINCREMENT,
+  Source TEXT NOT NULL,
+  Destination TEXT NOT NULL,
+  Distance DECIMAL NULL
+);
+CREATE INDEX IF NOT EXISTS idx_route_source_destination ON route (Source, Destination);
+CREATE TABLE IF NOT EXISTS schedule (
+  ScheduleID INTEGER PRIMARY KEY AUTOINCREMENT,
+  BusID INTEGER NOT NULL REFERENCES bus (BusID),
+  RouteID INTEGER NOT NULL REFERENCES route (RouteID),
+  DepartureDate DATE NOT NULL,
+  DepartureTime TIME NOT NULL,
+  ArrivalTime TIME NOT NULL,
+  Price DECIMAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS fk_schedule_bus1_idx ON schedule (BusID);
+CREATE INDEX IF NOT EXISTS idx_schedule_route_date ON schedule (RouteID, DepartureDate);
+CREATE INDEX IF NOT EXISTS idx_schedule_departure_date ON schedule (DepartureDate);
+CREATE TABLE IF NOT EXISTS availableseats (
+  ScheduleID INTEGER NOT NULL REFERENCES schedule (ScheduleID) ON DELETE CASCADE,
+  SeatNumber INTEGER NOT NULL,
+  PRIMARY KEY (ScheduleID, SeatNumber)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS booking (
+  BookingID INTEGER PRIMARY KEY AUTOINCREMENT,
+  ScheduleID INTEGER NOT NULL REFERENCES schedule (ScheduleID),
+  UserID INTEGER NOT NULL REFERENCES user (UserID),
+  SeatNumber INTEGER NOT NULL,
+  BookingDate TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS fk_booking_schedule1_idx ON booking (ScheduleID);
+CREATE INDEX IF NOT EXISTS fk_booking_user1_idx ON booking (UserID);
+CREATE TABLE IF NOT EXISTS schedule_inventory (
+  ScheduleID INTEGER PRIMARY KEY REFERENCES schedule (ScheduleID) ON DELETE CASCADE,
+  RouteID INTEGER NOT NULL,
+  CompanyID INTEGER NOT NULL,
+  DepartureDate DATE NOT NULL,
+  DepartureTime TIME NOT NULL,
+  MinPrice DECIMAL NOT NULL,
+  FreeSeats INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_inventory_route_date
+  ON schedule_inventory (RouteID, DepartureDate, DepartureTime, FreeSeats, MinPrice, CompanyID);
+CREATE TABLE IF NOT EXISTS schedule_history (
+  ScheduleID INTEGER PRIMARY KEY,
+  BusID INTEGER NOT NULL,
+  RouteID INTEGER NOT NULL,
+  Source TEXT NOT NULL,
+  Destination TEXT NOT NULL,
+  BusNumber TEXT NOT NULL,
+  CompanyName TEXT NOT NULL,
+  DepartureDate DATE NOT NULL,
+  DepartureTime TIME NOT NULL,
+  ArrivalTime TIME NOT NULL,
+  Price DECIMAL NOT NULL,
+  SeatCapacity INTEGER NOT NULL,
+  SeatsBooked INTEGER NOT NULL,
+  ArchivedAt TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_schedule_history_date ON schedule_history (DepartureDate);
+CREATE TABLE IF NOT EXISTS booking_history (
+  BookingID INTEGER PRIMARY KEY,
+  ScheduleID INTEGER NOT NULL,
+  UserID INTEGER NOT NULL,
+  SeatNumber INTEGER NOT NULL,
+  BookingDate TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_booking_history_schedule ON booking_history (ScheduleID);
+CREATE INDEX IF NOT EXISTS idx_booking_history_user ON booking_history (UserID);
+"""
+
+
+def _parse_time(value):
+    hours, minutes, seconds = (int(part) for part in value.decode().split(':'))
+    return datetime.timedelta(hours=hours, minutes=minutes, seconds=seconds)
+
+
+def _format_time(value):
+    seconds = int(value.total_seconds())
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def _datediff(first, second):
+    # MySQL DATEDIFF(): whole days between the date parts of two dates or datetimes
+    if first is None or second is None:
+        return None
+    return (datetime.date.fromisoformat(str(first)[:10]) - datetime.date.fromisoformat(str(second)[:10])).days
+
+
+# Return MySQL's Python types for the declared column types (sqlite3.PARSE_DECLTYPES)
+sqlite3.register_converter('DATE', lambda value: datetime.date.fromisoformat(value.decode()))
+sqlite3.register_converter('TIME', _parse_time)
+sqlite3.register_converter('DECIMAL', lambda value: decimal.Decimal(value.decode()))
+sqlite3.register_adapter(datetime.date, datetime.date.isoformat)
+sqlite3.register_adapter(datetime.timedelta, _format_time)
+sqlite3.register_adapter(decimal.Decimal, str)
+
+
+_CALL = re.compile(r'^\s*CALL\s+(\w+)\s*\(', re.IGNORECASE)
+_REWRITES = (
+    (re.compile(r'#[^\n]*'), ''),
+    (re.compile(r'\bFOR\s+UPDATE\b', re.IGNORECASE), ''),
+    (re.compile(r'\bNOW\(\)', re.IGNORECASE), 'CURRENT_TIMESTAMP'),
+    (re.compile(r'\bCURDATE\(\)', re.IGNORECASE), "DATE('now')"),
+    (re.compile(r'\bINSERT\s+IGNORE\b', re.IGNORECASE), 'INSERT OR IGNORE'),
+    (re.compile(r'%s'), '?'),
+)
+# SAVEPOINT opens the transaction too, so RELEASE of the first savepoint does not commit it
+_WRITE = re.compile(r'^\s*(INSERT|UPDATE|DELETE|REPLACE|SAVEPOINT)\b', re.IGNORECASE)
+_LOCKING_READ = re.compile(r'\bFOR\s+UPDATE\b', re.IGNORECASE)
+_translated = {}
+
+
+def translate(operation):
+    """
+    Rewrites a MySQL statement for SQLite. Returns (sql, takes_write_lock).
+    """
+    cached = _translated.get(operation)
+    if cached is None:
+        if len(_translated) >= 4096:
+            _translated.clear()  # IN lists of varying length make many distinct statements
+        sql = operation
+        for pattern, replacement in _REWRITES:
+            sql = pattern.sub(replacement, sql)
+        cached = _translated[operation] = (sql, bool(_WRITE.match(sql) or _LOCKING_READ.search(operation)))
+    return cached
+
+
+def _mysql_error(err):
+    message = str(err)
+    if isinstance(err, sqlite3.IntegrityError):
+        errno = 1452 if 'FOREIGN KEY' in message else 1062
+        return mysql.connector.errors.IntegrityError(msg=message, errno=errno)
+    if isinstance(err, sqlite3.OperationalError) and 'locked' in message:
+        return mysql.connector.errors.DatabaseError(msg=message, errno=1205)  # lock wait timeout
+    if isinstance(err, sqlite3.OperationalError):
+        return mysql.connector.errors.ProgrammingError(msg=message, errno=1064)
+    return mysql.connector.errors.DatabaseError(msg=message, errno=2000)
+
+
+def book_seat(connection, schedule_id, seat_number, user_id):
+    # Same steps as the BookSeat procedure in SQLscript.sql, including its own COMMIT/ROLLBACK
+    connection.begin()
+    available = connection.execute_raw(
+        "SELECT COUNT(*) FROM availableseats WHERE ScheduleID = ? AND SeatNumber = ?;", (schedule_id, seat_number)
+    ).fetchone()[0]
+    if not available:
+        connection.rollback()
+        raise mysql.connector.errors.DatabaseError(msg='Seat not available or already booked.', errno=1644, sqlstate='45000')
+    connection.execute_raw(
+        "INSERT INTO booking (ScheduleID, UserID, SeatNumber, BookingDate) VALUES (?, ?, ?, CURRENT_TIMESTAMP);",
+        (schedule_id, user_id, seat_number),
+    )
+    connection.execute_raw("DELETE FROM availableseats WHERE ScheduleID = ? AND SeatNumber = ?;", (schedule_id, seat_number))
+    connection.execute_raw("UPDATE schedule_inventory SET FreeSeats = FreeSeats - 1 WHERE ScheduleID = ?;", (schedule_id,))
+    connection.commit()
+    return None
+
+
+def book_seat_for_user(connection, schedule_id, seat_number, user_id, register_user, return_details):
+    # BookSeatForUser: optional user upsert, BookSeat, then the schedule details as the result set
+    if register_user:
+        connection.begin()
+        connection.execute_raw(
+            "INSERT OR IGNORE INTO user (UserID, FirstName, LastName, Email, PhoneNumber, Password) VALUES (?, ?, ?, ?, ?, ?);",
+            (user_id, f"NewUser_{user_id}", "Auto", f"user_{user_id}@example.com", "000-000-0000", "password"),
+        )
+    book_seat(connection, schedule_id, seat_number, user_id)
+    if not return_details:
+        return None
+    return connection.execute_raw(
+        "SELECT s.ScheduleID, b.BusNumber, bc.CompanyName, s.DepartureTime, s.ArrivalTime, s.Price, r.Distance, "
+        "s.DepartureDate, r.Source, r.Destination FROM schedule s JOIN route r ON s.RouteID = r.RouteID "
+        "JOIN bus b ON s.BusID = b.BusID JOIN buscompany bc ON b.CompanyID = bc.CompanyID WHERE s.ScheduleID = ?;",
+        (schedule_id,),
+    )
+
+
+def refresh_schedule_inventory(connection, schedule_id):
+    connection.begin()
+    connection.execute_raw(
+        "REPLACE INTO schedule_inventory (ScheduleID, RouteID, CompanyID, DepartureDate, DepartureTime, MinPrice, FreeSeats) "
+        "SELECT s.ScheduleID, s.RouteID, b.CompanyID, s.DepartureDate, s.DepartureTime, s.Price, "
+        "(SELECT COUNT(*) FROM availableseats a WHERE a.ScheduleID = s.ScheduleID) "
+        "FROM schedule s JOIN bus b ON s.BusID = b.BusID WHERE ? IS NULL OR s.ScheduleID = ?;",
+        (schedule_id, schedule_id),
+    )
+    return None
+
+
+# Stored procedures, by name: fn(connection, *args) -> sqlite3 cursor of the result set, or None
+PROCEDURES = {
+    'BookSeat': book_seat,
+    'BookSeatForUser': book_seat_for_user,
+    'RefreshScheduleInventory': refresh_schedule_inventory,
+}
+
+
+class SQLiteCursor:
+    """
+    Buffered cursor: every result set is fetched as soon as the statement has run.
+    """
+    def __init__(self, connection, dictionary=False, **unused_options):
+        self._connection = connection
+        self._dictionary = dictionary
+        self._rows = []
+        self._position = 0
+        self.description = None
+        self.rowcount = -1
+        self.lastrowid = None
+
+    def _store(self, cursor, rows):
+        self.description = cursor.description
+        self.rowcount = cursor.rowcount if cursor.rowcount != -1 else len(rows)
+        self.lastrowid = cursor.lastrowid
+        if self._dictionary and self.description:
+            names = [column[0] for column in self.description]
+            rows = [dict(zip(names, row)) for row in rows]
+        self._rows = rows
+        self._position = 0
+
+    def execute(self, operation, params=()):
+        call = _CALL.match(operation)
+        if call:
+            procedure = PROCEDURES.get(call.group(1))
+            if procedure is None:
+                raise mysql.connector.errors.ProgrammingError(msg=f"PROCEDURE {call.group(1)} does not exist", errno=1305)
+            result = procedure(self._connection, *params)
+            if result is None:
+                self.description, self._rows, self._position = None, [], 0
+            else:
+                self._store(result, result.fetchall())
+            return
+        sql, takes_write_lock = translate(operation)
+        if takes_write_lock:
+            self._connection.begin()
+        cursor = self._connection.execute_raw(sql, tuple(params or ()))
+        self._store(cursor, cursor.fetchall())
+
+    def executemany(self, operation, seq_params):
+        sql, takes_write_lock = translate(operation)
+        if takes_write_lock:
+            self._connection.begin()
+        try:
+            cursor = self._connection.raw.executemany(sql, seq_params)
+        except sqlite3.Error as err:
+            raise _mysql_error(err) from err
+        self._store(cursor, [])
+
+    @property
+    def with_rows(self):
+        return self.description is not None
+
+    def nextset(self):
+        return None  # every statement produces at most one result set here
+
+    def callproc(self, name, args=()):
+        self.execute(f"CALL {name}({', '.join(['%s'] * len(args))});", args)
+        return args
+
+    def fetchone(self):
+        if self._position >= len(self._rows):
+            return None
+        row = self._rows[self._position]
+        self._position += 1
+        return row
+
+    def fetchmany(self, size=1):
+        rows = self._rows[self._position:self._position + size]
+        self._position += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._rows[self._position:]
+        self._position = len(self._rows)
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def close(self):
+        self._rows = []
+
+
+class SQLiteConnection:
+    def __init__(self, path=DEFAULT_PATH, lock_timeout=5.0):
+        """
+        One SQLite connection behaving like a mysql.connector connection (autocommit off).
+        Writers wait up to lock_timeout seconds for the write lock, then get MySQL error 1205.
+        """
+        self.path = path
+        try:
+            # Autocommit at the SQLite level; transactions are opened explicitly by begin()
+            self.raw = sqlite3.connect(path, timeout=lock_timeout, isolation_level=None,
+                                       detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+            self.raw.execute("PRAGMA journal_mode=WAL;")
+            self.raw.execute("PRAGMA synchronous=NORMAL;")
+            self.raw.execute("PRAGMA foreign_keys=ON;")
+            self.raw.create_function("DATEDIFF", 2, _datediff, deterministic=True)
+        except sqlite3.Error as err:
+            raise _mysql_error(err) from err
+        self._open = True
+
+    def execute_raw(self, sql, params=()):
+        try:
+            return self.raw.execute(sql, params)
+        except sqlite3.Error as err:
+            raise _mysql_error(err) from err
+
+    def begin(self):
+        # Like InnoDB's first locking statement: from here on the transaction holds the write lock
+        if not self.raw.in_transaction:
+            self.execute_raw("BEGIN IMMEDIATE;")
+
+    def cursor(self, **options):
+        return SQLiteCursor(self, **options)
+
+    def commit(self):
+        if self.raw.in_transaction:
+            self.execute_raw("COMMIT;")
+
+    def rollback(self):
+        if self.raw.in_transaction:
+            self.execute_raw("ROLLBACK;")
+
+    def start_transaction(self):
+        self.begin()
+
+    @property
+    def in_transaction(self):
+        return self.raw.in_transaction
+
+    def is_connected(self):
+        return self._open
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        if not self._open:
+            raise mysql.connector.errors.InterfaceError(msg="Connection is closed.", errno=2013)
+
+    def close(self):
+        if self._open:
+            self.raw.close()
+            self._open = False
+
+
+def connect(path=DEFAULT_PATH, lock_timeout=5.0):
+    return SQLiteConnection(path, lock_timeout)
+
+
+def create_schema(connection):
+    connection.raw.executescript(SCHEMA)
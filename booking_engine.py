@@ -0,0 +1,198 @@
+import secrets
+import threading
+import time
+
+from logger import logging
+
+
+class SeatHold:
+    """
+    A short-lived claim on one seat, taken while the user fills in the booking form.
+    """
+    __slots__ = ("token", "schedule_id", "seat_number", "user_id", "expires_at")
+
+    def __init__(self, token, schedule_id, seat_number, user_id, expires_at):
+        self.token = token
+        self.schedule_id = schedule_id
+        self.seat_number = seat_number
+        self.user_id = user_id
+        self.expires_at = expires_at
+
+    def is_expired(self, now=None):
+        return (now if now is not None else time.monotonic()) >= self.expires_at
+
+    def as_dict(self):
+        return {
+            "token": self.token,
+            "schedule_id": self.schedule_id,
+            "seat_number": self.seat_number,
+            "user_id": self.user_id,
+            "expires_in": max(0, round(self.expires_at - time.monotonic(), 1)),
+        }
+
+
+class SeatHoldStore:
+    def __init__(self, ttl=300):
+        """
+        In-process store of seat holds. A seat can be held by one user at a time; holds lapse
+        after `ttl` seconds and are purged lazily whenever the store is read or written.
+        """
+        self.ttl = ttl
+        self._by_token = {}
+        self._by_schedule = {}  # schedule_id -> {seat_number: SeatHold}
+        self._lock = threading.Lock()
+
+    def _purge_schedule_locked(self, schedule_id, now):
+        seats = self._by_schedule.get(schedule_id)
+        if not seats:
+            return
+        for seat_number in [seat for seat, hold in seats.items() if hold.is_expired(now)]:
+            self._by_token.pop(seats.pop(seat_number).token, None)
+        if not seats:
+            del self._by_schedule[schedule_id]
+
+    def hold(self, schedule_id, seat_number, user_id):
+        """
+        Places (or renews) a hold. Returns the SeatHold, or None if another user holds the seat.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._purge_schedule_locked(schedule_id, now)
+            seats = self._by_schedule.setdefault(schedule_id, {})
+            existing = seats.get(seat_number)
+            if existing is not None:
+                if existing.user_id != user_id:
+                    return None
+                existing.expires_at = now + self.ttl
+                return existing
+            hold = SeatHold(secrets.token_urlsafe(16), schedule_id, seat_number, user_id, now + self.ttl)
+            seats[seat_number] = hold
+            self._by_token[hold.token] = hold
+            return hold
+
+    def get(self, token):
+        with self._lock:
+            hold = self._by_token.get(token)
+            if hold is None:
+                return None
+            if hold.is_expired():
+                self._release_locked(hold)
+                return None
+            return hold
+
+    def release(self, token):
+        with self._lock:
+            hold = self._by_token.get(token)
+            if hold is not None:
+                self._release_locked(hold)
+            return hold is not None
+
+    def release_seat(self, schedule_id, seat_number):
+        with self._lock:
+            hold = self._by_schedule.get(schedule_id, {}).get(seat_number)
+            if hold is not None:
+                self._release_locked(hold)
+            return hold is not None
+
+    def _release_locked(self, hold):
+        self._by_token.pop(hold.token, None)
+        seats = self._by_schedule.get(hold.schedule_id)
+        if seats and seats.get(hold.seat_number) is hold:
+            del seats[hold.seat_number]
+            if not seats:
+                del self._by_schedule[hold.schedule_id]
+
+    def holder(self, schedule_id, seat_number):
+        """
+        Returns the UserID holding the seat, or None if it is not held.
+        """
+        with self._lock:
+            self._purge_schedule_locked(schedule_id, time.monotonic())
+            hold = self._by_schedule.get(schedule_id, {}).get(seat_number)
+            return hold.user_id if hold else None
+
+    def held_seats(self, schedule_id, exclude_user_id=None):
+        with self._lock:
+            self._purge_schedule_locked(schedule_id, time.monotonic())
+            return sorted(
+                seat_number for seat_number, hold in self._by_schedule.get(schedule_id, {}).items()
+                if hold.user_id != exclude_user_id
+            )
+
+    def purge_expired(self):
+        now = time.monotonic()
+        with self._lock:
+            for schedule_id in list(self._by_schedule):
+                self._purge_schedule_locked(schedule_id, now)
+
+    def stats(self):
+        with self._lock:
+            return {"active_holds": len(self._by_token), "schedules_with_holds": len(self._by_schedule), "ttl": self.ttl}
+
+
+class BookingError(Exception):
+    """
+    Raised by BookingEngine when a hold or booking is refused. `reason` is a short machine code.
+    """
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+
+class BookingEngine:
+    def __init__(self, hold_store):
+        """
+        Booking flow on top of ConnectDB: take a hold on a seat, then confirm it.
+
+        Holds keep other users from picking a seat while the form is being filled in, so a
+        popular schedule sees one confirmation per seat instead of a pile-up of doomed bookings.
+        Confirmation goes through ConnectDB.book_seat_for_user, one CALL that registers unknown
+        users, locks the seat row (SELECT ... FOR UPDATE) and books it; lock conflicts are retried
+        with backoff, so a seat can never be booked twice.
+        """
+        self.holds = hold_store
+
+    def hold(self, conn, schedule_id, seat_number, user_id):
+        """
+        Holds a seat that is currently free. Raises BookingError if it is taken or held by someone else.
+        """
+        seat_data = conn.get_seat_availability(schedule_id)
+        if not 1 <= seat_number <= seat_data['total_seats'] or seat_number in seat_data['occupied_seats']:
+            raise BookingError("unavailable", f"Seat {seat_number} is not available on schedule {schedule_id}.")
+        hold = self.holds.hold(schedule_id, seat_number, user_id)
+        if hold is None:
+            raise BookingError("held", f"Seat {seat_number} on schedule {schedule_id} is held by another user.")
+        logging.info("Seat %s on ScheduleID %s held for UserID %s.", seat_number, schedule_id, user_id)
+        return hold
+
+    def confirm(self, conn, token, user_id):
+        """
+        Books the seat of a live hold owned by user_id and releases the hold.
+        """
+        hold = self.holds.get(token)
+        if hold is None:
+            raise BookingError("expired", "The seat hold has expired or does not exist.")
+        if hold.user_id != user_id:
+            raise BookingError("forbidden", "The seat hold belongs to another user.")
+        self._book(conn, hold.schedule_id, hold.seat_number, user_id)
+        self.holds.release(token)
+        return hold
+
+    def book(self, conn, schedule_id, seat_number, user_id):
+        """
+        Books a seat directly (no prior hold). Refused if another user is holding it;
+        a hold of the same user on that seat is consumed.
+        """
+        holder = self.holds.holder(schedule_id, seat_number)
+        if holder is not None and holder != user_id:
+            raise BookingError("held", f"Seat {seat_number} on schedule {schedule_id} is held by another user.")
+        self._book(conn, schedule_id, seat_number, user_id)
+        if holder is not None:
+            self.holds.release_seat(schedule_id, seat_number)
+
+    def _book(self, conn, schedule_id, seat_number, user_id):
+        status = conn.book_seat_for_user(schedule_id, seat_number, user_id)
+        if status == 'failed':
+            raise BookingError("failed", f"Booking of seat {seat_number} on schedule {schedule_id} failed.")
+        if status != 'booked':
+            raise BookingError("unavailable", f"Seat {seat_number} is not available on schedule {schedule_id}.")
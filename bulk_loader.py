@@ -0,0 +1,370 @@
+"""
+Bulk timetable loader: streams a season's timetable into schedule, availableseats and
+schedule_inventory.
+
+Input is CSV (with a header row) or JSON lines, one departure pattern per record:
+
+    source, destination   route; created (with `distance`, optional) if it does not exist
+    bus_number            bus; created for `company` with `seat_capacity` seats if it does not exist
+    company               bus company; created if it does not exist (only needed for new buses)
+    departure_time, arrival_time   HH:MM[:SS]; an earlier arrival time means the next day
+    price                 fare
+    departure_date        YYYY-MM-DD for a single departure, or
+    valid_from, valid_to  YYYY-MM-DD range of a recurring departure, with
+    days                  ISO weekdays it runs on, e.g. "12345" for Monday-Friday (default: every day)
+
+Every schedule gets one availableseats row per seat of its bus (bus.SeatCapacity) and its
+schedule_inventory summary row. Rows are written with multi-row INSERTs (or, with --load-data,
+LOAD DATA LOCAL INFILE) in transactions of --chunk-size schedules. After each committed chunk a
+checkpoint file records progress, so an interrupted load resumes where it stopped when re-run
+with the same arguments.
+
+ScheduleIDs are assigned by the loader (continuing from the current maximum), so no other
+process should create schedules while a load runs.
+
+    python bulk_loader.py summer.csv
+    python bulk_loader.py summer.jsonl --chunk-size 5000 --load-data
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+import mysql.connector
+
+SCHEDULE_COLUMNS = ('ScheduleID', 'BusID', 'RouteID', 'DepartureDate', 'DepartureTime', 'ArrivalTime', 'Price')
+SEAT_COLUMNS = ('ScheduleID', 'SeatNumber')
+INVENTORY_COLUMNS = ('ScheduleID', 'RouteID', 'CompanyID', 'DepartureDate', 'DepartureTime', 'MinPrice', 'FreeSeats')
+
+
+class InvalidRecord(ValueError):
+    pass
+
+
+def read_records(path, file_format=None):
+    """
+    Yields (line_number, record dict) from a CSV or JSON lines file.
+    """
+    file_format = file_format or ('jsonl' if path.endswith(('.jsonl', '.json', '.ndjson')) else 'csv')
+    with open(path, newline='', encoding='utf-8') as timetable_file:
+        if file_format == 'csv':
+            for line_number, record in enumerate(csv.DictReader(timetable_file), start=2):
+                yield line_number, record
+        else:
+            for line_number, line in enumerate(timetable_file, start=1):
+                if line.strip():
+                    try:
+                        yield line_number, json.loads(line)
+                    except ValueError as e:
+                        yield line_number, InvalidRecord(f"not valid JSON: {e}")
+
+
+def _field(record, name, required=True):
+    value = record.get(name)
+    if isinstance(value, str):
+        value = value.strip()
+    if value in (None, ''):
+        if required:
+            raise InvalidRecord(f"missing {name}")
+        return None
+    return value
+
+
+def _time(value, name):
+    for pattern in ('%H:%M:%S', '%H:%M'):
+        try:
+            return datetime.strptime(str(value), pattern).strftime('%H:%M:%S')
+        except ValueError:
+            pass
+    raise InvalidRecord(f"{name} must be HH:MM[:SS], got {value!r}")
+
+
+def _date(value, name):
+    try:
+        return date.fromisoformat(str(value))
+    except ValueError:
+        raise InvalidRecord(f"{name} must be YYYY-MM-DD, got {value!r}")
+
+
+def departure_dates(record):
+    """
+    The dates a record runs on: its departure_date, or every matching weekday of its validity range.
+    """
+    if _field(record, 'departure_date', required=False):
+        return [_date(record['departure_date'], 'departure_date')]
+    valid_from = _date(_field(record, 'valid_from'), 'valid_from')
+    valid_to = _date(_field(record, 'valid_to'), 'valid_to')
+    if valid_to < valid_from:
+        raise InvalidRecord("valid_to is before valid_from")
+    days = str(_field(record, 'days', required=False) or '1234567')
+    if not set(days) <= set('1234567'):
+        raise InvalidRecord(f"days must be ISO weekday digits (1 = Monday), got {days!r}")
+    weekdays = {int(day) for day in days}
+    return [valid_from + timedelta(days=offset) for offset in range((valid_to - valid_from).days + 1)
+            if (valid_from + timedelta(days=offset)).isoweekday() in weekdays]
+
+
+class BulkLoader:
+    def __init__(self, connection, chunk_size=2000, rows_per_insert=5000, load_data=False):
+        """
+        Writes schedules with their seat and inventory rows, one transaction per chunk of
+        chunk_size schedules. Routes, buses and companies are looked up once, kept in
+        memory and created on first use.
+        """
+        self.connection = connection
+        self.cursor = connection.cursor()
+        self.chunk_size = chunk_size
+        self.rows_per_insert = rows_per_insert
+        self.load_data = load_data
+        self.routes = {}     # (source, destination) -> RouteID
+        self.buses = {}      # bus number -> (BusID, CompanyID, SeatCapacity)
+        self.companies = {}  # company name -> CompanyID
+        self.counts = {'schedule': 0, 'availableseats': 0, 'schedule_inventory': 0, 'route': 0, 'bus': 0, 'buscompany': 0}
+        self._pending = {'schedule': [], 'availableseats': [], 'schedule_inventory': []}
+        self._pending_schedules = 0
+
+        cursor = self.cursor
+        cursor.execute("SELECT RouteID, Source, Destination FROM route ORDER BY RouteID DESC;")
+        for route_id, source, destination in cursor.fetchall():
+            self.routes[(source, destination)] = route_id  # lowest RouteID wins for duplicate routes
+        cursor.execute("SELECT BusID, CompanyID, BusNumber, SeatCapacity FROM bus;")
+        for bus_id, company_id, bus_number, capacity in cursor.fetchall():
+            self.buses[bus_number] = (bus_id, company_id, capacity)
+        cursor.execute("SELECT CompanyID, CompanyName FROM buscompany;")
+        for company_id, name in cursor.fetchall():
+            self.companies[name] = company_id
+        cursor.execute("SELECT COALESCE(MAX(ScheduleID), 0) FROM schedule;")
+        self.max_schedule_id = cursor.fetchone()[0]
+        connection.commit()
+
+    def _route(self, key, distance):
+        route_id = self.routes.get(key)
+        if route_id is None:
+            self.cursor.execute("INSERT INTO route (Source, Destination, Distance) VALUES (%s, %s, %s);",
+                                (key[0], key[1], distance))
+            route_id = self.routes[key] = self.cursor.lastrowid
+            self.counts['route'] += 1
+        return route_id
+
+    def _new_bus_fields(self, record):
+        # Company and seat capacity of a bus that is not in the database yet
+        company = _field(record, 'company')
+        try:
+            capacity = int(_field(record, 'seat_capacity'))
+        except ValueError:
+            raise InvalidRecord("seat_capacity must be an integer")
+        if capacity <= 0:
+            raise InvalidRecord("seat_capacity must be positive")
+        return company, capacity
+
+    def _bus(self, bus_number, new_bus):
+        bus = self.buses.get(bus_number)
+        if bus is None:
+            company, capacity = new_bus
+            company_id = self.companies.get(company)
+            if company_id is None:
+                self.cursor.execute("INSERT INTO buscompany (CompanyName) VALUES (%s);", (company,))
+                company_id = self.companies[company] = self.cursor.lastrowid
+                self.counts['buscompany'] += 1
+            self.cursor.execute("INSERT INTO bus (CompanyID, BusNumber, SeatCapacity) VALUES (%s, %s, %s);",
+                                (company_id, bus_number, capacity))
+            bus = self.buses[bus_number] = (self.cursor.lastrowid, company_id, capacity)
+            self.counts['bus'] += 1
+        return bus
+
+    def expand(self, record):
+        """
+        Validates a record and returns its departures as (bus, route_id, date, departure, arrival, price).
+        New routes, buses and companies are inserted in the current chunk's transaction, only
+        once every field has been validated, so a rejected record leaves nothing behind.
+        """
+        if isinstance(record, InvalidRecord):
+            raise record
+        departure_time = _time(_field(record, 'departure_time'), 'departure_time')
+        arrival_time = _time(_field(record, 'arrival_time'), 'arrival_time')
+        try:
+            price = Decimal(str(_field(record, 'price')))
+        except InvalidOperation:
+            raise InvalidRecord("price must be a number")
+        dates = departure_dates(record)
+        route_key = (_field(record, 'source'), _field(record, 'destination'))
+        distance = _field(record, 'distance', required=False)
+        if distance is not None:
+            try:
+                distance = Decimal(str(distance))
+            except InvalidOperation:
+                raise InvalidRecord("distance must be a number")
+        bus_number = str(_field(record, 'bus_number'))
+        new_bus = self._new_bus_fields(record) if bus_number not in self.buses else None
+        route_id = self._route(route_key, distance)
+        bus = self._bus(bus_number, new_bus)
+        return [(bus, route_id, day, departure_time, arrival_time, price) for day in dates]
+
+    def add(self, schedule_id, departure):
+        (bus_id, company_id, capacity), route_id, day, departure_time, arrival_time, price = departure
+        self._pending['schedule'].append((schedule_id, bus_id, route_id, day, departure_time, arrival_time, price))
+        self._pending['availableseats'].extend((schedule_id, seat_number) for seat_number in range(1, capacity + 1))
+        self._pending['schedule_inventory'].append((schedule_id, route_id, company_id, day, departure_time, price, capacity))
+        self._pending_schedules += 1
+
+    @property
+    def chunk_full(self):
+        return self._pending_schedules >= self.chunk_size
+
+    def flush(self):
+        """
+        Writes the pending rows (parents first) and commits them as one transaction.
+        """
+        for table, columns in (('schedule', SCHEDULE_COLUMNS), ('availableseats', SEAT_COLUMNS),
+                               ('schedule_inventory', INVENTORY_COLUMNS)):
+            rows = self._pending[table]
+            if self.load_data:
+                self._load_data(table, columns, rows)
+            else:
+                self._insert(table, columns, rows)
+            self.counts[table] += len(rows)
+            self._pending[table] = []
+        self.connection.commit()
+        self._pending_schedules = 0
+
+    def _insert(self, table, columns, rows):
+        # Multi-row INSERT ... VALUES (...), (...): one statement per rows_per_insert rows
+        placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+        for start in range(0, len(rows), self.rows_per_insert):
+            batch = rows[start:start + self.rows_per_insert]
+            self.cursor.execute(
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES {', '.join([placeholders] * len(batch))};",
+                [value for row in batch for value in row],
+            )
+
+    def _load_data(self, table, columns, rows):
+        if not rows:
+            return
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', newline='', encoding='utf-8', delete=False) as chunk_file:
+            csv.writer(chunk_file, lineterminator='\n').writerows(rows)
+        try:
+            path = chunk_file.name.replace('\\', '/').replace("'", "''")
+            self.cursor.execute(
+                f"LOAD DATA LOCAL INFILE '{path}' INTO TABLE {table} CHARACTER SET utf8mb4 "
+                f"FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' LINES TERMINATED BY '\\n' ({', '.join(columns)});"
+            )
+        finally:
+            os.unlink(chunk_file.name)
+
+
+class Checkpoint:
+    def __init__(self, path):
+        """
+        Progress of a load, rewritten atomically after every committed chunk.
+        """
+        self.path = path
+        self.state = {}
+        if os.path.exists(path):
+            with open(path) as checkpoint_file:
+                self.state = json.load(checkpoint_file)
+
+    def save(self, **state):
+        self.state.update(state)
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w') as checkpoint_file:
+            json.dump(self.state, checkpoint_file)
+        os.replace(temporary, self.path)
+
+    def clear(self):
+        self.state = {}
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def load(connection, args, report=sys.stderr):
+    loader = BulkLoader(connection, chunk_size=args.chunk_size, rows_per_insert=args.rows_per_insert, load_data=args.load_data)
+    checkpoint = Checkpoint(args.checkpoint or args.input + '.checkpoint')
+    if args.restart:
+        checkpoint.clear()
+    if checkpoint.state.get('input_size') not in (None, os.path.getsize(args.input)):
+        raise SystemExit(f"{args.input} changed since the checkpoint {checkpoint.path} was written; use --restart.")
+
+    # Schedules are numbered from first_schedule_id in file order, so the Nth departure of the
+    # file always gets the same ID. A chunk committed just before a crash (and after the last
+    # checkpoint) is recognised from MAX(ScheduleID) and skipped on resume.
+    first_schedule_id = checkpoint.state.get('first_schedule_id', loader.max_schedule_id + 1)
+    done = max(checkpoint.state.get('schedules_done', 0), loader.max_schedule_id - first_schedule_id + 1)
+    if done:
+        print(f"resuming after {done} schedules (ScheduleID {first_schedule_id + done - 1})", file=report)
+    checkpoint.save(input_size=os.path.getsize(args.input), first_schedule_id=first_schedule_id, schedules_done=done)
+
+    started = time.perf_counter()
+    position = 0  # departures seen in the file so far
+    invalid = 0
+    for line_number, record in read_records(args.input, args.format):
+        try:
+            departures = loader.expand(record)
+        except InvalidRecord as e:
+            invalid += 1
+            if not args.skip_invalid:
+                connection.rollback()
+                raise SystemExit(f"{args.input}:{line_number}: {e} (use --skip-invalid to skip bad records)")
+            print(f"{args.input}:{line_number}: skipped, {e}", file=report)
+            continue
+        for departure in departures:
+            if position >= done:
+                loader.add(first_schedule_id + position, departure)
+            position += 1
+            if loader.chunk_full:
+                loader.flush()
+                checkpoint.save(schedules_done=position)
+                elapsed = time.perf_counter() - started
+                print(f"  {loader.counts['schedule']} schedules, {loader.counts['availableseats']} seats "
+                      f"({loader.counts['availableseats'] / elapsed:,.0f} seat rows/s)", file=report, end='\r')
+    loader.flush()
+    checkpoint.clear()
+    elapsed = time.perf_counter() - started
+    print(file=report)
+    return {
+        "rows": loader.counts,
+        "invalid_records": invalid,
+        "schedules_skipped_as_loaded": min(done, position),
+        "seconds": round(elapsed, 1),
+        "rows_per_sec": round(sum(loader.counts.values()) / elapsed) if elapsed else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help='timetable file (.csv, or .jsonl for JSON lines)')
+    parser.add_argument('--format', choices=('csv', 'jsonl'), help='override the format guessed from the extension')
+    parser.add_argument('--host', default=os.environ.get('DB_HOST', 'localhost'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('DB_PORT', 3306)))
+    parser.add_argument('--user', default=os.environ.get('DB_USER', 'root'))
+    parser.add_argument('--password', default=os.environ.get('DB_PASSWORD', '0000'))
+    parser.add_argument('--database', default=os.environ.get('DB_NAME', 'bus_booking_system'))
+    parser.add_argument('--chunk-size', type=int, default=2000, help='schedules per transaction')
+    parser.add_argument('--rows-per-insert', type=int, default=5000, help='rows per multi-row INSERT statement')
+    parser.add_argument('--load-data', action='store_true', help='use LOAD DATA LOCAL INFILE (needs local_infile=ON on the server)')
+    parser.add_argument('--checkpoint', help='checkpoint file (default: <input>.checkpoint)')
+    parser.add_argument('--restart', action='store_true', help='ignore an existing checkpoint')
+    parser.add_argument('--skip-invalid', action='store_true', help='report and skip invalid records instead of stopping')
+    args = parser.parse_args()
+
+    connection = mysql.connector.connect(host=args.host, port=args.port, user=args.user, password=args.password,
+                                         database=args.database, allow_local_infile=args.load_data)
+    cursor = connection.cursor()
+    # Rows are consistent by construction (parents are written first in every chunk)
+    cursor.execute("SET SESSION foreign_key_checks = 0;")
+    cursor.execute("SET SESSION unique_checks = 0;")
+    try:
+        summary = load(connection, args)
+    finally:
+        cursor.execute("SET SESSION foreign_key_checks = 1;")
+        cursor.execute("SET SESSION unique_checks = 1;")
+        connection.close()
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == '__main__':
+    main()
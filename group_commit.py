@@ -0,0 +1,195 @@
+import queue
+import secrets
+import threading
+import time
+
+from booking_engine import BookingError
+from logger import logging
+
+
+class BookingTicket:
+    """
+    A booking request accepted by the GroupCommitQueue. Its status moves from 'queued' to
+    'booked', 'unavailable' or 'failed' once the group it was applied in has committed.
+    """
+    __slots__ = ("token", "schedule_id", "seat_number", "user_id", "status", "queued_at", "done_at", "_done")
+
+    def __init__(self, token, schedule_id, seat_number, user_id):
+        self.token = token
+        self.schedule_id = schedule_id
+        self.seat_number = seat_number
+        self.user_id = user_id
+        self.status = "queued"
+        self.queued_at = time.monotonic()
+        self.done_at = None
+        self._done = threading.Event()
+
+    def finish(self, status):
+        self.status = status
+        self.done_at = time.monotonic()
+        self._done.set()
+
+    def wait(self, timeout=None):
+        """
+        Blocks until the booking is applied or `timeout` seconds pass. Returns True once it is done.
+        """
+        return self._done.wait(timeout)
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def as_dict(self):
+        ticket = {
+            "ticket": self.token,
+            "schedule_id": self.schedule_id,
+            "seat_number": self.seat_number,
+            "user_id": self.user_id,
+            "status": self.status,
+        }
+        if self.done_at is not None:
+            ticket["latency_ms"] = round((self.done_at - self.queued_at) * 1000, 2)
+        return ticket
+
+
+class GroupCommitQueue:
+    def __init__(self, connection_factory, max_batch=64, max_wait=0.002, workers=1, max_pending=10000, ticket_ttl=300):
+        """
+        Asynchronous booking path with group commit.
+
+        submit() queues a booking and returns a BookingTicket straight away. Worker threads drain
+        the queue and apply up to max_batch bookings at a time with ConnectDB.book_seat_group:
+        one transaction, a savepoint per booking and a single commit, so the per-commit log
+        flush is paid once per group instead of once per seat. While a group commits, new
+        bookings pile up and form the next group; an idle worker waits at most max_wait seconds
+        for company before applying what it has.
+
+        connection_factory() returns a ConnectDB (with the seat cache and broker, so committed
+        bookings reach the seat maps and live seat streams like any other booking). At most
+        max_pending bookings may be waiting; further submits are refused. Finished tickets can
+        be looked up for ticket_ttl seconds.
+        """
+        self.connection_factory = connection_factory
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.workers = workers
+        self.ticket_ttl = ticket_ttl
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._tickets = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        self._stop = threading.Event()
+        self.groups = 0
+        self.bookings = 0
+        self.largest_group = 0
+        self.commit_seconds = 0.0
+        self.rejected = 0
+
+    def start(self):
+        """
+        Starts the worker threads (daemons). Idempotent; submit() calls it.
+        """
+        with self._lock:
+            if self._threads:
+                return
+            for number in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'group-commit-{number}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+
+    def submit(self, schedule_id, seat_number, user_id):
+        """
+        Queues a booking. Returns its BookingTicket; raises BookingError('busy') if the queue is full.
+        """
+        self.start()
+        ticket = BookingTicket(secrets.token_urlsafe(16), schedule_id, seat_number, user_id)
+        try:
+            self._queue.put_nowait(ticket)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            raise BookingError("busy", "Too many bookings are waiting; try again shortly.")
+        with self._lock:
+            self._purge_locked(ticket.queued_at)
+            self._tickets[ticket.token] = ticket
+        return ticket
+
+    def get(self, token):
+        with self._lock:
+            return self._tickets.get(token)
+
+    def _purge_locked(self, now):
+        # Tickets are kept in submission order, so the ones old enough to expire sit at the front
+        expired = []
+        for token, ticket in self._tickets.items():
+            if now - ticket.queued_at < self.ticket_ttl:
+                break
+            if ticket.done_at is not None and now - ticket.done_at >= self.ticket_ttl:
+                expired.append(token)
+        for token in expired:
+            del self._tickets[token]
+
+    def _next_group(self):
+        try:
+            group = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.max_wait
+        while len(group) < self.max_batch:
+            try:
+                group.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                group.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return group
+
+    def _work(self):
+        while not self._stop.is_set():
+            group = self._next_group()
+            if group:
+                self._apply(group)
+
+    def _apply(self, group):
+        started = time.perf_counter()
+        conn = None
+        try:
+            conn = self.connection_factory()
+            statuses = conn.book_seat_group([(ticket.schedule_id, ticket.seat_number, ticket.user_id) for ticket in group])
+        except Exception as e:
+            logging.error("Group commit of %s bookings failed: %s", len(group), e, exc_info=True)
+            statuses = ["failed"] * len(group)
+        finally:
+            if conn is not None:
+                conn.close_connection()
+        elapsed = time.perf_counter() - started
+        for ticket, status in zip(group, statuses):
+            ticket.finish(status)
+        with self._lock:
+            self.groups += 1
+            self.bookings += len(group)
+            self.largest_group = max(self.largest_group, len(group))
+            self.commit_seconds += elapsed
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": self._queue.qsize(),
+                "tickets": len(self._tickets),
+                "groups": self.groups,
+                "bookings": self.bookings,
+                "average_group": round(self.bookings / self.groups, 2) if self.groups else 0.0,
+                "largest_group": self.largest_group,
+                "average_group_ms": round(self.commit_seconds / self.groups * 1000, 3) if self.groups else 0.0,
+                "rejected": self.rejected,
+                "workers": len(self._threads),
+            }
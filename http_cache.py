@@ -0,0 +1,162 @@
+import gzip
+import json
+import os
+import threading
+import zlib
+
+from cache import LRUCache
+
+try:
+    import brotli
+except ImportError:  # optional: responses are only gzip-compressed without it
+    brotli = None
+
+
+# Marks data served from a cache because it could not be refreshed (RFC 7234 warn-code 110)
+STALE_WARNING = '110 - "Response is Stale"'
+
+
+def dumps(payload):
+    # Compact separators: no whitespace after ',' and ':' in the hot JSON responses
+    return json.dumps(payload, separators=(',', ':')).encode('utf-8')
+
+
+class CachedBody:
+    """
+    One serialized response and its compressed variants, built on first use.
+    """
+    __slots__ = ("version", "etag", "identity", "gzip", "br")
+
+    def __init__(self, version, etag, identity):
+        self.version = version
+        self.etag = etag
+        self.identity = identity
+        self.gzip = None
+        self.br = None
+
+
+def _accepts(accept_encoding, coding):
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        if name.strip().lower() == coding:
+            return params.replace(' ', '').lower() not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+class ResponseCache:
+    def __init__(self, max_entries=2048, compress_min_bytes=1024, gzip_level=6):
+        """
+        Versioned cache of serialized JSON responses with strong ETags.
+
+        Callers name what a response depends on with a version key -- ('schedule', id) for
+        seat maps, ('route', source, destination) for departure dates -- and bump() that key
+        whenever the data changes (a booking commits, a schedule is added). A response is
+        cached as bytes under its own key together with the version it was built from, so
+        while the version stands a repeat request costs neither a query nor JSON encoding,
+        and a client sending the ETag back in If-None-Match gets a bodyless 304.
+
+        Bodies of at least compress_min_bytes are also served gzip- (and, when the brotli
+        package is installed, br-) encoded to clients that accept it; each encoding gets its
+        own ETag. Versions live in this process only, like the seat cache, and ETags carry a
+        per-process token so a restart never validates a stale client copy.
+
+        If rebuilding an outdated response fails with a 5xx (the database is down), the last
+        body built for the key is served instead, marked with a `Warning: 110` header.
+        """
+        self.compress_min_bytes = compress_min_bytes
+        self.gzip_level = gzip_level
+        self._bodies = LRUCache(max_entries)
+        self._versions = {}
+        self._generation = 0  # bumped by bump_all(), part of every version
+        self._lock = threading.Lock()
+        self._token = os.urandom(4).hex()
+        self.not_modified = 0
+        self.stale_served = 0
+
+    def version(self, *key):
+        with self._lock:
+            return (self._generation, self._versions.get(key, 0))
+
+    def bump(self, *key):
+        with self._lock:
+            self._versions[key] = self._versions.get(key, 0) + 1
+
+    def bump_all(self):
+        with self._lock:
+            self._generation += 1
+            self._versions.clear()
+
+    def on_seat_event(self, schedule_id, event):
+        """
+        SeatUpdateBroker listener: a committed booking changes the schedule's seat map.
+        """
+        if event.get("type") == "booked":
+            self.bump('schedule', schedule_id)
+
+    def on_timetable_change(self, source, destination):
+        """
+        TimetableIndex listener: (None, None) means the whole index was reloaded.
+        """
+        if source is None:
+            self.bump_all()
+        else:
+            self.bump('route', source, destination)
+
+    def respond(self, key, version, produce, if_none_match=None, accept_encoding=''):
+        """
+        Returns (status, headers, body) for the response cached under `key`.
+
+        `version` must be read before produce() runs, so a change racing with the build
+        leaves an entry that the next request already sees as outdated. produce() returns
+        (payload, status); only 200 responses are cached.
+        """
+        entry = self._bodies.get(key)
+        stale = False
+        if entry is None or entry.version != version:
+            payload, status = produce()
+            if status >= 500 and entry is not None:
+                stale = True
+                with self._lock:
+                    self.stale_served += 1
+            elif status != 200:
+                return self.uncached(payload, status)
+            else:
+                etag = f'{self._token}-{version[0]}.{version[1]}-{zlib.crc32(repr(key).encode()):08x}'
+                entry = CachedBody(version, etag, dumps(payload))
+                self._bodies.put(key, entry)
+
+        encoding, body = None, entry.identity
+        if len(body) >= self.compress_min_bytes and accept_encoding:
+            if brotli is not None and _accepts(accept_encoding, 'br'):
+                if entry.br is None:
+                    entry.br = brotli.compress(body)
+                encoding, body = 'br', entry.br
+            elif _accepts(accept_encoding, 'gzip'):
+                if entry.gzip is None:
+                    entry.gzip = gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+                encoding, body = 'gzip', entry.gzip
+
+        etag = f'"{entry.etag}-{encoding}"' if encoding else f'"{entry.etag}"'
+        headers = [('ETag', etag), ('Cache-Control', 'no-cache'), ('Vary', 'Accept-Encoding')]
+        if stale:
+            headers.append(('Warning', STALE_WARNING))
+        if if_none_match and (if_none_match.strip() == '*' or etag in (tag.strip() for tag in if_none_match.split(','))):
+            with self._lock:
+                self.not_modified += 1
+            return 304, headers, b''
+        headers.append(('Content-Type', 'application/json'))
+        if encoding:
+            headers.append(('Content-Encoding', encoding))
+        return 200, headers, body
+
+    @staticmethod
+    def uncached(payload, status):
+        return status, [('Content-Type', 'application/json'), ('Cache-Control', 'no-store')], dumps(payload)
+
+    def stats(self):
+        stats = self._bodies.stats()
+        with self._lock:
+            stats["versions"] = len(self._versions)
+            stats["not_modified"] = self.not_modified
+            stats["stale_served"] = self.stale_served
+        return stats
@@ -0,0 +1,292 @@
+import contextvars
+import cProfile
+import functools
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime
+
+from logger import logging
+
+# Latency buckets in seconds, from sub-millisecond cache hits to multi-second stalls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 50)
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labelvalues, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labelvalues -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labelvalues, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    labels = _format_labels(self.labelnames, labelvalues, [("le", _format_value(bound))])
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, labelvalues, [("le", "+Inf")])
+                lines.append(f"{self.name}_bucket{labels} {series[-2]}")
+                labels = _format_labels(self.labelnames, labelvalues)
+                lines.append(f"{self.name}_count{labels} {series[-2]}")
+                lines.append(f"{self.name}_sum{labels} {_format_value(series[-1])}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self, extra_lines=()):
+        """
+        Renders every metric in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        lines.extend(extra_lines)
+        return "\n".join(lines) + "\n"
+
+
+def render_gauges(prefix, stats, documentation):
+    """
+    Renders the numeric values of a stats() dictionary as gauges named <prefix>_<key>.
+    """
+    lines = []
+    for key, value in sorted(stats.items()):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        name = f"{prefix}_{key}"
+        lines.append(f"# HELP {name} {documentation} ({key}).")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {_format_value(value)}")
+    return lines
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_DURATION = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("route", "method", "status")))
+DB_ROUND_TRIPS_PER_REQUEST = REGISTRY.register(Histogram(
+    "db_round_trips_per_request", "Database round trips made while serving one request.", ("route",), COUNT_BUCKETS))
+DB_QUERY_DURATION = REGISTRY.register(Histogram(
+    "db_query_duration_seconds", "Latency of ConnectDB query methods, cache hits included.", ("query",)))
+DB_PHASE_DURATION = REGISTRY.register(Histogram(
+    "db_phase_duration_seconds", "Time spent connecting, executing, fetching and committing.", ("query", "phase")))
+DB_ROUND_TRIPS = REGISTRY.register(Counter(
+    "db_round_trips_total", "Database round trips by query method and phase.", ("query", "phase")))
+SLOW_REQUEST_PROFILES = REGISTRY.register(Counter(
+    "slow_request_profiles_total", "Slow requests whose cProfile dump was written.", ("route",)))
+
+
+class RequestStats:
+    """
+    Per-request accumulator of database work, reachable from any code running for the request.
+    """
+    __slots__ = ("round_trips", "db_seconds")
+
+    def __init__(self):
+        self.round_trips = 0
+        self.db_seconds = 0.0
+
+
+_request_stats = contextvars.ContextVar('request_stats', default=None)
+_current_query = contextvars.ContextVar('current_query', default="unknown")
+
+
+def start_request():
+    stats = RequestStats()
+    _request_stats.set(stats)
+    return stats
+
+
+def current_request_stats():
+    return _request_stats.get()
+
+
+def record_request(route, method, status, elapsed, stats):
+    HTTP_REQUEST_DURATION.observe(elapsed, route, method, str(status))
+    if stats is not None:
+        DB_ROUND_TRIPS_PER_REQUEST.observe(stats.round_trips, route)
+
+
+def observe_phase(phase, elapsed, round_trip=True):
+    """
+    Records one connect/execute/fetch/commit step of the current query method.
+    """
+    query = _current_query.get()
+    DB_PHASE_DURATION.observe(elapsed, query, phase)
+    if round_trip:
+        DB_ROUND_TRIPS.inc(query, phase)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.round_trips += 1
+            stats.db_seconds += elapsed
+
+
+def timed_query(method):
+    """
+    Decorator for ConnectDB query methods: records their latency under the method name and
+    labels the connect/execute/fetch/commit phases that happen inside them.
+    """
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        token = _current_query.set(name)
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            DB_QUERY_DURATION.observe(time.perf_counter() - started, name)
+            _current_query.reset(token)
+    return wrapper
+
+
+class InstrumentedCursor:
+    """
+    Cursor proxy timing execute* (one round trip each) and fetch* calls.
+    Everything else is delegated to the wrapped cursor.
+    """
+    __slots__ = ("_cursor",)
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def _timed(self, phase, function, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            observe_phase(phase, time.perf_counter() - started)
+
+    def execute(self, *args, **kwargs):
+        return self._timed("execute", self._cursor.execute, *args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        return self._timed("execute", self._cursor.executemany, *args, **kwargs)
+
+    def callproc(self, *args, **kwargs):
+        return self._timed("execute", self._cursor.callproc, *args, **kwargs)
+
+    def fetchone(self):
+        # Buffered results are already client-side; only count the time, not a round trip
+        started = time.perf_counter()
+        try:
+            return self._cursor.fetchone()
+        finally:
+            observe_phase("fetch", time.perf_counter() - started, round_trip=False)
+
+    def fetchall(self):
+        started = time.perf_counter()
+        try:
+            return self._cursor.fetchall()
+        finally:
+            observe_phase("fetch", time.perf_counter() - started, round_trip=False)
+
+    def fetchmany(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.fetchmany(*args, **kwargs)
+        finally:
+            observe_phase("fetch", time.perf_counter() - started, round_trip=False)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class SlowRequestProfiler:
+    def __init__(self, threshold_ms, sample_rate=1.0, output_dir=None):
+        """
+        Opt-in cProfile of requests: a sampled fraction of requests runs under cProfile, and the
+        profile of any that takes longer than threshold_ms is written to output_dir as a .prof
+        file (open it with `python -m pstats` or snakeviz).
+        """
+        self.threshold = threshold_ms / 1000.0
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir or os.path.join(os.getcwd(), 'logs', 'profiles')
+
+    def start(self):
+        """
+        Returns a running profiler for this request, or None if it is not sampled.
+        """
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            return None  # another profiler is active on this interpreter
+        return profiler
+
+    def finish(self, profiler, route, elapsed):
+        profiler.disable()
+        if elapsed < self.threshold:
+            return
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            safe_route = route.strip('/').replace('/', '_').replace('<', '').replace('>', '') or 'root'
+            path = os.path.join(self.output_dir, f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{safe_route}.prof")
+            profiler.dump_stats(path)
+            SLOW_REQUEST_PROFILES.inc(route)
+            logging.warning("Slow request %s took %.1f ms; profile written to %s", route, elapsed * 1000, path)
+        except OSError as e:
+            logging.error("Could not write request profile: %s", e)
@@ -0,0 +1,336 @@
+import heapq
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from datetime import date, datetime, timedelta
+
+from logger import logging
+
+_NEVER = 2 ** 62
+_EPOCH = date(1970, 1, 1)
+
+
+def _to_minutes(day, clock):
+    # Minutes since 1970-01-01 00:00; MySQL TIME columns arrive as timedelta
+    if isinstance(clock, timedelta):
+        clock_minutes = int(clock.total_seconds()) // 60
+    else:
+        clock_minutes = clock.hour * 60 + clock.minute
+    return (day - _EPOCH).days * 1440 + clock_minutes
+
+
+def _from_minutes(minutes):
+    return datetime(1970, 1, 1) + timedelta(minutes=minutes)
+
+
+class _Network:
+    """
+    Immutable snapshot of the timetable as a time-expanded graph held in flat arrays.
+
+    Connections (one per schedule: a departure from one city and an arrival in another) are
+    sorted by departure time, column by column. For each stop, `stop_offsets` delimits the
+    slice of `by_stop` listing that stop's departures in time order (CSR adjacency), with the
+    departure times copied into `by_stop_departure` so a bisect finds the next bus.
+    """
+    def __init__(self, connections, stop_count):
+        # connections: (departure, arrival, from_stop, to_stop, price_cents, schedule_id) sorted by departure
+        self.departure = array('q', (c[0] for c in connections))
+        self.arrival = array('q', (c[1] for c in connections))
+        self.from_stop = array('i', (c[2] for c in connections))
+        self.to_stop = array('i', (c[3] for c in connections))
+        self.price_cents = array('q', (c[4] for c in connections))
+        self.schedule_id = array('q', (c[5] for c in connections))
+        self.stop_count = stop_count
+
+        counts = [0] * (stop_count + 1)
+        for stop in self.from_stop:
+            counts[stop + 1] += 1
+        for stop in range(stop_count):
+            counts[stop + 1] += counts[stop]
+        self.stop_offsets = array('i', counts)
+        fill = list(counts[:-1])
+        by_stop = [0] * len(connections)
+        for index, stop in enumerate(self.from_stop):
+            by_stop[fill[stop]] = index
+            fill[stop] += 1
+        self.by_stop = array('i', by_stop)
+        self.by_stop_departure = array('q', (self.departure[index] for index in by_stop))
+
+    def __len__(self):
+        return len(self.departure)
+
+    def connections(self):
+        return zip(self.departure, self.arrival, self.from_stop, self.to_stop, self.price_cents, self.schedule_id)
+
+
+class JourneyPlanner:
+    def __init__(self, refresh_interval=60, min_transfer_minutes=15, max_legs=3, search_window_hours=48):
+        """
+        Multi-leg journey planner over an in-memory copy of route + schedule.
+
+        Every schedule is one connection between two cities. Searches run entirely in memory:
+        earliest arrival is a connection scan over the departure-sorted arrays, cheapest is a
+        Dijkstra search over departure events. A change of bus needs at least
+        min_transfer_minutes, journeys have at most max_legs buses and start within
+        search_window_hours of the requested time.
+
+        The network is loaded on first use and topped up every `refresh_interval` seconds with
+        schedules added since (ScheduleID order), merged into a new snapshot that replaces the
+        old one atomically. Free seat counts are tracked per connection from seat booking events
+        (see on_seat_event), so sold-out buses are skipped without a query.
+        """
+        self.refresh_interval = refresh_interval
+        self.min_transfer_minutes = min_transfer_minutes
+        self.max_legs = max_legs
+        self.search_window = search_window_hours * 60
+        self._stop_ids = {}    # city name -> stop number
+        self._stop_names = []
+        self._network = _Network([], 0)
+        self._free_seats = {}  # schedule_id -> free seats
+        self._last_schedule_id = 0
+        self._last_refresh = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    @property
+    def is_loaded(self):
+        return self._last_refresh is not None
+
+    def _stop(self, name):
+        stop = self._stop_ids.get(name)
+        if stop is None:
+            stop = self._stop_ids[name] = len(self._stop_names)
+            self._stop_names.append(name)
+        return stop
+
+    def refresh(self, conn):
+        """
+        Loads schedules with an ID above the last one seen (all of them on the first call)
+        and drops connections that have already departed.
+        """
+        with self._refresh_lock:
+            self._refresh_locked(conn)
+
+    def _refresh_locked(self, conn):
+        today = date.today()
+        rows = conn.get_connections_since(self._last_schedule_id, today)
+        added = []
+        with self._lock:
+            for row in rows:
+                departure = _to_minutes(row['DepartureDate'], row['DepartureTime'])
+                arrival = _to_minutes(row['DepartureDate'], row['ArrivalTime'])
+                if arrival <= departure:
+                    arrival += 1440  # arrives the next day
+                added.append((departure, arrival, self._stop(row['Source']), self._stop(row['Destination']),
+                              int(round(row['Price'] * 100)), row['ScheduleID']))
+                self._free_seats[row['ScheduleID']] = row['FreeSeats']
+                self._last_schedule_id = max(self._last_schedule_id, row['ScheduleID'])
+            stop_count = len(self._stop_names)
+
+        cutoff = _to_minutes(today, timedelta(0))
+        current = self._network
+        departed = bisect_left(current.departure, cutoff)
+        if added or departed:
+            added.sort()
+            kept = (connection for index, connection in enumerate(current.connections()) if index >= departed)
+            network = _Network(list(heapq.merge(kept, added)), stop_count)
+            with self._lock:
+                for schedule_id in current.schedule_id[:departed]:
+                    self._free_seats.pop(schedule_id, None)
+                self._network = network
+        self._last_refresh = time.monotonic()
+        logging.info("Journey planner refreshed: %s new connections, %s departed, %s total.", len(added), departed, len(self._network))
+
+    def rebuild(self, conn):
+        """
+        Drops the network and reloads it, picking up edited or deleted schedules.
+        """
+        with self._refresh_lock:
+            with self._lock:
+                self._network = _Network([], len(self._stop_names))
+                self._free_seats = {}
+                self._last_schedule_id = 0
+            self._refresh_locked(conn)
+
+    def ensure_fresh(self, conn):
+        """
+        Same policy as TimetableIndex.ensure_fresh: load on first use, then refresh in the
+        background of one request at a time, serving the current network if that fails.
+        """
+        if not self.is_loaded:
+            self.refresh(conn)
+            return
+        if time.monotonic() - self._last_refresh < self.refresh_interval:
+            return
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            self._refresh_locked(conn)
+        except Exception as e:
+            logging.warning("Journey planner refresh failed, serving the existing network: %s", e)
+        finally:
+            self._refresh_lock.release()
+
+    def on_seat_event(self, schedule_id, event):
+        """
+        SeatUpdateBroker listener keeping the free seat counts current.
+        """
+        if event.get("type") == "booked":
+            with self._lock:
+                if schedule_id in self._free_seats:
+                    self._free_seats[schedule_id] = max(0, self._free_seats[schedule_id] - len(event.get("seats", ())))
+
+    def plan(self, source, destination, departure, optimize='earliest', max_legs=None, min_transfer_minutes=None, seats=1):
+        """
+        Journeys from source to destination leaving at or after `departure` (a datetime).
+        optimize='earliest' minimises the arrival time, 'cheapest' the total fare.
+        Returns the best journey for each number of buses that beats every journey with fewer
+        buses, e.g. a direct bus plus a faster (or cheaper) connection with one change.
+        """
+        with self._lock:
+            network = self._network
+            origin = self._stop_ids.get(source)
+            target = self._stop_ids.get(destination)
+            free_seats = self._free_seats
+        if origin is None or target is None or origin == target:
+            return []
+        max_legs = self.max_legs if max_legs is None else max_legs
+        transfer = self.min_transfer_minutes if min_transfer_minutes is None else min_transfer_minutes
+        start = _to_minutes(departure.date(), departure.time())
+
+        def has_seats(connection):
+            return free_seats.get(network.schedule_id[connection], 0) >= seats
+
+        if optimize == 'cheapest':
+            found = self._cheapest(network, origin, target, start, max_legs, transfer, has_seats)
+        else:
+            found = self._earliest(network, origin, target, start, max_legs, transfer, has_seats)
+        return [self._describe(network, legs) for legs in found]
+
+    def _earliest(self, network, origin, target, start, max_legs, transfer, has_seats):
+        # Connection scan with one label per number of legs: arrival[k][stop] is the earliest
+        # arrival at stop using exactly k buses, and parent[k][stop] the bus that achieved it.
+        arrival = [[_NEVER] * network.stop_count for _ in range(max_legs + 1)]
+        parent = [[-1] * network.stop_count for _ in range(max_legs + 1)]
+        arrival[0][origin] = start - transfer  # the first bus needs no transfer time
+        best_at_target = _NEVER
+        last_departure = start + self.search_window
+        departures, arrivals = network.departure, network.arrival
+        from_stops, to_stops = network.from_stop, network.to_stop
+
+        for connection in range(bisect_left(departures, start), len(network)):
+            departs = departures[connection]
+            if departs > last_departure or departs >= best_at_target:
+                break
+            from_stop, to_stop, arrives = from_stops[connection], to_stops[connection], arrivals[connection]
+            for legs in range(1, max_legs + 1):
+                if arrival[legs - 1][from_stop] + transfer <= departs and arrives < arrival[legs][to_stop]:
+                    if not has_seats(connection):
+                        break
+                    arrival[legs][to_stop] = arrives
+                    parent[legs][to_stop] = connection
+                    if to_stop == target:
+                        best_at_target = min(best_at_target, arrives)
+
+        found = []
+        best = _NEVER
+        for legs in range(1, max_legs + 1):
+            if arrival[legs][target] < best:
+                best = arrival[legs][target]
+                path = []
+                stop = target
+                for remaining in range(legs, 0, -1):
+                    connection = parent[remaining][stop]
+                    path.append(connection)
+                    stop = from_stops[connection]
+                found.append(path[::-1])
+        return found
+
+    def _cheapest(self, network, origin, target, start, max_legs, transfer, has_seats):
+        # Dijkstra over departure events: a state is (position in a stop's departure list, buses
+        # taken so far). From a state one can wait for the next departure of the same stop (free)
+        # or board this one (its fare), reaching the first departure catchable at the next stop.
+        offsets, by_stop, by_stop_departure = network.stop_offsets, network.by_stop, network.by_stop_departure
+        last_departure = start + self.search_window
+        stride = max_legs + 1
+        sequence = 0  # tie-breaker so heap entries never compare their parent fields
+        heap = []
+        first = bisect_left(by_stop_departure, start, offsets[origin], offsets[origin + 1])
+        if first < offsets[origin + 1]:
+            heap.append((0, by_stop_departure[first], sequence, first, 0, None, -1))
+        came_from = {}      # settled state -> (previous state, connection boarded or -1)
+        arrivals = {}       # buses taken -> (fare, last connection, state it was boarded from)
+
+        while heap:
+            cost, _, _, position, legs, previous, boarded = heapq.heappop(heap)
+            if position < 0:
+                # Reached the target. Later pops cost at least as much, so only journeys with
+                # fewer buses than the ones found so far can still be worth listing.
+                if not arrivals or legs < min(arrivals):
+                    arrivals[legs] = (cost, boarded, previous)
+                if legs == 1:
+                    break
+                continue
+            state = position * stride + legs
+            if state in came_from:
+                continue
+            came_from[state] = (previous, boarded)
+            if by_stop_departure[position] > last_departure:
+                continue
+            stop_end = offsets[network.from_stop[by_stop[position]] + 1]
+
+            # Wait for the next departure from this stop
+            if position + 1 < stop_end:
+                sequence += 1
+                heapq.heappush(heap, (cost, by_stop_departure[position + 1], sequence, position + 1, legs, state, -1))
+
+            # Board this bus
+            connection = by_stop[position]
+            if legs >= max_legs or not has_seats(connection):
+                continue
+            fare = cost + network.price_cents[connection]
+            to_stop = network.to_stop[connection]
+            sequence += 1
+            if to_stop == target:
+                heapq.heappush(heap, (fare, network.arrival[connection], sequence, -1, legs + 1, state, connection))
+                continue
+            next_position = bisect_left(by_stop_departure, network.arrival[connection] + transfer,
+                                        offsets[to_stop], offsets[to_stop + 1])
+            if next_position < offsets[to_stop + 1]:
+                heapq.heappush(heap, (fare, by_stop_departure[next_position], sequence, next_position, legs + 1, state, connection))
+
+        found = []
+        for legs in sorted(arrivals):
+            _, connection, state = arrivals[legs]
+            path = [connection]
+            while state is not None:
+                state, boarded = came_from[state]
+                if boarded >= 0:
+                    path.append(boarded)
+            found.append(path[::-1])
+        return found
+
+    def _describe(self, network, path):
+        legs = [{
+            "ScheduleID": network.schedule_id[connection],
+            "Source": self._stop_names[network.from_stop[connection]],
+            "Destination": self._stop_names[network.to_stop[connection]],
+            "Departure": _from_minutes(network.departure[connection]).isoformat(timespec='minutes'),
+            "Arrival": _from_minutes(network.arrival[connection]).isoformat(timespec='minutes'),
+            "Price": f"{network.price_cents[connection] / 100:.2f}",
+        } for connection in path]
+        departure, arrival = network.departure[path[0]], network.arrival[path[-1]]
+        return {
+            "Departure": legs[0]["Departure"],
+            "Arrival": legs[-1]["Arrival"],
+            "DurationMinutes": arrival - departure,
+            "Transfers": len(path) - 1,
+            "TotalPrice": f"{sum(network.price_cents[connection] for connection in path) / 100:.2f}",
+            "Legs": legs,
+        }
+
+    def stats(self):
+        with self._lock:
+            network = self._network
+            return {"connections": len(network), "stops": len(self._stop_names), "last_schedule_id": self._last_schedule_id}
@@ -1,5 +1,12 @@
+import atexit
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import random
+import threading
+import time
 from datetime import datetime
 
 # Define the base path for your application logs
@@ -10,25 +17,193 @@ log_folder_name = 'logs'
 # Construct the full path to the logs directory
 log_path = os.path.join(base_application_path, log_folder_name)
 
+# Tunables (environment variables)
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')                          # 'json' (JSON lines) or 'text'
+LOG_INFO_SAMPLE_RATE = float(os.environ.get('LOG_INFO_SAMPLE_RATE', 1.0))  # fraction of INFO records kept
+LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024))     # rotate when the file grows past this
+LOG_ROTATE_SECONDS = int(os.environ.get('LOG_ROTATE_SECONDS', 24 * 3600))  # ...or when it gets this old
+LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT', 7))              # rotated files kept
+LOG_BATCH_SIZE = int(os.environ.get('LOG_BATCH_SIZE', 512))                # records per write
+LOG_FLUSH_INTERVAL = float(os.environ.get('LOG_FLUSH_INTERVAL', 0.5))      # max seconds a record waits to be written
+
+TEXT_FORMAT = "[%(asctime)s] %(lineno)d %(name)s - %(levelname)s - %(message)s"
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    Formats each record as one JSON object per line.
+    """
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "line": record.lineno,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class InfoSamplingFilter(logging.Filter):
+    """
+    Keeps only a random `rate` fraction of INFO records. DEBUG is governed by the level and
+    WARNING and above are always kept, so sampling never hides a problem.
+    """
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno != logging.INFO or self.rate >= 1.0 or random.random() < self.rate
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueues records as they are. The stock QueueHandler formats the message on the calling
+    thread; here interpolation and formatting happen on the listener thread instead, so
+    callers should pass values as logging arguments rather than pre-formatted f-strings.
+    """
+    def prepare(self, record):
+        return record
+
+
+class BatchingFileWriter:
+    def __init__(self, path, formatter, max_bytes, rotate_seconds, backup_count):
+        """
+        Writes batches of records to `path` with one write and one flush per batch.
+        The file is rotated (path.1, path.2, ...) when it exceeds max_bytes or rotate_seconds.
+        """
+        self.path = path
+        self.formatter = formatter
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.backup_count = backup_count
+        self._open()
+
+    def _open(self):
+        self._stream = open(self.path, 'a', encoding='utf-8')
+        self._size = self._stream.tell()
+        self._opened_at = time.monotonic()
+
+    def _rotate(self):
+        self._stream.close()
+        if self.backup_count > 0:
+            for index in range(self.backup_count - 1, 0, -1):
+                source = f"{self.path}.{index}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.path}.{index + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def write_batch(self, records):
+        lines = []
+        for record in records:
+            try:
+                lines.append(self.formatter.format(record))
+            except Exception as e:
+                lines.append(f"[log formatting error: {e!r}] {record.msg!r}")
+        data = "\n".join(lines) + "\n"
+        if self._size and (self._size + len(data) > self.max_bytes
+                           or time.monotonic() - self._opened_at > self.rotate_seconds):
+            self._rotate()
+        self._stream.write(data)
+        self._stream.flush()
+        self._size += len(data)
+
+    def close(self):
+        self._stream.close()
+
+
+class BatchingQueueListener:
+    _STOP = object()
+
+    def __init__(self, log_queue, writer, batch_size=512, flush_interval=0.5):
+        """
+        Background thread draining the log queue: it waits up to `flush_interval` for the first
+        record, then takes whatever else is queued (up to `batch_size`) and writes it in one go.
+        """
+        self.queue = log_queue
+        self.writer = writer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            try:
+                record = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = []
+            while True:
+                if record is self._STOP:
+                    stopping = True
+                    break
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    self.writer.write_batch(batch)
+                except Exception as e:
+                    print(f"ERROR (logger.py): Could not write {len(batch)} log records: {e}")
+        self.writer.close()
+
+    def stop(self):
+        """
+        Writes out everything queued so far and stops the thread.
+        """
+        if self._thread.is_alive():
+            self.queue.put(self._STOP)
+            self._thread.join(timeout=5)
+
+
+log_listener = None
+
 try:
     # Create the log directory if it does not exist
     # exist_ok=True prevents an error if the directory already exists
     os.makedirs(log_path, exist_ok=True)
-    
+
     # Generate a unique log file name based on the current timestamp
-    log_file = f"{datetime.now().strftime('%d_%m_%Y_%H_%M_%S')}.log"
+    # (plus the process ID, so several worker processes never share a file)
+    log_file = f"{datetime.now().strftime('%d_%m_%Y_%H_%M_%S')}_{os.getpid()}.log"
     log_file_path = os.path.join(log_path, log_file)
 
-    # Configure the root logger using basicConfig
-    # This sets up file logging for the entire application.
-    logging.basicConfig(
-        level=logging.INFO,  # Set the minimum logging level to INFO
-        filename=log_file_path, # Specify the log file
-        format="[%(asctime)s] %(lineno)d %(name)s - %(levelname)s - %(message)s" # Define log message format
-    )
-    
+    formatter = JsonLinesFormatter() if LOG_FORMAT == 'json' else logging.Formatter(TEXT_FORMAT)
+    writer = BatchingFileWriter(log_file_path, formatter, LOG_MAX_BYTES, LOG_ROTATE_SECONDS, LOG_BACKUP_COUNT)
+
+    # Request threads only put records on an unbounded in-memory queue;
+    # formatting and file I/O happen on the listener thread.
+    log_queue = queue.SimpleQueue()
+    queue_handler = LazyQueueHandler(log_queue)
+    queue_handler.addFilter(InfoSamplingFilter(LOG_INFO_SAMPLE_RATE))
+
+    root_logger = logging.getLogger()
+    root_logger.setLevel(LOG_LEVEL)
+    root_logger.addHandler(queue_handler)
+
+    log_listener = BatchingQueueListener(log_queue, writer, LOG_BATCH_SIZE, LOG_FLUSH_INTERVAL)
+    log_listener.start()
+    atexit.register(log_listener.stop)
+
     # Log a message to confirm successful setup (this will go to the file)
-    logging.info(f"Logger configured successfully to: {log_file_path}")
+    logging.info("Logger configured successfully to: %s", log_file_path)
 
 except OSError as e:
     # If there's an OS error (e.g., permissions issue or invalid path),
@@ -42,4 +217,4 @@ except Exception as e:
     print(f"ERROR (logger.py): An unexpected error occurred during logging setup: {e}")
     print("Falling back to console logging.")
     logging.basicConfig(level=logging.INFO, format="[%(asctime)s] %(levelname)s - %(message)s")
-    logging.error("Failed to set up file logging. Logging to console instead due to unexpected error.")
\ No newline at end of file
+    logging.error("Failed to set up file logging. Logging to console instead due to unexpected error.")
@@ -1,13 +1,56 @@
+import random
+import time
+from collections import Counter
 import mysql.connector
 from logger import logging
+from instrumentation import timed_query, observe_phase, InstrumentedCursor
+
+# MySQL errors worth retrying: 1213 = deadlock found, 1205 = lock wait timeout exceeded
+RETRYABLE_LOCK_ERRNOS = (1213, 1205)
 
 class ConnectDB:
-    def __init__(self, host='localhost', user='root', password='0000', database='bus_booking_system'):
+    # Retry policy for transactions that lose a deadlock / lock wait (exponential backoff with jitter)
+    LOCK_RETRIES = 3
+    LOCK_RETRY_BACKOFF = 0.05
+    LOCK_RETRY_BACKOFF_MAX = 1.0
+
+    # Column order of the rows yielded by iter_schedule_occupancy() and iter_booking_facts()
+    SCHEDULE_OCCUPANCY_COLUMNS = ("ScheduleID", "Source", "Destination", "CompanyName", "DepartureDate",
+                                  "Price", "SeatCapacity", "SeatsBooked")
+    BOOKING_FACT_COLUMNS = ("BookingID", "ScheduleID", "UserID", "SeatNumber", "BookingDate", "Source",
+                            "Destination", "CompanyName", "DepartureDate", "Price", "LeadDays")
+
+    def __init__(self, host='localhost', user='root', password='0000', database='bus_booking_system', pool=None, seat_cache=None, broker=None, user_cache=None, schedule_cache=None, replicas=None, read_from_primary=False, statements=None, breaker=None):
         # Initialize connection parameters
         self.host = host
         self.user = user
         self.password = password
         self.database = database
+        # Optional pool.ConnectionPool. When set, connections are borrowed from the pool
+        # instead of being opened per instance, and returned to it by close_connection().
+        self.pool = pool
+        # Optional seat_cache.SeatMapCache serving seat maps without touching the database.
+        self.seat_cache = seat_cache
+        # Optional pubsub.SeatUpdateBroker notified of every committed booking.
+        self.broker = broker
+        # Optional cache.LRUCaches of UserIDs known to exist and of schedule details
+        # (which never change once a schedule is created), skipping their queries.
+        self.user_cache = user_cache
+        self.schedule_cache = schedule_cache
+        # Optional topology.ReplicaSet serving read-only queries; writes stay on `pool`.
+        # read_from_primary keeps this session's reads on the primary (read-your-writes),
+        # and so does any write made through this instance.
+        self.replicas = replicas
+        self.read_from_primary = read_from_primary
+        self.wrote = False
+        self._replica = None
+        self._replica_conn = None
+        # Optional statements.StatementRegistry: read queries run as server-side prepared
+        # statements, cached per pooled connection, and return Row namedtuples.
+        self.statements = statements
+        # Optional overload.CircuitBreaker: after repeated failures to get a connection,
+        # fail fast with CircuitOpenError (a ConnectionError) instead of waiting on the database.
+        self.breaker = breaker
         # Initialize the database connection attribute as None.
         # The connection will be established/re-established when needed.
         self._mydb = None 
@@ -17,24 +60,108 @@ class ConnectDB:
         Internal method to get an active database connection.
         If the current connection is None or not connected, it establishes a new one.
         This ensures that every database operation uses a live connection.
+        With a pool, the connection is borrowed once and health-checked by the pool on borrow.
+        With a circuit breaker, raises CircuitOpenError while the database is considered down.
         """
+        if self.pool is not None:
+            if self._mydb is None:
+                self._mydb = self._guarded(self._acquire_pooled)
+            return self._mydb
         if self._mydb is None or not self._mydb.is_connected():
-            logging.info("Attempting to establish a new database connection.")
-            try:
-                self._mydb = mysql.connector.connect(
-                    host=self.host,
-                    user=self.user,
-                    password=self.password,
-                    database=self.database
-                )
-                logging.info("Successfully established a new database connection.")
-            except mysql.connector.Error as err:
-                # Log the specific MySQL connection error
-                logging.error(f"Error connecting to database: {err}", exc_info=True)
-                # Re-raise a custom exception to be caught in app.py
-                raise ConnectionError("Could not connect to the database.") from err
+            self._mydb = self._guarded(self._connect)
         return self._mydb
 
+    def _guarded(self, get_connection):
+        """
+        Gets a connection through the circuit breaker, if there is one: refused at once while
+        the circuit is open, and the outcome recorded otherwise.
+        """
+        if self.breaker is None:
+            return get_connection()
+        self.breaker.before_call()
+        try:
+            connection = get_connection()
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return connection
+
+    def _acquire_pooled(self):
+        started = time.perf_counter()
+        connection = self.pool.acquire()
+        observe_phase("connect", time.perf_counter() - started, round_trip=False)
+        return connection
+
+    def _connect(self):
+        logging.info("Attempting to establish a new database connection.")
+        try:
+            started = time.perf_counter()
+            connection = mysql.connector.connect(
+                host=self.host,
+                user=self.user,
+                password=self.password,
+                database=self.database
+            )
+            observe_phase("connect", time.perf_counter() - started)
+            logging.info("Successfully established a new database connection.")
+            return connection
+        except mysql.connector.Error as err:
+            # Log the specific MySQL connection error
+            logging.error("Error connecting to database: %s", err, exc_info=True)
+            # Re-raise a custom exception to be caught in app.py
+            raise ConnectionError("Could not connect to the database.") from err
+
+    def _get_read_connection(self):
+        """
+        Connection for read-only queries: a replica chosen by the ReplicaSet, or the primary
+        when there are no replicas, none is healthy, or this session must see its own writes.
+        The replica connection is borrowed once and returned by close_connection().
+        """
+        if self.replicas is None:
+            return self._get_db_connection()
+        if self.read_from_primary or self.wrote:
+            self.replicas.note_sticky_read()
+            return self._get_db_connection()
+        if self._replica_conn is not None:
+            return self._replica_conn
+        replica = self.replicas.choose_replica()
+        if replica is None:
+            return self._get_db_connection()
+        try:
+            started = time.perf_counter()
+            self._replica_conn = replica.pool.acquire()
+            observe_phase("connect", time.perf_counter() - started, round_trip=False)
+        except ConnectionError as err:
+            self.replicas.mark_failed(replica.name, err)
+            return self._get_db_connection()
+        self._replica = replica
+        return self._replica_conn
+
+    def _cursor(self, db_conn, **kwargs):
+        """
+        Opens a cursor whose execute/fetch calls are timed and counted as database round trips.
+        """
+        return InstrumentedCursor(db_conn.cursor(**kwargs))
+
+    def _read_cursor(self, db_conn, dictionary=True):
+        """
+        Cursor for a read-only query: a prepared statement cursor when a StatementRegistry is
+        configured (rows are Rows, indexable by column name and position), otherwise a plain
+        one returning dicts (or tuples with dictionary=False).
+        """
+        if self.statements is not None:
+            return self.statements.cursor(db_conn)
+        return self._cursor(db_conn, dictionary=dictionary)
+
+    def _commit(self, db_conn):
+        started = time.perf_counter()
+        try:
+            db_conn.commit()
+        finally:
+            observe_phase("commit", time.perf_counter() - started)
+        self.wrote = True
+
     # The public method for app.py to establish connection (now just calls the internal getter)
     def connect_to_db(self):
         """
@@ -43,6 +170,7 @@ class ConnectDB:
         """
         return self._get_db_connection()
 
+    @timed_query
     def find_available_buses(self, source, destination, travel_date):
         """
         Finds available buses based on source, destination, and date.
@@ -50,11 +178,11 @@ class ConnectDB:
         This method is now mostly used for the final booking confirmation,
         as initial date/seat selection is handled by new API calls.
         """
-        db_conn = self._get_db_connection() # Get an active connection
+        db_conn = self._get_read_connection() # Get an active connection
         cursor = None # Initialize cursor to None for finally block
         try:
             # Fetch results as dictionaries for easier access
-            cursor = db_conn.cursor(dictionary=True) 
+            cursor = self._read_cursor(db_conn)
             # Updated query to join 'schedule', 'route', 'bus', and 'buscompany' tables
             query = """
             SELECT 
@@ -76,57 +204,130 @@ class ConnectDB:
             results = cursor.fetchall() # Fetch all results
 
             if results:
-                logging.info(f"Found {len(results)} available buses for {source} to {destination} on {travel_date}.")
+                logging.info("Found %s available buses for %s to %s on %s.", len(results), source, destination, travel_date)
                 return results
             else:
-                logging.info(f"No available buses found for {source} to {destination} on {travel_date}.")
+                logging.info("No available buses found for %s to %s on %s.", source, destination, travel_date)
                 return None
         except mysql.connector.Error as err:
-            logging.error(f"Error finding available buses: {err}", exc_info=True)
+            logging.error("Error finding available buses: %s", err, exc_info=True)
             raise # Re-raise the exception to be caught by app.py's error handling
         finally:
             if cursor:
                 cursor.close()
 
     # New method to get available bus schedules (dates and IDs) for a route
+    @timed_query
     def get_available_bus_schedules(self, source, destination):
         """
         Retrieves unique available travel dates and their corresponding schedule IDs
-        for a given source and destination.
+        for a given source and destination, from today on.
         """
-        db_conn = self._get_db_connection()
+        db_conn = self._get_read_connection()
         cursor = None
         try:
-            cursor = db_conn.cursor(dictionary=True)
+            cursor = self._read_cursor(db_conn)
             # Updated query to join 'schedule' and 'route' tables
             query = """
             SELECT DISTINCT s.DepartureDate AS TravelDate, s.ScheduleID 
             FROM schedule s
             JOIN route r ON s.RouteID = r.RouteID
-            WHERE r.Source = %s AND r.Destination = %s 
+            WHERE r.Source = %s AND r.Destination = %s AND s.DepartureDate >= CURDATE()
             ORDER BY s.DepartureDate ASC;
             """
             cursor.execute(query, (source, destination))
             schedules = cursor.fetchall()
-            logging.info(f"Retrieved {len(schedules)} available schedules/dates for {source} to {destination}.")
+            logging.info("Retrieved %s available schedules/dates for %s to %s.", len(schedules), source, destination)
+            return schedules
+        except mysql.connector.Error as err:
+            logging.error("Error retrieving available bus schedules: %s", err, exc_info=True)
+            raise
+        finally:
+            if cursor:
+                cursor.close()
+
+    @timed_query
+    def get_schedules_since(self, last_schedule_id):
+        """
+        Retrieves every schedule departing today or later with a ScheduleID greater than
+        last_schedule_id, with its route.
+        Used to build and incrementally refresh the in-memory timetable index.
+        """
+        db_conn = self._get_read_connection()
+        cursor = None
+        try:
+            cursor = self._read_cursor(db_conn)
+            query = """
+            SELECT s.ScheduleID, r.Source, r.Destination, s.DepartureDate
+            FROM schedule s
+            JOIN route r ON s.RouteID = r.RouteID
+            WHERE s.ScheduleID > %s AND s.DepartureDate >= CURDATE()
+            ORDER BY s.ScheduleID ASC;
+            """
+            cursor.execute(query, (last_schedule_id,))
+            schedules = cursor.fetchall()
+            logging.info("Retrieved %s schedules with ScheduleID > %s.", len(schedules), last_schedule_id)
             return schedules
         except mysql.connector.Error as err:
-            logging.error(f"Error retrieving available bus schedules: {err}", exc_info=True)
+            logging.error("Error retrieving schedules since ScheduleID %s: %s", last_schedule_id, err, exc_info=True)
+            raise
+        finally:
+            if cursor:
+                cursor.close()
+
+    @timed_query
+    def get_connections_since(self, last_schedule_id, from_date):
+        """
+        Retrieves every schedule departing on or after from_date with a ScheduleID greater than
+        last_schedule_id, with its route, times, price and free seats.
+        Used to build and incrementally refresh the in-memory journey planner.
+        """
+        db_conn = self._get_read_connection()
+        cursor = None
+        try:
+            cursor = self._read_cursor(db_conn)
+            query = """
+            SELECT s.ScheduleID, r.Source, r.Destination, s.DepartureDate, s.DepartureTime, s.ArrivalTime,
+                   s.Price, COALESCE(i.FreeSeats, b.SeatCapacity) AS FreeSeats
+            FROM schedule s
+            JOIN route r ON s.RouteID = r.RouteID
+            JOIN bus b ON s.BusID = b.BusID
+            LEFT JOIN schedule_inventory i ON i.ScheduleID = s.ScheduleID
+            WHERE s.ScheduleID > %s AND s.DepartureDate >= %s
+            ORDER BY s.ScheduleID ASC;
+            """
+            cursor.execute(query, (last_schedule_id, from_date))
+            connections = cursor.fetchall()
+            logging.info("Retrieved %s connections with ScheduleID > %s.", len(connections), last_schedule_id)
+            return connections
+        except mysql.connector.Error as err:
+            logging.error("Error retrieving connections since ScheduleID %s: %s", last_schedule_id, err, exc_info=True)
             raise
         finally:
             if cursor:
                 cursor.close()
 
     # New method to get seat availability for a specific schedule
+    @timed_query
     def get_seat_availability(self, schedule_id):
         """
         Retrieves total seats and a list of occupied seats for a given schedule ID.
         Returns a dictionary: {'total_seats': int, 'occupied_seats': list}.
+        When a seat cache is configured, a cached bitmap is served without any database round trip.
         """
-        db_conn = self._get_db_connection()
+        if self.seat_cache is not None:
+            seat_map = self.seat_cache.get(schedule_id)
+            if seat_map is not None:
+                return seat_map.as_dict()
+            cache_token = self.seat_cache.load_token()
+            # A map that will be cached is read from the primary: a lagging replica's copy
+            # would stay in the cache after the replica catches up.
+            db_conn = self._get_db_connection()
+        else:
+            db_conn = self._get_read_connection()
         cursor = None
         try:
-            cursor = db_conn.cursor(dictionary=True)
+            cursor = self._read_cursor(db_conn)
 
             # First, get the total number of seats for the bus associated with the schedule
             # Updated query to join 'schedule' and 'bus' tables
@@ -150,44 +351,488 @@ class ConnectDB:
             
             occupied_seat_numbers = [seat['SeatNumber'] for seat in occupied_seats_results]
             
-            logging.info(f"Retrieved seat availability for ScheduleID {schedule_id}. Total: {total_seats}, Occupied: {len(occupied_seat_numbers)}")
+            logging.info("Retrieved seat availability for ScheduleID %s. Total: %s, Occupied: %s", schedule_id, total_seats, len(occupied_seat_numbers))
+            # Only cache maps of schedules that exist, not the 50-seat fallback
+            if self.seat_cache is not None and total_seats_result:
+                self.seat_cache.put(schedule_id, total_seats, occupied_seat_numbers, token=cache_token)
             return {"total_seats": total_seats, "occupied_seats": occupied_seat_numbers}
         except mysql.connector.Error as err:
-            logging.error(f"Error retrieving seat availability for ScheduleID {schedule_id}: {err}", exc_info=True)
+            logging.error("Error retrieving seat availability for ScheduleID %s: %s", schedule_id, err, exc_info=True)
+            raise
+        finally:
+            if cursor:
+                cursor.close()
+
+    @timed_query
+    def search_schedules(self, source, destination, start_date, end_date, min_seats=1, min_price=None, max_price=None,
+                         depart_after=None, depart_before=None, company=None, after=None, limit=20):
+        """
+        Searches departures of a route over a date range from the schedule_inventory summary,
+        in (DepartureDate, DepartureTime, ScheduleID) order.
+        Optional filters: min_seats free, fare between min_price and max_price, departure time
+        between depart_after and depart_before ('HH:MM'), and company name.
+        Keyset pagination: `after` is the (DepartureDate, DepartureTime, ScheduleID) of the last
+        row of the previous page. Returns (rows, has_more).
+        """
+        conditions = ["r.Source = %s", "r.Destination = %s", "i.DepartureDate BETWEEN %s AND %s", "i.FreeSeats >= %s"]
+        params = [source, destination, start_date, end_date, min_seats]
+        for condition, value in (("i.MinPrice >= %s", min_price), ("i.MinPrice <= %s", max_price),
+                                 ("i.DepartureTime >= %s", depart_after), ("i.DepartureTime <= %s", depart_before),
+                                 ("bc.CompanyName = %s", company)):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+        if after is not None:
+            last_date, last_time, last_id = after
+            # Expanded row comparison, so the index range starts at the last date seen
+            conditions.append("i.DepartureDate >= %s AND (i.DepartureDate > %s OR (i.DepartureDate = %s AND "
+                              "(i.DepartureTime > %s OR (i.DepartureTime = %s AND i.ScheduleID > %s))))")
+            params.extend([last_date, last_date, last_date, last_time, last_time, last_id])
+        params.append(limit + 1)
+
+        db_conn = self._get_read_connection()
+        cursor = None
+        try:
+            cursor = self._read_cursor(db_conn)
+            query = f"""
+            SELECT
+                i.ScheduleID,
+                i.DepartureDate AS TravelDate,
+                i.DepartureTime,
+                s.ArrivalTime,
+                i.MinPrice,
+                i.FreeSeats,
+                bc.CompanyName,
+                b.BusNumber
+            FROM route r
+            JOIN schedule_inventory i ON i.RouteID = r.RouteID
+            JOIN schedule s ON s.ScheduleID = i.ScheduleID
+            JOIN bus b ON s.BusID = b.BusID
+            JOIN buscompany bc ON bc.CompanyID = i.CompanyID
+            WHERE {' AND '.join(conditions)}
+            ORDER BY i.DepartureDate, i.DepartureTime, i.ScheduleID
+            LIMIT %s;
+            """
+            cursor.execute(query, params)
+            results = cursor.fetchall() # One row past the page tells whether there is a next one
+            logging.info("Search %s to %s, %s..%s: %s schedules.", source, destination, start_date, end_date, len(results))
+            return results[:limit], len(results) > limit
+        except mysql.connector.Error as err:
+            logging.error("Error searching schedules for %s to %s: %s", source, destination, err, exc_info=True)
             raise
         finally:
             if cursor:
                 cursor.close()
 
+    @timed_query
+    def refresh_schedule_inventory(self, schedule_id=None):
+        """
+        Rebuilds the schedule_inventory row of one schedule, or of all of them when schedule_id is None.
+        Needed after schedules or seats are added outside the booking procedures.
+        """
+        def call_refresh(cursor):
+            cursor.execute("CALL RefreshScheduleInventory(%s);", (schedule_id,))
+
+        try:
+            self._run_in_transaction(call_refresh)
+            logging.info("Schedule inventory refreshed for %s.", "all schedules" if schedule_id is None else f"ScheduleID {schedule_id}")
+        except mysql.connector.Error as err:
+            logging.error("Error refreshing schedule inventory: %s", err, exc_info=True)
+            raise
+
+    @timed_query
+    def archive_departed_schedules(self, before, batch_size=500):
+        """
+        Moves up to batch_size schedules departing before `before` (a date), oldest first, with
+        their bookings into schedule_history and booking_history, and deletes them and their
+        seats and inventory rows from the live tables, in one transaction.
+        Small batches keep the row locks short; call repeatedly until it returns (0, 0).
+        Returns (schedules, bookings) moved.
+        """
+        def move_batch(cursor):
+            cursor.execute("""
+            SELECT ScheduleID FROM schedule
+            WHERE DepartureDate < %s
+            ORDER BY DepartureDate, ScheduleID
+            LIMIT %s
+            FOR UPDATE;
+            """, (before, batch_size))
+            schedule_ids = [row[0] for row in cursor.fetchall()]
+            if not schedule_ids:
+                return [], 0
+            id_list = ", ".join(["%s"] * len(schedule_ids))
+            cursor.execute(f"""
+            INSERT INTO schedule_history (ScheduleID, BusID, RouteID, Source, Destination, BusNumber, CompanyName,
+                                          DepartureDate, DepartureTime, ArrivalTime, Price, SeatCapacity, SeatsBooked)
+            SELECT s.ScheduleID, s.BusID, s.RouteID, r.Source, r.Destination, b.BusNumber, bc.CompanyName,
+                   s.DepartureDate, s.DepartureTime, s.ArrivalTime, s.Price, b.SeatCapacity,
+                   (SELECT COUNT(*) FROM booking bk WHERE bk.ScheduleID = s.ScheduleID)
+            FROM schedule s
+            JOIN route r ON s.RouteID = r.RouteID
+            JOIN bus b ON s.BusID = b.BusID
+            JOIN buscompany bc ON b.CompanyID = bc.CompanyID
+            WHERE s.ScheduleID IN ({id_list});
+            """, schedule_ids)
+            cursor.execute(f"""
+            INSERT INTO booking_history (BookingID, ScheduleID, UserID, SeatNumber, BookingDate)
+            SELECT BookingID, ScheduleID, UserID, SeatNumber, BookingDate
+            FROM booking
+            WHERE ScheduleID IN ({id_list});
+            """, schedule_ids)
+            bookings = cursor.rowcount
+            for table in ('booking', 'availableseats', 'schedule_inventory', 'schedule'):
+                cursor.execute(f"DELETE FROM {table} WHERE ScheduleID IN ({id_list});", schedule_ids)
+            return schedule_ids, bookings
+
+        try:
+            schedule_ids, bookings = self._run_in_transaction(move_batch)
+        except mysql.connector.Error as err:
+            logging.error("Error archiving schedules departing before %s: %s", before, err, exc_info=True)
+            raise
+        for schedule_id in schedule_ids:
+            if self.seat_cache is not None:
+                self.seat_cache.invalidate(schedule_id)
+            if self.schedule_cache is not None:
+                self.schedule_cache.pop(schedule_id)
+        if schedule_ids:
+            logging.info("Archived %s schedules and %s bookings departing before %s.", len(schedule_ids), bookings, before)
+        return len(schedule_ids), bookings
+
+    def _stream(self, query, params, chunk_size):
+        """
+        Runs a read-only query on an unbuffered cursor and yields its rows (tuples) in lists of
+        at most chunk_size, so the client never holds more than one chunk of a large result.
+        The rows stay on the server until they are fetched, which keeps the connection busy for
+        the whole stream: use a connection (pool) of its own, not the one serving bookings.
+        If the caller stops early, the unread rest makes the rollback on release fail and the
+        pool discards the connection instead of reusing it.
+        """
+        db_conn = self._get_read_connection()
+        cursor = None
+        try:
+            cursor = self._cursor(db_conn, buffered=False)
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield rows
+        except mysql.connector.Error as err:
+            logging.error("Error streaming query results: %s", err, exc_info=True)
+            raise
+        finally:
+            if cursor:
+                try:
+                    cursor.close()
+                except mysql.connector.Error as err:  # unread rows after an early stop
+                    logging.debug("Closed a partly read streaming cursor: %s", err)
+
+    def iter_schedule_occupancy(self, start_date, end_date, chunk_size=5000):
+        """
+        Streams every schedule departing between start_date and end_date (inclusive), live or
+        archived, with its seat capacity and number of seats booked, in chunks of rows ordered
+        as SCHEDULE_OCCUPANCY_COLUMNS.
+        """
+        query = """
+        SELECT s.ScheduleID, r.Source, r.Destination, bc.CompanyName, s.DepartureDate, s.Price, b.SeatCapacity,
+               (SELECT COUNT(*) FROM booking bk WHERE bk.ScheduleID = s.ScheduleID) AS SeatsBooked
+        FROM schedule s
+        JOIN route r ON s.RouteID = r.RouteID
+        JOIN bus b ON s.BusID = b.BusID
+        JOIN buscompany bc ON b.CompanyID = bc.CompanyID
+        WHERE s.DepartureDate BETWEEN %s AND %s
+        UNION ALL
+        SELECT h.ScheduleID, h.Source, h.Destination, h.CompanyName, h.DepartureDate, h.Price, h.SeatCapacity, h.SeatsBooked
+        FROM schedule_history h
+        WHERE h.DepartureDate BETWEEN %s AND %s;
+        """
+        return self._stream(query, (start_date, end_date, start_date, end_date), chunk_size)
+
+    def iter_booking_facts(self, start_date, end_date, chunk_size=5000):
+        """
+        Streams every booking, live or archived, on schedules departing between start_date and
+        end_date (inclusive) with its route, company, fare and lead time (days booked ahead of
+        departure), in chunks of rows ordered as BOOKING_FACT_COLUMNS.
+        """
+        query = """
+        SELECT bk.BookingID, bk.ScheduleID, bk.UserID, bk.SeatNumber, bk.BookingDate, r.Source, r.Destination,
+               bc.CompanyName, s.DepartureDate, s.Price, DATEDIFF(s.DepartureDate, bk.BookingDate) AS LeadDays
+        FROM booking bk
+        JOIN schedule s ON bk.ScheduleID = s.ScheduleID
+        JOIN route r ON s.RouteID = r.RouteID
+        JOIN bus b ON s.BusID = b.BusID
+        JOIN buscompany bc ON b.CompanyID = bc.CompanyID
+        WHERE s.DepartureDate BETWEEN %s AND %s
+        UNION ALL
+        SELECT bh.BookingID, bh.ScheduleID, bh.UserID, bh.SeatNumber, bh.BookingDate, h.Source, h.Destination,
+               h.CompanyName, h.DepartureDate, h.Price, DATEDIFF(h.DepartureDate, bh.BookingDate)
+        FROM booking_history bh
+        JOIN schedule_history h ON bh.ScheduleID = h.ScheduleID
+        WHERE h.DepartureDate BETWEEN %s AND %s;
+        """
+        return self._stream(query, (start_date, end_date, start_date, end_date), chunk_size)
+
+    def _run_in_transaction(self, work, commit=True, **cursor_options):
+        """
+        Runs work(cursor) and commits; pass commit=False when work calls a procedure that commits
+        itself, saving a round trip. If the transaction is chosen as a deadlock victim or times
+        out waiting for a row lock, it is rolled back and retried with exponential backoff.
+        Any other error (or the last retryable one) is rolled back and re-raised.
+        """
+        attempt = 0
+        while True:
+            db_conn = self._get_db_connection()
+            cursor = None
+            try:
+                cursor = self._cursor(db_conn, **cursor_options)
+                result = work(cursor)
+                if commit:
+                    self._commit(db_conn)
+                return result
+            except mysql.connector.Error as err:
+                db_conn.rollback()
+                if err.errno not in RETRYABLE_LOCK_ERRNOS or attempt >= self.LOCK_RETRIES:
+                    raise
+                attempt += 1
+                delay = min(self.LOCK_RETRY_BACKOFF * 2 ** (attempt - 1), self.LOCK_RETRY_BACKOFF_MAX)
+                delay *= random.uniform(0.5, 1.0) # Jitter so competing transactions do not retry in lockstep
+                logging.warning("Lock conflict (%s), retrying transaction in %.3fs (attempt %s/%s).", err.errno, delay, attempt, self.LOCK_RETRIES)
+                time.sleep(delay)
+            finally:
+                if cursor:
+                    cursor.close()
+
+    @timed_query
     def book_seat(self, schedule_id, seat_number, user_id):
         """
         Books a seat for a user.
-        Ensures a live database connection before executing the booking procedure.
+        Ensures a live database connection before executing the booking procedure,
+        and retries the call if it loses a lock conflict with a concurrent booking.
         """
-        db_conn = self._get_db_connection() # Get an active connection
-        cursor = None # Initialize cursor to None for finally block
-        try:
-            cursor = db_conn.cursor()
-            # Assuming BookSeat stored procedure handles availability check and actual booking (insertion).
-            # If not, you might need to insert into the 'booking' table directly here.
+        def call_book_seat(cursor):
+            # BookSeat locks the seat row (SELECT ... FOR UPDATE), books it and removes it from 'availableseats'.
             query = "CALL BookSeat(%s, %s, %s);"
             cursor.execute(query, (schedule_id, seat_number, user_id))
-            db_conn.commit() # Important: Commit changes to the database.
-            logging.info(f"Seat {seat_number} booked successfully for ScheduleID {schedule_id}, UserID {user_id}.")
+
+        try:
+            self._run_in_transaction(call_book_seat) # Commits the changes to the database.
+            self._seats_booked(schedule_id, [seat_number])
+            logging.info("Seat %s booked successfully for ScheduleID %s, UserID %s.", seat_number, schedule_id, user_id)
             return True # Booking successful.
         except mysql.connector.Error as err:
-            db_conn.rollback() # Rollback transaction if an error occurs during booking.
-            logging.error(f"Error during booking seat {seat_number} for ScheduleID {schedule_id}, UserID {user_id}: {err}", exc_info=True)
+            # The transaction has already been rolled back.
+            logging.error("Error during booking seat %s for ScheduleID %s, UserID %s: %s", seat_number, schedule_id, user_id, err, exc_info=True)
             return False # Booking failed.
-        finally:
-            if cursor:
-                cursor.close()
+
+    @timed_query
+    def book_seat_for_user(self, schedule_id, seat_number, user_id):
+        """
+        Books a seat for a user with a single CALL of BookSeatForUser, which also registers the
+        user if needed and returns the schedule details, so the common case is one round trip.
+        Users known to exist and cached schedule details are skipped in the call.
+        Returns 'booked', 'unavailable' or 'failed'; after a booking the details are cached
+        for get_schedule_details_by_id.
+        """
+        register_user = self.user_cache is None or self.user_cache.get(user_id) is None
+        return_details = self.schedule_cache is None or self.schedule_cache.get(schedule_id) is None
+
+        def call_book_seat_for_user(cursor):
+            # A plain CALL rather than callproc(), which would add a SET round trip for the arguments
+            query = "CALL BookSeatForUser(%s, %s, %s, %s, %s);"
+            cursor.execute(query, (schedule_id, seat_number, user_id, register_user, return_details))
+            details = cursor.fetchone() if cursor.with_rows else None
+            while cursor.nextset(): # Drain the CALL's status result so the connection is reusable
+                pass
+            return details
+
+        try:
+            # BookSeatForUser commits the booking itself
+            details = self._run_in_transaction(call_book_seat_for_user, commit=False, dictionary=True)
+        except mysql.connector.Error as err:
+            if err.errno == 1644: # SIGNAL from the procedure: the seat is not available
+                logging.info("Seat %s on ScheduleID %s is not available for UserID %s.", seat_number, schedule_id, user_id)
+                return "unavailable"
+            logging.error("Error during booking seat %s for ScheduleID %s, UserID %s: %s", seat_number, schedule_id, user_id, err, exc_info=True)
+            return "failed"
+
+        if self.user_cache is not None:
+            self.user_cache.put(user_id, True)
+        if self.schedule_cache is not None and details is not None:
+            self.schedule_cache.put(schedule_id, details)
+        self._seats_booked(schedule_id, [seat_number])
+        logging.info("Seat %s booked successfully for ScheduleID %s, UserID %s.", seat_number, schedule_id, user_id)
+        return "booked"
+
+    @timed_query
+    def book_seats(self, user_id, seats, all_or_nothing=False):
+        """
+        Books several seats for a user in a single transaction.
+        `seats` is a list of (schedule_id, seat_number) pairs, possibly spanning schedules.
+        All requested rows of 'availableseats' are locked in one statement, the available ones
+        are booked with one multi-row INSERT and one DELETE, and the whole batch commits once.
+        With all_or_nothing=True nothing is booked unless every seat is available.
+        Returns one {'schedule_id', 'seat_number', 'status'} dict per distinct seat, where status
+        is 'booked', 'unavailable', 'not_booked' (all_or_nothing batch aborted) or 'failed'.
+        """
+        requested = list(dict.fromkeys((int(schedule_id), int(seat_number)) for schedule_id, seat_number in seats))
+        if not requested:
+            return []
+
+        try:
+            # One commit for the whole batch, retried if it loses a lock conflict
+            available, booked = self._run_in_transaction(
+                lambda cursor: self._reserve_seats(cursor, user_id, requested, all_or_nothing)
+            )
+        except mysql.connector.Error as err:
+            logging.error("Error during batch booking of %s seats for UserID %s: %s", len(requested), user_id, err, exc_info=True)
+            return [{"schedule_id": schedule_id, "seat_number": seat_number, "status": "failed"} for schedule_id, seat_number in requested]
+
+        by_schedule = {}
+        for schedule_id, seat_number in booked:
+            by_schedule.setdefault(schedule_id, []).append(seat_number)
+        for schedule_id, seat_numbers in by_schedule.items():
+            self._seats_booked(schedule_id, sorted(seat_numbers))
+
+        results = []
+        for seat in requested:
+            if seat in booked:
+                status = "booked"
+            elif seat in available:
+                status = "not_booked" # Available, but the all_or_nothing batch was aborted
+            else:
+                status = "unavailable"
+            results.append({"schedule_id": seat[0], "seat_number": seat[1], "status": status})
+        logging.info("Batch booking for UserID %s: %s of %s seats booked.", user_id, len(booked), len(requested))
+        return results
+
+    @timed_query
+    def book_seat_group(self, bookings):
+        """
+        Books a group of single seats for (possibly) different users in ONE transaction, with a
+        savepoint around each booking, so the group costs one commit (one log flush) instead of
+        one per seat. `bookings` is a list of (schedule_id, seat_number, user_id) triples; each
+        is applied like BookSeatForUser (unknown users are registered with placeholder details).
+        A booking that fails is rolled back to its savepoint without affecting the others; a
+        deadlock or lock wait timeout rolls back and retries the whole group.
+        Returns one status per booking: 'booked', 'unavailable' or 'failed'.
+        """
+        def apply_group(cursor):
+            statuses = []
+            for schedule_id, seat_number, user_id in bookings:
+                cursor.execute("SAVEPOINT group_booking;")
+                try:
+                    if self.user_cache is None or self.user_cache.get(user_id) is None:
+                        cursor.execute(
+                            "INSERT IGNORE INTO user (UserID, FirstName, LastName, Email, PhoneNumber, Password) "
+                            "VALUES (%s, %s, 'Auto', %s, '000-000-0000', 'password');",
+                            (user_id, f"NewUser_{user_id}", f"user_{user_id}@example.com"),
+                        )
+                    cursor.execute(
+                        "SELECT COUNT(*) FROM availableseats WHERE ScheduleID = %s AND SeatNumber = %s FOR UPDATE;",
+                        (schedule_id, seat_number),
+                    )
+                    if cursor.fetchone()[0] == 0:
+                        cursor.execute("ROLLBACK TO SAVEPOINT group_booking;") # Like BookSeatForUser: no user either
+                        statuses.append("unavailable")
+                    else:
+                        cursor.execute(
+                            "INSERT INTO booking (ScheduleID, UserID, SeatNumber, BookingDate) VALUES (%s, %s, %s, NOW());",
+                            (schedule_id, user_id, seat_number),
+                        )
+                        cursor.execute("DELETE FROM availableseats WHERE ScheduleID = %s AND SeatNumber = %s;",
+                                       (schedule_id, seat_number))
+                        cursor.execute("UPDATE schedule_inventory SET FreeSeats = FreeSeats - 1 WHERE ScheduleID = %s;",
+                                       (schedule_id,))
+                        statuses.append("booked")
+                    cursor.execute("RELEASE SAVEPOINT group_booking;")
+                except mysql.connector.Error as err:
+                    if err.errno in RETRYABLE_LOCK_ERRNOS:
+                        raise # InnoDB has rolled back the whole transaction
+                    logging.warning("Booking of seat %s on ScheduleID %s for UserID %s failed in its group: %s",
+                                    seat_number, schedule_id, user_id, err)
+                    cursor.execute("ROLLBACK TO SAVEPOINT group_booking;")
+                    cursor.execute("RELEASE SAVEPOINT group_booking;")
+                    statuses.append("failed")
+            return statuses
+
+        if not bookings:
+            return []
+        try:
+            statuses = self._run_in_transaction(apply_group) # The single commit for the group
+        except mysql.connector.Error as err:
+            logging.error("Error during group booking of %s seats: %s", len(bookings), err, exc_info=True)
+            return ["failed"] * len(bookings)
+
+        by_schedule = {}
+        for (schedule_id, seat_number, user_id), status in zip(bookings, statuses):
+            if status == "booked":
+                by_schedule.setdefault(schedule_id, []).append(seat_number)
+                if self.user_cache is not None:
+                    self.user_cache.put(user_id, True)
+        for schedule_id, seat_numbers in by_schedule.items():
+            self._seats_booked(schedule_id, sorted(seat_numbers))
+        logging.info("Group booking: %s of %s seats booked in one commit.", statuses.count("booked"), len(bookings))
+        return statuses
+
+    def _seats_booked(self, schedule_id, seat_numbers):
+        """
+        Called once a booking has committed: writes the seats through to the cached seat map
+        and publishes a seat delta to viewers of the schedule.
+        """
+        self.wrote = True
+        if self.seat_cache is not None:
+            self.seat_cache.mark_booked(schedule_id, seat_numbers)
+        if self.broker is not None:
+            self.broker.publish(schedule_id, {"type": "booked", "schedule_id": schedule_id, "seats": seat_numbers})
+
+    def _reserve_seats(self, cursor, user_id, seats, all_or_nothing=False):
+        """
+        Books the available seats among `seats` inside the caller's open transaction.
+        Returns (available, booked) sets of (schedule_id, seat_number) pairs; the caller commits.
+        """
+        pairs = ", ".join(["(%s, %s)"] * len(seats))
+        params = [value for seat in seats for value in seat]
+        # Lock every requested seat row in one pass so concurrent bookings of the same seats wait
+        cursor.execute(
+            f"SELECT ScheduleID, SeatNumber FROM availableseats WHERE (ScheduleID, SeatNumber) IN ({pairs}) FOR UPDATE;",
+            params,
+        )
+        available = {(row[0], row[1]) for row in cursor.fetchall()}
+        if not available or (all_or_nothing and len(available) < len(seats)):
+            return available, set()
+
+        to_book = [seat for seat in seats if seat in available]
+        cursor.executemany(
+            "INSERT INTO booking (ScheduleID, UserID, SeatNumber, BookingDate) VALUES (%s, %s, %s, NOW());",
+            [(schedule_id, user_id, seat_number) for schedule_id, seat_number in to_book],
+        )
+        cursor.execute(
+            f"DELETE FROM availableseats WHERE (ScheduleID, SeatNumber) IN ({', '.join(['(%s, %s)'] * len(to_book))});",
+            [value for seat in to_book for value in seat],
+        )
+        # Keep the search summary in step, in the same transaction
+        booked_per_schedule = Counter(schedule_id for schedule_id, _ in to_book)
+        cursor.executemany(
+            "UPDATE schedule_inventory SET FreeSeats = FreeSeats - %s WHERE ScheduleID = %s;",
+            [(count, schedule_id) for schedule_id, count in booked_per_schedule.items()],
+        )
+        return available, set(to_book)
 
     def close_connection(self):
         """
         Closes the database connection if it is open.
         This should be called at the end of the request lifecycle in app.py.
+        Pooled connections are returned to the pool rather than closed.
         """
+        if self._replica_conn is not None:
+            self._replica.pool.release(self._replica_conn)
+            self._replica_conn = None
+            self._replica = None
+        if self.pool is not None:
+            if self._mydb is not None:
+                self.pool.release(self._mydb)
+                self._mydb = None
+            return
         if self._mydb and self._mydb.is_connected():
             self._mydb.close()
             logging.info("Database connection explicitly closed.")
@@ -195,6 +840,7 @@ class ConnectDB:
         else:
             logging.info("No active database connection to close (or already closed).")
             
+    @timed_query
     def get_user_id(self, email):
         """
         Retrieves the user ID based on the email.
@@ -203,45 +849,52 @@ class ConnectDB:
         db_conn = self._get_db_connection() # Get an active connection
         cursor = None # Initialize cursor to None for finally block
         try:
-            cursor = db_conn.cursor()
+            cursor = self._read_cursor(db_conn, dictionary=False)
             query = "SELECT UserID FROM user WHERE Email = %s" # Changed 'User' to 'user' for consistency
             cursor.execute(query, (email,))
             result = cursor.fetchone()
             if result:
-                logging.info(f"User ID found for email {email}.")
+                logging.info("User ID found for email %s.", email)
                 return result[0]
             else:
-                logging.info(f"No user ID found for email {email}.")
+                logging.info("No user ID found for email %s.", email)
                 return None
         except mysql.connector.Error as err:
-            logging.error(f"Error getting user ID for email {email}: {err}", exc_info=True)
+            logging.error("Error getting user ID for email %s: %s", email, err, exc_info=True)
             raise # Re-raise the exception to be caught by app.py's error handling
         finally:
             if cursor:
                 cursor.close()
 
+    @timed_query
     def check_user_exists(self, user_id):
         """
         Checks if a given UserID exists in the 'user' table.
         Returns True if the user exists, False otherwise.
+        Only positive answers are cached: users are never deleted, but may be registered later.
         """
+        if self.user_cache is not None and self.user_cache.get(user_id):
+            return True
         db_conn = self._get_db_connection()
         cursor = None
         try:
-            cursor = db_conn.cursor()
+            cursor = self._read_cursor(db_conn, dictionary=False)
             query = "SELECT COUNT(*) FROM user WHERE UserID = %s;"
             cursor.execute(query, (user_id,))
             result = cursor.fetchone()
             exists = result[0] > 0
-            logging.info(f"User ID {user_id} exists: {exists}")
+            logging.info("User ID %s exists: %s", user_id, exists)
+            if exists and self.user_cache is not None:
+                self.user_cache.put(user_id, True)
             return exists
         except mysql.connector.Error as err:
-            logging.error(f"Error checking if user {user_id} exists: {err}", exc_info=True)
+            logging.error("Error checking if user %s exists: %s", user_id, err, exc_info=True)
             raise # Re-raise to be handled by app.py
         finally:
             if cursor:
                 cursor.close()
 
+    @timed_query
     def register_user(self, user_id, first_name, last_name, email, phone_number, password):
         """
         Registers a new user with provided details.
@@ -251,7 +904,7 @@ class ConnectDB:
         db_conn = self._get_db_connection()
         cursor = None
         try:
-            cursor = db_conn.cursor()
+            cursor = self._cursor(db_conn)
             # If UserID is AUTO_INCREMENT, you'd omit UserID from the INSERT and let DB assign.
             # Assuming UserID is provided and not auto-incremented here.
             query = """
@@ -259,29 +912,37 @@ class ConnectDB:
             VALUES (%s, %s, %s, %s, %s, %s);
             """
             cursor.execute(query, (user_id, first_name, last_name, email, phone_number, password))
-            db_conn.commit()
-            logging.info(f"User {user_id} ({email}) registered successfully.")
+            self._commit(db_conn)
+            if self.user_cache is not None:
+                self.user_cache.put(user_id, True)
+            logging.info("User %s (%s) registered successfully.", user_id, email)
             return True
         except mysql.connector.Error as err:
             db_conn.rollback()
-            logging.error(f"Error registering user {user_id}: {err}", exc_info=True)
+            logging.error("Error registering user %s: %s", user_id, err, exc_info=True)
             # Catch duplicate entry error if UserID is primary key and user tries to register existing ID
             if err.errno == 1062: # MySQL error code for Duplicate entry for primary key
-                logging.warning(f"Attempted to register user {user_id} but UserID already exists.")
+                logging.warning("Attempted to register user %s but UserID already exists.", user_id)
                 return False # Indicate that registration failed due to duplicate ID
             raise # Re-raise for other errors
         finally:
             if cursor:
                 cursor.close()
 
+    @timed_query
     def get_schedule_details_by_id(self, schedule_id):
         """
         Retrieves full details of a bus schedule by its ScheduleID.
+        Served from the schedule cache when configured; callers get their own copy of the row.
         """
-        db_conn = self._get_db_connection()
+        if self.schedule_cache is not None:
+            cached = self.schedule_cache.get(schedule_id)
+            if cached is not None:
+                return dict(cached)
+        db_conn = self._get_read_connection()
         cursor = None
         try:
-            cursor = db_conn.cursor(dictionary=True)
+            cursor = self._read_cursor(db_conn)
             query = """
             SELECT 
                 s.ScheduleID, 
@@ -303,12 +964,15 @@ class ConnectDB:
             cursor.execute(query, (schedule_id,))
             details = cursor.fetchone() # Fetch single row
             if details:
-                logging.info(f"Retrieved details for ScheduleID: {schedule_id}")
+                details = dict(details) # Callers format the fields in place
+                logging.info("Retrieved details for ScheduleID: %s", schedule_id)
+                if self.schedule_cache is not None:
+                    self.schedule_cache.put(schedule_id, dict(details))
             else:
-                logging.warning(f"No schedule details found for ScheduleID: {schedule_id}")
+                logging.warning("No schedule details found for ScheduleID: %s", schedule_id)
             return details
         except mysql.connector.Error as err:
-            logging.error(f"Error retrieving schedule details for ID {schedule_id}: {err}", exc_info=True)
+            logging.error("Error retrieving schedule details for ID %s: %s", schedule_id, err, exc_info=True)
             raise
         finally:
             if cursor:
@@ -0,0 +1,185 @@
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from logger import logging
+
+# Request priorities: bookings first, then ordinary reads, then polls and exports
+HIGH, NORMAL, LOW = 0, 1, 2
+
+
+class OverloadError(Exception):
+    """
+    Raised when a request could not be admitted before its queue deadline.
+    """
+    def __init__(self, group, waited):
+        super().__init__(f"No capacity for a '{group}' request after {waited:.3f}s.")
+        self.group = group
+        self.waited = waited
+
+
+class CircuitOpenError(ConnectionError):
+    """
+    Raised instead of trying the database while the circuit breaker is open.
+    Subclasses ConnectionError so the existing handlers in app.py treat it like any
+    other failure to reach the database.
+    """
+
+
+class AdmissionController:
+    def __init__(self, max_concurrent=64, shares=None, group_limits=None, queue_timeouts=None):
+        """
+        Bounds the requests a process works on at once, so a slow database makes requests
+        wait (briefly) at the door instead of piling up on the connection pool.
+
+        max_concurrent -- requests admitted at once, all groups together.
+        shares         -- {priority: fraction of max_concurrent it may fill}. Lower priorities
+                          get smaller shares, so when the process is busy they are shed first
+                          and the remaining slots stay free for bookings.
+        group_limits   -- {group: requests of that group admitted at once}, e.g. seat map polls.
+        queue_timeouts -- {priority: seconds a request may wait for a slot before it is shed}.
+        """
+        self.max_concurrent = max_concurrent
+        shares = {HIGH: 1.0, NORMAL: 0.8, LOW: 0.5, **(shares or {})}
+        self.capacity = {priority: max(1, int(max_concurrent * share)) for priority, share in shares.items()}
+        self.group_limits = dict(group_limits or {})
+        self.queue_timeouts = {HIGH: 5.0, NORMAL: 1.0, LOW: 0.25, **(queue_timeouts or {})}
+        self._in_flight = 0
+        self._group_in_flight = Counter()
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+        self.admitted = Counter()
+        self.shed = Counter()
+        self.waits = 0
+
+    def _can_admit(self, group, priority):
+        limit = self.group_limits.get(group)
+        if limit is not None and self._group_in_flight[group] >= limit:
+            return False
+        return self._in_flight < self.capacity[priority]
+
+    def acquire(self, group, priority=NORMAL):
+        """
+        Takes a slot for a request of `group`, waiting at most the priority's queue timeout.
+        Raises OverloadError when it runs out; otherwise release(group) must follow.
+        """
+        started = time.monotonic()
+        deadline = started + self.queue_timeouts[priority]
+        with self._lock:
+            waited = False
+            while not self._can_admit(group, priority):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.shed[group] += 1
+                    raise OverloadError(group, time.monotonic() - started)
+                if not waited:
+                    waited = True
+                    self.waits += 1
+                self._released.wait(remaining)
+            self._in_flight += 1
+            self._group_in_flight[group] += 1
+            self.admitted[group] += 1
+
+    def release(self, group):
+        with self._lock:
+            self._in_flight -= 1
+            self._group_in_flight[group] -= 1
+            self._released.notify_all()
+
+    @contextmanager
+    def slot(self, group, priority=NORMAL):
+        self.acquire(group, priority)
+        try:
+            yield
+        finally:
+            self.release(group)
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                "max_concurrent": self.max_concurrent,
+                "in_flight": self._in_flight,
+                "waits": self.waits,
+                "admitted": sum(self.admitted.values()),
+                "shed": sum(self.shed.values()),
+            }
+            for group in sorted(set(self.admitted) | set(self.shed)):
+                stats[f"{group}_in_flight"] = self._group_in_flight[group]
+                stats[f"{group}_shed"] = self.shed[group]
+            return stats
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=10.0, half_open_probes=1):
+        """
+        Circuit breaker for getting a database connection.
+
+        After failure_threshold consecutive failures (connect errors, pool timeouts) the
+        circuit opens: for reset_timeout seconds callers get CircuitOpenError at once instead
+        of each waiting out a connect or pool timeout. Then it is half-open: up to
+        half_open_probes callers are let through to try the database; one success closes the
+        circuit, a failure opens it for another reset_timeout.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.rejected = 0
+
+    def before_call(self):
+        """
+        Raises CircuitOpenError if the database should not be tried now.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    raise CircuitOpenError("Database unavailable (circuit open).")
+                self.state = self.HALF_OPEN
+                self._probes = 0
+                logging.info("Circuit breaker half-open: probing the database.")
+            if self._probes >= self.half_open_probes:
+                self.rejected += 1
+                raise CircuitOpenError("Database unavailable (circuit half-open, probe in progress).")
+            self._probes += 1
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            if self.state != self.CLOSED:
+                self.state = self.CLOSED
+                logging.info("Circuit breaker closed: the database is reachable again.")
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self._failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self.opened += 1
+                logging.error("Circuit breaker open after %s failures: failing fast for %ss.", self._failures, self.reset_timeout)
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return self.state != self.CLOSED
+
+    def stats(self):
+        with self._lock:
+            return {
+                "open": int(self.state == self.OPEN),
+                "half_open": int(self.state == self.HALF_OPEN),
+                "consecutive_failures": self._failures,
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
@@ -0,0 +1,230 @@
+import threading
+import time
+from collections import deque
+
+import mysql.connector
+from logger import logging
+
+
+class PoolTimeoutError(ConnectionError):
+    """
+    Raised when no connection could be borrowed from the pool within the wait timeout.
+    Subclasses ConnectionError so the existing handlers in app.py treat it like any
+    other failure to reach the database.
+    """
+
+
+class _PooledEntry:
+    """
+    Book-keeping for one physical connection owned by the pool.
+    """
+    __slots__ = ("connection", "created_at")
+
+    def __init__(self, connection, created_at):
+        self.connection = connection
+        self.created_at = created_at
+
+
+class ConnectionPool:
+    def __init__(self, creator, pool_size=5, max_overflow=10, timeout=30.0, recycle=3600, pre_ping=True):
+        """
+        Process-wide pool of database connections.
+
+        creator      -- zero-argument callable returning a new DB-API connection.
+        pool_size    -- number of connections kept open while idle.
+        max_overflow -- extra connections allowed under load; closed again when returned.
+        timeout      -- seconds a borrower waits for a free connection before giving up.
+        recycle      -- max lifetime in seconds of a physical connection (None to disable).
+        pre_ping     -- verify an idle connection is still alive before handing it out.
+        """
+        self._creator = creator
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+
+        self._idle = deque()
+        self._entries = {}  # id(connection) -> _PooledEntry, for every connection currently open
+        self._opening = 0   # connections being opened outside the lock
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+
+        # Metrics
+        self._in_use = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._recycled = 0
+        self._invalidated = 0
+        self._checkout_time_total = 0.0
+        self._checkout_time_max = 0.0
+
+    @classmethod
+    def for_mysql(cls, host='localhost', user='root', password='0000', database='bus_booking_system', port=3306, **pool_kwargs):
+        """
+        Convenience constructor for a pool of mysql.connector connections.
+        """
+        def creator():
+            return mysql.connector.connect(host=host, port=port, user=user, password=password, database=database)
+        return cls(creator, **pool_kwargs)
+
+    def _open(self):
+        # Called without the lock held: connecting can take a full network round trip.
+        try:
+            connection = self._creator()
+        except mysql.connector.Error as err:
+            logging.error("Pool - error opening a new database connection: %s", err, exc_info=True)
+            raise ConnectionError("Could not connect to the database.") from err
+        return _PooledEntry(connection, time.monotonic())
+
+    def _discard(self, entry):
+        self._entries.pop(id(entry.connection), None)
+        try:
+            entry.connection.close()
+        except Exception as e:
+            logging.warning("Pool - error closing discarded connection: %s", e)
+
+    def _is_usable(self, entry):
+        # Called without the lock held (the ping is a round trip); counters are still updated under it.
+        if self.recycle is not None and time.monotonic() - entry.created_at > self.recycle:
+            with self._lock:
+                self._recycled += 1
+            logging.info("Pool - recycling connection that exceeded its max lifetime.")
+            return False
+        if self.pre_ping:
+            try:
+                entry.connection.ping(reconnect=False)
+            except Exception:
+                with self._lock:
+                    self._invalidated += 1
+                logging.info("Pool - discarding connection that failed its health check.")
+                return False
+        return True
+
+    def _total(self):
+        return len(self._entries) + self._opening
+
+    def acquire(self):
+        """
+        Borrows a connection, waiting up to `timeout` seconds when the pool is exhausted.
+        """
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+        while True:
+            entry = None
+            with self._lock:
+                while not self._idle and self._total() >= self.pool_size + self.max_overflow:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        logging.error("Pool - timed out after %ss waiting for a connection.", self.timeout)
+                        raise PoolTimeoutError("Timed out waiting for a database connection.")
+                    if not waited:
+                        waited = True
+                        self._waits += 1
+                    self._available.wait(remaining)
+
+                if self._idle:
+                    entry = self._idle.pop()
+                else:
+                    # Reserve the slot now so concurrent borrowers cannot overshoot the limit.
+                    self._opening += 1
+
+            if entry is not None:
+                if self._is_usable(entry):
+                    break
+                with self._lock:
+                    self._discard(entry)
+                    self._available.notify()
+                continue
+
+            try:
+                entry = self._open()
+            finally:
+                with self._lock:
+                    self._opening -= 1
+                    if entry is not None:
+                        self._entries[id(entry.connection)] = entry
+                    else:
+                        self._available.notify()
+            break
+
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+            self._checkout_time_total += elapsed
+            self._checkout_time_max = max(self._checkout_time_max, elapsed)
+        return entry.connection
+
+    def release(self, connection):
+        """
+        Returns a borrowed connection. Any open transaction is rolled back so the next
+        borrower starts from a clean state; overflow connections are closed.
+        """
+        with self._lock:
+            entry = self._entries.get(id(connection))
+            if entry is None:
+                logging.warning("Pool - release() called with a connection the pool does not own.")
+                return
+            self._in_use -= 1
+
+        try:
+            connection.rollback()
+        except Exception:
+            with self._lock:
+                self._invalidated += 1
+                self._discard(entry)
+                self._available.notify()
+            return
+
+        with self._lock:
+            if len(self._idle) >= self.pool_size:
+                self._discard(entry)
+            else:
+                self._idle.append(entry)
+            self._available.notify()
+
+    def invalidate(self, connection):
+        """
+        Closes a borrowed connection that is known to be broken instead of returning it.
+        """
+        with self._lock:
+            entry = self._entries.get(id(connection))
+            if entry is None:
+                return
+            self._in_use -= 1
+            self._invalidated += 1
+            self._discard(entry)
+            self._available.notify()
+
+    def dispose(self):
+        """
+        Closes every idle connection. Borrowed connections are closed when released.
+        """
+        with self._lock:
+            while self._idle:
+                self._discard(self._idle.pop())
+
+    def stats(self):
+        """
+        Returns a snapshot of the pool metrics as a plain dictionary.
+        """
+        with self._lock:
+            checkouts = self._checkouts
+            return {
+                "pool_size": self.pool_size,
+                "max_overflow": self.max_overflow,
+                "open": self._total(),
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "checkouts": checkouts,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "recycled": self._recycled,
+                "invalidated": self._invalidated,
+                "checkout_latency_avg_ms": round(self._checkout_time_total / checkouts * 1000, 3) if checkouts else 0.0,
+                "checkout_latency_max_ms": round(self._checkout_time_max * 1000, 3),
+            }
@@ -0,0 +1,165 @@
+import asyncio
+import json
+import queue
+import threading
+
+from logger import logging
+
+
+class Subscription:
+    """
+    A thread-side subscriber: events are queued and read with get().
+    If the subscriber falls `max_pending` events behind, further events are dropped and
+    `overflowed` is set, telling the reader to re-fetch the full state instead.
+    """
+    def __init__(self, broker, schedule_id, max_pending=100):
+        self.broker = broker
+        self.schedule_id = schedule_id
+        self.overflowed = False
+        self._queue = queue.Queue(maxsize=max_pending)
+
+    def deliver(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout=None):
+        """
+        Returns the next event, or None if none arrives within `timeout` seconds.
+        """
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class AsyncSubscription(Subscription):
+    """
+    An event-loop subscriber: events are delivered on its loop and read with `await get()`.
+    """
+    def __init__(self, broker, schedule_id, loop, max_pending=100):
+        self.broker = broker
+        self.schedule_id = schedule_id
+        self.loop = loop
+        self.overflowed = False
+        self._queue = asyncio.Queue(maxsize=max_pending)
+
+    def deliver(self, event):
+        # Only called on self.loop (see SeatUpdateBroker.publish).
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout=None):
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+def sse_message(event_type, data):
+    """
+    Encodes one server-sent event.
+    """
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+
+SSE_KEEPALIVE = ": keep-alive\n\n"
+
+
+def _deliver_all(subscriptions, event):
+    for subscription in subscriptions:
+        subscription.deliver(event)
+
+
+class SeatUpdateBroker:
+    def __init__(self, max_pending=100):
+        """
+        In-process publish/subscribe hub for seat changes, keyed by ScheduleID.
+
+        ConnectDB publishes one event per committed booking; every viewer of that schedule
+        (a server-sent event stream) receives it from memory, so N viewers cost one
+        notification rather than N polling queries. Listeners added with add_listener()
+        receive every event, whatever the schedule.
+        """
+        self.max_pending = max_pending
+        self._threaded = {}  # schedule_id -> set of Subscription
+        self._async = {}     # schedule_id -> {loop: set of AsyncSubscription}
+        self._listeners = []
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def subscribe(self, schedule_id):
+        subscription = Subscription(self, schedule_id, self.max_pending)
+        with self._lock:
+            self._threaded.setdefault(schedule_id, set()).add(subscription)
+        return subscription
+
+    def subscribe_async(self, schedule_id, loop=None):
+        loop = loop or asyncio.get_running_loop()
+        subscription = AsyncSubscription(self, schedule_id, loop, self.max_pending)
+        with self._lock:
+            self._async.setdefault(schedule_id, {}).setdefault(loop, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            schedule_id = subscription.schedule_id
+            if isinstance(subscription, AsyncSubscription):
+                loops = self._async.get(schedule_id, {})
+                subscriptions = loops.get(subscription.loop)
+                if subscriptions is not None:
+                    subscriptions.discard(subscription)
+                    if not subscriptions:
+                        del loops[subscription.loop]
+                if not loops:
+                    self._async.pop(schedule_id, None)
+            else:
+                subscriptions = self._threaded.get(schedule_id)
+                if subscriptions is not None:
+                    subscriptions.discard(subscription)
+                    if not subscriptions:
+                        del self._threaded[schedule_id]
+
+    def add_listener(self, callback):
+        """
+        Registers callback(schedule_id, event), called synchronously on every publish.
+        """
+        with self._lock:
+            self._listeners.append(callback)
+
+    def publish(self, schedule_id, event):
+        with self._lock:
+            self.published += 1
+            threaded = list(self._threaded.get(schedule_id, ()))
+            by_loop = [(loop, list(subscriptions)) for loop, subscriptions in self._async.get(schedule_id, {}).items()]
+            listeners = list(self._listeners)
+
+        for subscription in threaded:
+            subscription.deliver(event)
+        for loop, subscriptions in by_loop:
+            # One hop onto each event loop, then fan out to all of its subscribers there
+            try:
+                loop.call_soon_threadsafe(_deliver_all, subscriptions, event)
+            except RuntimeError:
+                pass  # loop already closed; its subscriptions go away with it
+        for callback in listeners:
+            try:
+                callback(schedule_id, event)
+            except Exception as e:
+                logging.error("Seat update listener failed for ScheduleID %s: %s", schedule_id, e, exc_info=True)
+
+    def stats(self):
+        with self._lock:
+            threaded = sum(len(subscriptions) for subscriptions in self._threaded.values())
+            async_subscribers = sum(len(subscriptions) for loops in self._async.values() for subscriptions in loops.values())
+            return {
+                "subscribers": threaded + async_subscribers,
+                "schedules_watched": len(set(self._threaded) | set(self._async)),
+                "events_published": self.published,
+            }
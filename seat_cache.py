@@ -0,0 +1,95 @@
+import threading
+
+from cache import LRUCache
+
+
+class SeatMap:
+    """
+    Occupancy of one schedule stored as a bitmap: bit (n - 1) is set when seat n is taken.
+    A 50-seat bus fits in 7 bytes instead of a list of row dictionaries.
+    """
+    __slots__ = ("total_seats", "bits")
+
+    def __init__(self, total_seats, occupied_seats=()):
+        self.total_seats = total_seats
+        self.bits = bytearray((total_seats + 7) // 8)
+        for seat_number in occupied_seats:
+            self.mark_occupied(seat_number)
+
+    def mark_occupied(self, seat_number):
+        if 1 <= seat_number <= self.total_seats:
+            index = seat_number - 1
+            self.bits[index >> 3] |= 1 << (index & 7)
+
+    def is_occupied(self, seat_number):
+        if not 1 <= seat_number <= self.total_seats:
+            return False
+        index = seat_number - 1
+        return bool(self.bits[index >> 3] & (1 << (index & 7)))
+
+    def occupied_seats(self):
+        seats = []
+        for byte_index, byte in enumerate(self.bits):
+            while byte:
+                low_bit = byte & -byte
+                seats.append((byte_index << 3) + low_bit.bit_length())
+                byte ^= low_bit
+        return seats
+
+    def as_dict(self):
+        """
+        Same shape as ConnectDB.get_seat_availability() returns from the database.
+        """
+        return {"total_seats": self.total_seats, "occupied_seats": self.occupied_seats()}
+
+
+class SeatMapCache:
+    def __init__(self, max_entries=1024):
+        """
+        In-process cache of SeatMap bitmaps keyed by ScheduleID, with LRU eviction.
+
+        Bookings are written through with mark_booked(), so a cached map never lags behind
+        bookings made by this process. A load that raced with a booking is not cached (see
+        load_token()), so the next read goes back to the database instead of serving a stale map.
+        """
+        self._maps = LRUCache(max_entries)
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def get(self, schedule_id):
+        return self._maps.get(schedule_id)
+
+    def load_token(self):
+        """
+        Returns a token to take before reading a seat map from the database and to pass to put().
+        """
+        with self._lock:
+            return self._writes
+
+    def put(self, schedule_id, total_seats, occupied_seats, token=None):
+        seat_map = SeatMap(total_seats, occupied_seats)
+        with self._lock:
+            if token is not None and token != self._writes:
+                # A booking landed while the map was being read; it may be missing from it.
+                return seat_map
+            self._maps.put(schedule_id, seat_map)
+        return seat_map
+
+    def mark_booked(self, schedule_id, seat_numbers):
+        """
+        Write-through hook called after a booking commits.
+        """
+        with self._lock:
+            self._writes += 1
+            seat_map = self._maps.get(schedule_id)
+            if seat_map is not None:
+                for seat_number in seat_numbers:
+                    seat_map.mark_occupied(seat_number)
+
+    def invalidate(self, schedule_id):
+        with self._lock:
+            self._writes += 1
+            self._maps.pop(schedule_id)
+
+    def stats(self):
+        return self._maps.stats()
@@ -0,0 +1,343 @@
+import fcntl
+import os
+import struct
+import tempfile
+import threading
+from multiprocessing import resource_tracker, shared_memory
+
+from logger import logging
+from seat_cache import SeatMap
+
+MAGIC = b'SEATSHM1'
+
+# Header: magic, slots, max_seats, ring_size, writes (load token), ring_head
+_HEADER = struct.Struct('<8sIIIxxxxQQ')
+_WRITES_OFFSET = 24
+_RING_HEAD_OFFSET = 32
+# Slot: seq (seqlock, odd while being written), version, schedule_id (0 = empty), stamp, total_seats
+_SLOT = struct.Struct('<IIqQH')
+# Change ring entry: seq (index + 1, 0 while being written), schedule_id, pid, seat count, seats
+_RING_SEATS = 16
+_RING = struct.Struct(f'<QqIH{_RING_SEATS}H')
+_PROBES = 8
+_QWORD = struct.Struct('<Q')
+_DWORD = struct.Struct('<I')
+
+
+class SharedSeatMapCache:
+    def __init__(self, name, slots=4096, max_seats=128, ring_size=4096):
+        """
+        Seat map cache shared by every worker process on the host, with the interface of
+        seat_cache.SeatMapCache (get/load_token/put/mark_booked/invalidate/stats).
+
+        The maps live in one multiprocessing.shared_memory segment called `name`: a fixed table
+        of `slots` entries, each holding a ScheduleID, a version stamp and a bitmap of up to
+        `max_seats` seats. The first process to start creates the segment and the others attach
+        to it, so N workers keep one copy of the inventory, and a booking written through by
+        one worker is seen by the next read in every other worker.
+
+        Readers take no lock: each slot is a seqlock (its sequence number is odd while it is
+        being written, and a read is retried if the number changed under it). Writers from all
+        processes are serialized by flock() on a lock file next to the segment. A slot is found
+        by hashing the ScheduleID into a window of 8 slots; when the window is full, the slot
+        written longest ago is reused.
+
+        Every booking is also appended to a ring of changes in the segment. start_watcher()
+        polls it and replays the bookings made by other processes into a local callback (the
+        SeatUpdateBroker's publish), so their live seat streams, response cache versions and
+        journey planner see them too.
+
+        Schedules with more than max_seats seats are not cached. The segment outlives the
+        processes: after changing bookings outside the application, remove it (unlink()) or
+        start with a new name.
+        """
+        self.name = name
+        self.slot_size = (_SLOT.size + (max_seats + 7) // 8 + 7) // 8 * 8
+        self._slots_offset = _HEADER.size
+        size = self._slots_offset + slots * self.slot_size + ring_size * _RING.size
+        self._lock_path = os.path.join(tempfile.gettempdir(), f'{name.lstrip("/")}.lock')
+        # Creating the segment and writing its header happen under the writers' lock file, and
+        # attaching takes it too, so a worker starting alongside the creator never reads a
+        # segment whose header is not written yet
+        with open(self._lock_path, 'a+b') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+                _HEADER.pack_into(self._shm.buf, 0, MAGIC, slots, max_seats, ring_size, 0, 0)
+                logging.info("Shared seat map segment %s created (%s bytes).", name, size)
+            except FileExistsError:
+                self._shm = shared_memory.SharedMemory(name=name)
+                magic, slots, max_seats, ring_size, _, _ = _HEADER.unpack_from(self._shm.buf, 0)
+                if magic != MAGIC:
+                    raise ValueError(f"Shared memory segment {name} is not a seat map segment.")
+                self.slot_size = (_SLOT.size + (max_seats + 7) // 8 + 7) // 8 * 8
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        # The segment must outlive this process (other workers use it), so keep it away from
+        # the resource tracker, which would unlink it when the process exits.
+        resource_tracker.unregister(self._shm._name, 'shared_memory')
+        self.slots = slots
+        self.max_seats = max_seats
+        self.ring_size = ring_size
+        self._buf = self._shm.buf
+        self._ring_offset = self._slots_offset + slots * self.slot_size
+        self._lock_file = None
+        self._lock_pid = None
+        self._thread_lock = threading.Lock()
+        self._stats_lock = threading.Lock()  # hit/miss counters; readers never take the writers' lock
+        self._watcher = None
+        self._watch_stop = threading.Event()
+        self._publish = None
+        self._on_lost = None
+        self._poll_interval = 0.05
+        self._ring_position = self._read_qword(_RING_HEAD_OFFSET)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.replayed = 0
+        self.lost = 0
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _read_qword(self, offset):
+        return _QWORD.unpack_from(self._buf, offset)[0]
+
+    def _locked(self):
+        return _WriterLock(self)
+
+    def _slot_offsets(self, schedule_id):
+        start = (schedule_id * 2654435761) % self.slots
+        return [self._slots_offset + ((start + probe) % self.slots) * self.slot_size for probe in range(_PROBES)]
+
+    def _find(self, schedule_id):
+        # Lock-free lookup: returns (offset, total_seats, bits) read consistently, or None
+        bits_size = (self.max_seats + 7) // 8
+        for offset in self._slot_offsets(schedule_id):
+            for _ in range(100):
+                seq, _, slot_schedule, _, total_seats = _SLOT.unpack_from(self._buf, offset)
+                if seq & 1:
+                    continue  # being written
+                if slot_schedule != schedule_id:
+                    break
+                bits = bytes(self._buf[offset + _SLOT.size:offset + _SLOT.size + bits_size])
+                if _DWORD.unpack_from(self._buf, offset)[0] == seq:
+                    return offset, total_seats, bits
+            else:
+                return None  # a writer is stuck on this slot; read from the database
+        return None
+
+    def get(self, schedule_id):
+        found = self._find(schedule_id)
+        with self._stats_lock:
+            if found is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if found is None:
+            return None
+        _, total_seats, bits = found
+        seat_map = SeatMap(total_seats)
+        seat_map.bits[:] = bits[:len(seat_map.bits)]
+        return seat_map
+
+    def load_token(self):
+        """
+        Returns a token to take before reading a seat map from the database and to pass to put().
+        Bookings in any process change it.
+        """
+        return self._read_qword(_WRITES_OFFSET)
+
+    def put(self, schedule_id, total_seats, occupied_seats, token=None):
+        seat_map = SeatMap(total_seats, occupied_seats)
+        if total_seats > self.max_seats:
+            return seat_map
+        with self._locked():
+            writes = self._read_qword(_WRITES_OFFSET)
+            if token is not None and token != writes:
+                # A booking landed while the map was being read; it may be missing from it.
+                return seat_map
+            offsets = self._slot_offsets(schedule_id)
+            target = None
+            for offset in offsets:
+                _, _, slot_schedule, _, _ = _SLOT.unpack_from(self._buf, offset)
+                if slot_schedule == schedule_id:
+                    target = offset
+                    break
+                if slot_schedule == 0 and target is None:
+                    target = offset
+            if target is None:
+                target = min(offsets, key=lambda offset: _SLOT.unpack_from(self._buf, offset)[3])
+                self.evictions += 1
+            self._write_slot(target, schedule_id, total_seats, seat_map.bits, writes)
+        return seat_map
+
+    def _write_slot(self, offset, schedule_id, total_seats, bits, stamp):
+        seq, version, _, _, _ = _SLOT.unpack_from(self._buf, offset)
+        # A process that died mid-write leaves the sequence odd: round it up to even first,
+        # or the slot would stay odd (and skipped by readers) for good
+        seq = (seq + (seq & 1)) & 0xFFFFFFFF
+        _DWORD.pack_into(self._buf, offset, (seq + 1) & 0xFFFFFFFF)  # odd: readers retry
+        bits_size = (self.max_seats + 7) // 8
+        padded = bytes(bits) + bytes(bits_size - len(bits))
+        self._buf[offset + _SLOT.size:offset + _SLOT.size + bits_size] = padded
+        _SLOT.pack_into(self._buf, offset, (seq + 1) & 0xFFFFFFFF, (version + 1) & 0xFFFFFFFF, schedule_id, stamp, total_seats)
+        _DWORD.pack_into(self._buf, offset, (seq + 2) & 0xFFFFFFFF)
+
+    def mark_booked(self, schedule_id, seat_numbers):
+        """
+        Write-through hook called after a booking commits; also records the change in the ring.
+        """
+        with self._locked():
+            writes = self._read_qword(_WRITES_OFFSET) + 1
+            _QWORD.pack_into(self._buf, _WRITES_OFFSET, writes)
+            found = self._find(schedule_id)
+            if found is not None:
+                offset, total_seats, bits = found
+                seat_map = SeatMap(total_seats)
+                seat_map.bits[:] = bits[:len(seat_map.bits)]
+                for seat_number in seat_numbers:
+                    seat_map.mark_occupied(seat_number)
+                self._write_slot(offset, schedule_id, total_seats, seat_map.bits, writes)
+            for first in range(0, len(seat_numbers), _RING_SEATS):
+                self._append_change(schedule_id, seat_numbers[first:first + _RING_SEATS])
+
+    def _append_change(self, schedule_id, seat_numbers):
+        head = self._read_qword(_RING_HEAD_OFFSET)
+        offset = self._ring_offset + (head % self.ring_size) * _RING.size
+        _QWORD.pack_into(self._buf, offset, 0)  # being written
+        seats = list(seat_numbers) + [0] * (_RING_SEATS - len(seat_numbers))
+        _RING.pack_into(self._buf, offset, 0, schedule_id, os.getpid(), len(seat_numbers), *seats)
+        _QWORD.pack_into(self._buf, offset, head + 1)
+        _QWORD.pack_into(self._buf, _RING_HEAD_OFFSET, head + 1)
+
+    def invalidate(self, schedule_id):
+        with self._locked():
+            writes = self._read_qword(_WRITES_OFFSET) + 1
+            _QWORD.pack_into(self._buf, _WRITES_OFFSET, writes)
+            found = self._find(schedule_id)
+            if found is not None:
+                self._write_slot(found[0], 0, 0, b'', writes)
+
+    def start_watcher(self, publish, interval=0.05, on_lost=None):
+        """
+        Starts a daemon thread replaying other processes' bookings from the change ring as
+        publish(schedule_id, {"type": "booked", ...}) events. If this process falls more than
+        ring_size changes behind, the missed ones are counted and on_lost() is called.
+        Restarted automatically in a forked child.
+        """
+        self._publish = publish
+        self._poll_interval = interval
+        self._on_lost = on_lost
+        self._watch_stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name='seat-shm-watch', daemon=True)
+        self._watcher.start()
+
+    def _after_fork(self):
+        # Threads do not survive fork(): a lock held by one of them would never be released
+        self._thread_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        if self._watcher is not None:
+            self.start_watcher(self._publish, self._poll_interval, self._on_lost)
+
+    def stop_watcher(self):
+        self._watch_stop.set()
+
+    def _watch(self):
+        while not self._watch_stop.wait(self._poll_interval):
+            try:
+                self.poll_changes()
+            except Exception as e:
+                logging.error("Shared seat map watcher failed: %s", e, exc_info=True)
+
+    def poll_changes(self):
+        """
+        Replays the changes appended since the last poll; returns how many were replayed.
+        """
+        head = self._read_qword(_RING_HEAD_OFFSET)
+        position = self._ring_position
+        lost = 0
+        if head - position > self.ring_size:
+            lost = head - position - self.ring_size
+            position = head - self.ring_size
+        pid = os.getpid()
+        replayed = 0
+        while position < head:
+            offset = self._ring_offset + (position % self.ring_size) * _RING.size
+            entry = _RING.unpack_from(self._buf, offset)
+            if entry[0] != position + 1 or _QWORD.unpack_from(self._buf, offset)[0] != position + 1:
+                lost += 1  # overwritten while we read it
+            elif entry[2] != pid:
+                schedule_id, count = entry[1], entry[3]
+                self._publish(schedule_id, {"type": "booked", "schedule_id": schedule_id, "seats": list(entry[4:4 + count])})
+                replayed += 1
+            position += 1
+        self._ring_position = position
+        self.replayed += replayed
+        if lost:
+            self.lost += lost
+            logging.warning("Shared seat map watcher missed %s changes.", lost)
+            if self._on_lost is not None:
+                self._on_lost()
+        return replayed
+
+    def stats(self):
+        entries = 0
+        for index in range(self.slots):
+            if _SLOT.unpack_from(self._buf, self._slots_offset + index * self.slot_size)[2]:
+                entries += 1
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        return {
+            "entries": entries,
+            "max_entries": self.slots,
+            "hits": hits,
+            "misses": misses,
+            "evictions": self.evictions,
+            "changes_replayed": self.replayed,
+            "changes_lost": self.lost,
+        }
+
+    def close(self):
+        self.stop_watcher()
+        self._buf = None
+        self._shm.close()
+
+    def unlink(self):
+        """
+        Removes the segment (and its lock file) from the system; attached processes keep their mapping.
+        """
+        shared_memory.SharedMemory(name=self.name).unlink()
+        try:
+            os.unlink(self._lock_path)
+        except FileNotFoundError:
+            pass
+
+
+class _WriterLock:
+    """
+    Serializes writers: a thread lock within the process, flock() across processes. The lock
+    file is reopened after a fork, since flock() locks belong to the open file and a file
+    inherited from the parent would be shared with it.
+    """
+    __slots__ = ("cache",)
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def __enter__(self):
+        cache = self.cache
+        cache._thread_lock.acquire()
+        try:
+            if cache._lock_pid != os.getpid():
+                cache._lock_file = open(cache._lock_path, 'a+b')
+                cache._lock_pid = os.getpid()
+            fcntl.flock(cache._lock_file.fileno(), fcntl.LOCK_EX)
+        except BaseException:
+            cache._thread_lock.release()
+            raise
+
+    def __exit__(self, *exc_info):
+        cache = self.cache
+        try:
+            fcntl.flock(cache._lock_file.fileno(), fcntl.LOCK_UN)
+        finally:
+            cache._thread_lock.release()
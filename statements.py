@@ -0,0 +1,185 @@
+import threading
+import weakref
+from collections import OrderedDict, namedtuple
+
+import mysql.connector
+from instrumentation import InstrumentedCursor
+from logger import logging
+
+# MySQL error 1243: unknown prepared statement handler (the server dropped it, e.g. after a reconnect)
+UNKNOWN_STATEMENT_ERRNO = 1243
+
+_row_types = {}
+_row_types_lock = threading.Lock()
+
+
+def row_type(columns):
+    """
+    Returns the Row class for a result with these column names (one class per distinct column list).
+
+    Rows are namedtuples: no per-row dict, attribute access by column name, and like the
+    dictionary cursor rows they replace, row['Column'] and dict(row) also work.
+    """
+    columns = tuple(columns)
+    cls = _row_types.get(columns)
+    if cls is not None:
+        return cls
+    index = {name: position for position, name in enumerate(columns)}
+
+    class Row(namedtuple('Row', columns, rename=True)):
+        __slots__ = ()
+
+        def __getitem__(self, key):
+            if isinstance(key, str):
+                return tuple.__getitem__(self, index[key])
+            return tuple.__getitem__(self, key)
+
+        def get(self, key, default=None):
+            position = index.get(key)
+            return default if position is None else tuple.__getitem__(self, position)
+
+        def keys(self):
+            return columns
+
+    with _row_types_lock:
+        return _row_types.setdefault(columns, Row)
+
+
+class _Statement:
+    """
+    A query prepared on one connection: its (reused) prepared cursor and its Row class.
+    """
+    __slots__ = ("cursor", "row_type")
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.row_type = None
+
+
+class StatementRegistry:
+    def __init__(self, max_statements=64):
+        """
+        Server-side prepared statements for ConnectDB's read queries.
+
+        The first time a connection runs a query, it is prepared on that connection with a
+        prepared=True cursor (COM_STMT_PREPARE); later calls on the same connection re-execute
+        the statement handle with only the parameters (COM_STMT_EXECUTE), so MySQL does not
+        parse and plan the SQL text again. Rows come back as Row namedtuples instead of dicts.
+
+        Statements are kept per connection (pooled connections live long, so the handles are
+        reused across requests), at most max_statements per connection in LRU order; an evicted
+        cursor is closed, which deallocates the server-side statement. Entries disappear with
+        their connection.
+        """
+        self.max_statements = max_statements
+        self._connections = weakref.WeakKeyDictionary()  # connection -> OrderedDict(sql -> _Statement)
+        self._lock = threading.Lock()
+        self.prepares = 0
+        self.executions = 0
+        self.evictions = 0
+
+    def cursor(self, connection):
+        """
+        A cursor-like object running queries as prepared statements on `connection`.
+        """
+        return StatementCursor(self, connection)
+
+    def _statement(self, connection, operation):
+        with self._lock:
+            statements = self._connections.get(connection)
+            if statements is None:
+                statements = self._connections[connection] = OrderedDict()
+            statement = statements.get(operation)
+            if statement is not None:
+                statements.move_to_end(operation)
+                self.executions += 1
+                return statement
+            statement = statements[operation] = _Statement(InstrumentedCursor(connection.cursor(prepared=True)))
+            self.prepares += 1
+            self.executions += 1
+            evicted = statements.popitem(last=False)[1] if len(statements) > self.max_statements else None
+            if evicted is not None:
+                self.evictions += 1
+        if evicted is not None:
+            self._close(evicted)
+        return statement
+
+    def _discard(self, connection, operation):
+        with self._lock:
+            statements = self._connections.get(connection)
+            statement = statements.pop(operation, None) if statements is not None else None
+        if statement is not None:
+            self._close(statement)
+
+    @staticmethod
+    def _close(statement):
+        try:
+            statement.cursor.close()
+        except Exception as e:  # the connection may already be gone
+            logging.debug("Could not close prepared statement: %s", e)
+
+    def fetchall(self, connection, operation, params=()):
+        """
+        Executes `operation` as a prepared statement and returns all rows as Rows.
+        A statement the server no longer knows is prepared again once.
+        """
+        for attempt in (1, 2):
+            statement = self._statement(connection, operation)
+            try:
+                statement.cursor.execute(operation, params)
+                # Prepared cursors are unbuffered: read everything so the connection is free again
+                rows = statement.cursor.fetchall()
+                break
+            except mysql.connector.Error as err:
+                self._discard(connection, operation)
+                if err.errno != UNKNOWN_STATEMENT_ERRNO or attempt == 2:
+                    raise
+        if not rows:
+            return []
+        if statement.row_type is None:
+            statement.row_type = row_type(column[0] for column in statement.cursor.description)
+        make = statement.row_type._make
+        return [make(row) for row in rows]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "connections": len(self._connections),
+                "statements": sum(len(statements) for statements in self._connections.values()),
+                "prepares": self.prepares,
+                "executions": self.executions,
+                "evictions": self.evictions,
+            }
+
+
+class StatementCursor:
+    """
+    Read-only cursor facade over the StatementRegistry with the execute/fetch calls ConnectDB
+    uses. close() leaves the prepared statement cached.
+    """
+    __slots__ = ("_registry", "_connection", "_rows", "_position")
+
+    def __init__(self, registry, connection):
+        self._registry = registry
+        self._connection = connection
+        self._rows = []
+        self._position = 0
+
+    def execute(self, operation, params=()):
+        self._rows = self._registry.fetchall(self._connection, operation, params)
+        self._position = 0
+
+    def fetchone(self):
+        if self._position >= len(self._rows):
+            return None
+        row = self._rows[self._position]
+        self._position += 1
+        return row
+
+    def fetchall(self):
+        rows = self._rows[self._position:] if self._position else self._rows
+        self._position = len(self._rows)
+        return rows
+
+    def close(self):
+        self._rows = []
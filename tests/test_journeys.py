@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta, date
+from decimal import Decimal
+
+from journeys import JourneyPlanner
+
+DAY = date.today() + timedelta(days=1)
+
+
+def _row(schedule_id, source, destination, departure, arrival, price, free_seats=40):
+    return {
+        "ScheduleID": schedule_id, "Source": source, "Destination": destination, "DepartureDate": DAY,
+        "DepartureTime": timedelta(hours=int(departure[:2]), minutes=int(departure[3:])),
+        "ArrivalTime": timedelta(hours=int(arrival[:2]), minutes=int(arrival[3:])),
+        "Price": Decimal(price), "FreeSeats": free_seats,
+    }
+
+
+class FakeConnection:
+    """
+    Stands in for ConnectDB: serves get_connections_since() from a list of rows.
+    """
+    def __init__(self, rows):
+        self.rows = rows
+
+    def get_connections_since(self, last_schedule_id, today):
+        return [row for row in self.rows if row["ScheduleID"] > last_schedule_id]
+
+
+# A -> B -> C with two onward buses from B (one leaving 10 minutes after the first leg arrives,
+# one 20 minutes after) and a slower, dearer direct bus A -> C.
+NETWORK = [
+    _row(1, "A", "B", "08:00", "09:00", "10.00"),
+    _row(2, "B", "C", "09:10", "10:00", "5.00"),
+    _row(3, "B", "C", "09:20", "10:10", "5.00", free_seats=1),
+    _row(4, "A", "C", "08:30", "11:00", "30.00"),
+]
+
+
+def _planner(rows=NETWORK, **kwargs):
+    planner = JourneyPlanner(**kwargs)
+    planner.refresh(FakeConnection(list(rows)))
+    return planner
+
+
+def _schedules(journeys):
+    return [[leg["ScheduleID"] for leg in journey["Legs"]] for journey in journeys]
+
+
+def _at(clock):
+    return datetime.combine(DAY, datetime.strptime(clock, "%H:%M").time())
+
+
+def test_earliest_lists_direct_bus_then_faster_connection():
+    journeys = _planner().plan("A", "C", _at("07:00"))
+    assert _schedules(journeys) == [[4], [1, 3]]
+    assert journeys[1]["Arrival"] == f"{DAY.isoformat()}T10:10"
+    assert journeys[1]["Transfers"] == 1
+    assert journeys[1]["TotalPrice"] == "15.00"
+
+
+def test_earliest_respects_min_transfer():
+    # Bus 2 leaves B 10 minutes after bus 1 arrives: too tight for the default 15, fine for 5
+    assert _schedules(_planner().plan("A", "C", _at("07:00"), min_transfer_minutes=5)) == [[4], [1, 2]]
+    assert _schedules(_planner(min_transfer_minutes=30).plan("A", "C", _at("07:00"))) == [[4]]
+
+
+def test_earliest_ignores_buses_before_the_requested_time():
+    assert _schedules(_planner().plan("A", "C", _at("08:15"))) == [[4]]
+    assert _planner().plan("A", "C", _at("08:45")) == []
+
+
+def test_max_legs_limits_changes():
+    assert _schedules(_planner().plan("A", "C", _at("07:00"), max_legs=1)) == [[4]]
+
+
+def test_cheapest_prefers_the_connection():
+    journeys = _planner().plan("A", "C", _at("07:00"), optimize="cheapest")
+    assert _schedules(journeys) == [[4], [1, 3]]
+    assert [journey["TotalPrice"] for journey in journeys] == ["30.00", "15.00"]
+
+
+def test_cheapest_respects_min_transfer():
+    rows = NETWORK[:2] + [_row(3, "B", "C", "09:20", "10:10", "8.00"), NETWORK[3]]
+    assert _schedules(_planner(rows).plan("A", "C", _at("07:00"), optimize="cheapest")) == [[4], [1, 3]]
+    assert _schedules(_planner(rows).plan("A", "C", _at("07:00"), optimize="cheapest", min_transfer_minutes=5)) == [[4], [1, 2]]
+
+
+def test_sold_out_buses_are_skipped():
+    planner = _planner()
+    planner.on_seat_event(3, {"type": "booked", "seats": [7]})
+    assert _schedules(planner.plan("A", "C", _at("07:00"))) == [[4]]
+    assert _schedules(planner.plan("A", "C", _at("07:00"), min_transfer_minutes=5)) == [[4], [1, 2]]
+
+
+def test_seats_requested_must_all_be_free():
+    assert _schedules(_planner().plan("A", "C", _at("07:00"), seats=2)) == [[4]]
+
+
+def test_unknown_or_identical_stops_have_no_journeys():
+    planner = _planner()
+    assert planner.plan("A", "Z", _at("07:00")) == []
+    assert planner.plan("A", "A", _at("07:00")) == []
+
+
+def test_refresh_adds_only_new_schedules():
+    rows = list(NETWORK)
+    connection = FakeConnection(rows)
+    planner = JourneyPlanner()
+    planner.refresh(connection)
+    rows.append(_row(5, "A", "C", "07:30", "09:30", "40.00"))
+    planner.refresh(connection)
+    assert planner.stats() == {"connections": 5, "stops": 3, "last_schedule_id": 5}
+    assert _schedules(planner.plan("A", "C", _at("07:00"))) == [[5]]
+
+
+def test_overnight_arrival_is_the_next_day():
+    journeys = _planner([_row(1, "A", "B", "23:00", "01:30", "10.00")]).plan("A", "B", _at("22:00"))
+    assert journeys[0]["Arrival"] == f"{(DAY + timedelta(days=1)).isoformat()}T01:30"
+    assert journeys[0]["DurationMinutes"] == 150
@@ -0,0 +1,148 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import overload
+from overload import HIGH, LOW, NORMAL, AdmissionController, CircuitBreaker, CircuitOpenError, OverloadError
+
+NO_WAIT = {HIGH: 0, NORMAL: 0, LOW: 0}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(overload, "time", SimpleNamespace(monotonic=clock))
+    return clock
+
+
+def _fill(admission, group, priority):
+    admitted = 0
+    while True:
+        try:
+            admission.acquire(group, priority)
+        except OverloadError:
+            return admitted
+        admitted += 1
+
+
+def test_priorities_get_their_share_of_the_slots():
+    admission = AdmissionController(max_concurrent=10, queue_timeouts=NO_WAIT)
+    assert admission.capacity == {HIGH: 10, NORMAL: 8, LOW: 5}
+    assert _fill(admission, "seat_map", LOW) == 5
+    assert _fill(admission, "read", NORMAL) == 3
+    assert _fill(admission, "booking", HIGH) == 2
+    stats = admission.stats()
+    assert stats["in_flight"] == 10
+    assert stats["seat_map_shed"] == stats["read_shed"] == stats["booking_shed"] == 1
+
+
+def test_low_priority_is_shed_first_when_busy():
+    admission = AdmissionController(max_concurrent=10, queue_timeouts=NO_WAIT)
+    for _ in range(6):
+        admission.acquire("read", NORMAL)
+    with pytest.raises(OverloadError) as error:
+        admission.acquire("seat_map", LOW)
+    assert error.value.group == "seat_map"
+    admission.acquire("booking", HIGH)  # bookings still get in
+
+
+def test_release_frees_the_slot():
+    admission = AdmissionController(max_concurrent=2, queue_timeouts=NO_WAIT)
+    with admission.slot("booking", HIGH):
+        with admission.slot("booking", HIGH):
+            with pytest.raises(OverloadError):
+                admission.acquire("booking", HIGH)
+        admission.acquire("booking", HIGH)
+    assert admission.stats()["in_flight"] == 1
+
+
+def test_group_limit_applies_on_its_own():
+    admission = AdmissionController(max_concurrent=10, group_limits={"seat_map": 2}, queue_timeouts=NO_WAIT)
+    assert _fill(admission, "seat_map", LOW) == 2
+    admission.acquire("read", LOW)
+
+
+def test_waiting_request_is_admitted_on_release():
+    admission = AdmissionController(max_concurrent=1, queue_timeouts={NORMAL: 5.0})
+    admission.acquire("read")
+    admitted = threading.Event()
+
+    def wait_for_slot():
+        admission.acquire("read")
+        admitted.set()
+
+    waiter = threading.Thread(target=wait_for_slot)
+    waiter.start()
+    assert not admitted.wait(0.05)
+    admission.release("read")
+    assert admitted.wait(5)
+    waiter.join()
+    assert admission.stats()["waits"] == 1
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    breaker.before_call()
+    breaker.record_success()  # a success resets the count
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    assert not breaker.is_open
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.is_open
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.stats() == {"open": 1, "half_open": 0, "consecutive_failures": 3, "opened": 1, "rejected": 1}
+
+
+def test_breaker_half_open_probe_success_closes(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, half_open_probes=1)
+    breaker.before_call()
+    breaker.record_failure()
+    clock.now += 9.9
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    clock.now += 0.1
+    breaker.before_call()  # the probe
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # only one probe at a time
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+    assert breaker.stats()["consecutive_failures"] == 0
+
+
+def test_breaker_half_open_probe_failure_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    clock.now += 10
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.opened == 2
+    clock.now += 5
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # open for a full reset_timeout again
+    clock.now += 5
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_circuit_open_error_is_a_connection_error():
+    assert issubclass(CircuitOpenError, ConnectionError)
@@ -0,0 +1,142 @@
+import sys
+import threading
+import uuid
+
+import pytest
+
+import shared_seats
+from shared_seats import SharedSeatMapCache
+
+
+@pytest.fixture
+def cache():
+    cache = SharedSeatMapCache(f"test_seats_{uuid.uuid4().hex[:12]}", slots=64, max_seats=64, ring_size=16)
+    yield cache
+    cache.unlink()
+    cache.close()
+
+
+def _slot_offset(cache, schedule_id):
+    for offset in cache._slot_offsets(schedule_id):
+        if shared_seats._SLOT.unpack_from(cache._buf, offset)[2] == schedule_id:
+            return offset
+    raise AssertionError(f"schedule {schedule_id} is not cached")
+
+
+def _seq(cache, offset):
+    return shared_seats._DWORD.unpack_from(cache._buf, offset)[0]
+
+
+def test_put_get_round_trip(cache):
+    assert cache.get(7) is None
+    cache.put(7, 40, [1, 9, 40])
+    assert cache.get(7).as_dict() == {"total_seats": 40, "occupied_seats": [1, 9, 40]}
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_writes_leave_the_sequence_even(cache):
+    cache.put(7, 40, [1])
+    offset = _slot_offset(cache, 7)
+    before = _seq(cache, offset)
+    cache.mark_booked(7, [2, 3])
+    assert _seq(cache, offset) == before + 2
+    assert cache.get(7).occupied_seats() == [1, 2, 3]
+
+
+def test_stale_token_does_not_overwrite_a_newer_map(cache):
+    token = cache.load_token()
+    cache.mark_booked(7, [5])  # a booking lands while the map is read from the database
+    cache.put(7, 40, [1], token=token)
+    assert cache.get(7) is None
+
+
+def test_odd_sequence_is_skipped_then_recovered(cache):
+    cache.put(7, 40, [1])
+    offset = _slot_offset(cache, 7)
+    # A writer that died mid-write leaves the sequence odd: readers give up on the slot...
+    shared_seats._DWORD.pack_into(cache._buf, offset, _seq(cache, offset) + 1)
+    assert cache.get(7) is None
+    # ...and the next write makes it even again
+    cache.put(7, 40, [2])
+    assert _seq(cache, offset) % 2 == 0
+    assert cache.get(7).occupied_seats() == [2]
+
+
+def test_invalidate_empties_the_slot(cache):
+    cache.put(7, 40, [1])
+    cache.invalidate(7)
+    assert cache.get(7) is None
+    assert cache.stats()["entries"] == 0
+
+
+# Two maps of one schedule that a torn read (header of one, bitmap of the other) cannot pass for
+TORN_MAPS = ((40, [seat for seat in range(1, 41) if seat % 2]), (64, [seat for seat in range(1, 65) if not seat % 2]))
+
+
+def _assert_whole(seat_map):
+    assert (seat_map.total_seats, seat_map.occupied_seats()) in TORN_MAPS
+
+
+def test_read_retries_when_a_write_lands_mid_read(cache, monkeypatch):
+    cache.put(7, *TORN_MAPS[0])
+    real_slot = shared_seats._SLOT
+    armed = [True]
+
+    class RacingSlot:
+        # Runs a complete write right after the reader has taken the slot header
+        size = real_slot.size
+        pack_into = staticmethod(real_slot.pack_into)
+
+        @staticmethod
+        def unpack_from(buffer, offset):
+            header = real_slot.unpack_from(buffer, offset)
+            if armed[0] and header[2] == 7:
+                armed[0] = False
+                cache.put(7, *TORN_MAPS[1])
+            return header
+
+    monkeypatch.setattr(shared_seats, "_SLOT", RacingSlot)
+    seat_map = cache.get(7)
+    assert not armed[0]
+    assert (seat_map.total_seats, seat_map.occupied_seats()) == TORN_MAPS[1]
+
+
+def test_concurrent_reader_never_sees_a_torn_map(cache):
+    previous = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # switch threads as often as possible, mid-read and mid-write
+    cache.put(7, *TORN_MAPS[0])
+    stop = threading.Event()
+
+    def write():
+        flip = 0
+        while not stop.is_set():
+            flip ^= 1
+            cache.put(7, *TORN_MAPS[flip])
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    reads = 0
+    try:
+        for _ in range(20000):
+            seat_map = cache.get(7)
+            if seat_map is not None:
+                _assert_whole(seat_map)
+                reads += 1
+    finally:
+        stop.set()
+        writer.join()
+        sys.setswitchinterval(previous)
+    assert reads
+
+
+def test_changes_from_other_processes_are_replayed(cache, monkeypatch):
+    events = []
+    cache._publish = lambda schedule_id, event: events.append((schedule_id, event["seats"]))
+    cache.mark_booked(7, [3])
+    assert cache.poll_changes() == 0  # this process's own bookings are not replayed
+    cache.mark_booked(7, [4, 5])
+    pid = shared_seats.os.getpid()
+    monkeypatch.setattr(shared_seats.os, "getpid", lambda: pid + 1)  # as seen from another worker
+    assert cache.poll_changes() == 1
+    assert events == [(7, [4, 5])]
@@ -0,0 +1,174 @@
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from datetime import date
+
+from logger import logging
+
+
+def _date_key(value):
+    # ISO 'YYYY-MM-DD' strings sort in date order, so they double as bisect keys and response values.
+    if isinstance(value, date):
+        return value.strftime('%Y-%m-%d')
+    return str(value)
+
+
+class TimetableIndex:
+    def __init__(self, refresh_interval=60, on_change=None):
+        """
+        In-memory index of departures keyed by (Source, Destination).
+
+        Each route maps to a list of (DepartureDate, ScheduleID) pairs sorted by date, so the
+        dates for a route (or a date range of it) are found with a bisect instead of a join scan.
+        The index is loaded from the database on first use and then topped up every
+        `refresh_interval` seconds with schedules added since the last load.
+        on_change(source, destination), if given, is called after a route's dates change,
+        and with (None, None) after a rebuild.
+        """
+        self.refresh_interval = refresh_interval
+        self.on_change = on_change
+        self._routes = {}     # (source, destination) -> sorted list of (date_key, schedule_id)
+        self._schedules = {}  # schedule_id -> (source, destination, date_key)
+        self._last_schedule_id = 0
+        self._last_refresh = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    @property
+    def is_loaded(self):
+        return self._last_refresh is not None
+
+    def add_schedule(self, schedule_id, source, destination, departure_date):
+        """
+        Adds (or moves) a single schedule. Safe to call from code that creates or edits schedules.
+        """
+        key = _date_key(departure_date)
+        with self._lock:
+            moved_from = self._remove_locked(schedule_id)
+            insort(self._routes.setdefault((source, destination), []), (key, schedule_id))
+            self._schedules[schedule_id] = (source, destination, key)
+            if schedule_id > self._last_schedule_id:
+                self._last_schedule_id = schedule_id
+        if self.on_change is not None:
+            if moved_from is not None and moved_from != (source, destination):
+                self.on_change(*moved_from)
+            self.on_change(source, destination)
+
+    def remove_schedule(self, schedule_id):
+        with self._lock:
+            removed_from = self._remove_locked(schedule_id)
+        if self.on_change is not None and removed_from is not None:
+            self.on_change(*removed_from)
+
+    def _remove_locked(self, schedule_id):
+        # Returns the (source, destination) the schedule was removed from, if it was indexed
+        existing = self._schedules.pop(schedule_id, None)
+        if existing is None:
+            return None
+        source, destination, key = existing
+        entries = self._routes.get((source, destination))
+        if entries:
+            index = bisect_left(entries, (key, schedule_id))
+            if index < len(entries) and entries[index] == (key, schedule_id):
+                del entries[index]
+            if not entries:
+                del self._routes[(source, destination)]
+        return source, destination
+
+    def refresh(self, conn):
+        """
+        Loads every schedule with an ID above the last one seen. The first call loads them all.
+        """
+        with self._refresh_lock:
+            self._refresh_locked(conn)
+
+    def _refresh_locked(self, conn):
+        rows = conn.get_schedules_since(self._last_schedule_id)
+        for row in rows:
+            self.add_schedule(row['ScheduleID'], row['Source'], row['Destination'], row['DepartureDate'])
+        self.prune_departed(date.today())
+        self._last_refresh = time.monotonic()
+        logging.info("Timetable index refreshed with %s new schedules (%s total).", len(rows), len(self._schedules))
+
+    def prune_departed(self, today):
+        """
+        Drops departures before `today`. The database only returns current departures, and
+        archive.py moves departed ones out of the live tables, so without this the index would
+        keep serving yesterday's dates until the next rebuild.
+        """
+        cutoff = (_date_key(today),)
+        changed = []
+        with self._lock:
+            for route, entries in list(self._routes.items()):
+                if entries[0] >= cutoff:
+                    continue
+                index = bisect_left(entries, cutoff)
+                for _, schedule_id in entries[:index]:
+                    self._schedules.pop(schedule_id, None)
+                if index == len(entries):
+                    del self._routes[route]
+                else:
+                    del entries[:index]
+                changed.append(route)
+        if self.on_change is not None:
+            for source, destination in changed:
+                self.on_change(source, destination)
+        if changed:
+            logging.info("Timetable index dropped departed schedules on %s routes.", len(changed))
+
+    def rebuild(self, conn):
+        """
+        Drops the index and reloads it, picking up edited or deleted schedules.
+        """
+        with self._refresh_lock:
+            rows = conn.get_schedules_since(0)
+            routes = {}
+            schedules = {}
+            for row in rows:
+                key = _date_key(row['DepartureDate'])
+                routes.setdefault((row['Source'], row['Destination']), []).append((key, row['ScheduleID']))
+                schedules[row['ScheduleID']] = (row['Source'], row['Destination'], key)
+            for entries in routes.values():
+                entries.sort()
+            with self._lock:
+                self._routes = routes
+                self._schedules = schedules
+                self._last_schedule_id = max(schedules) if schedules else 0
+            self._last_refresh = time.monotonic()
+            if self.on_change is not None:
+                self.on_change(None, None)
+            logging.info("Timetable index rebuilt with %s schedules.", len(schedules))
+
+    def ensure_fresh(self, conn):
+        """
+        Refreshes the index if it has never been loaded or is older than refresh_interval.
+        While one request refreshes, concurrent requests keep reading the current index,
+        and a failed top-up leaves the already loaded index in service.
+        """
+        if not self.is_loaded:
+            self.refresh(conn)
+            return
+        if time.monotonic() - self._last_refresh < self.refresh_interval:
+            return
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            self._refresh_locked(conn)
+        except Exception as e:
+            logging.warning("Timetable index refresh failed, serving the existing index: %s", e)
+        finally:
+            self._refresh_lock.release()
+
+    def lookup(self, source, destination, start_date=None, end_date=None):
+        """
+        Returns [{'TravelDate': 'YYYY-MM-DD', 'ScheduleID': int}, ...] sorted by date,
+        optionally limited to start_date <= TravelDate <= end_date.
+        """
+        with self._lock:
+            entries = self._routes.get((source, destination))
+            if not entries:
+                return []
+            low = 0 if start_date is None else bisect_left(entries, (_date_key(start_date),))
+            high = len(entries) if end_date is None else bisect_right(entries, (_date_key(end_date), float('inf')))
+            selected = entries[low:high]
+        return [{"TravelDate": key, "ScheduleID": schedule_id} for key, schedule_id in selected]
@@ -0,0 +1,205 @@
+import itertools
+import threading
+import time
+
+import mysql.connector
+from logger import logging
+
+
+class Replica:
+    """
+    One read replica: its connection pool and the health state kept by the ReplicaSet.
+    """
+    __slots__ = ("name", "pool", "healthy", "lag_seconds", "latency", "ejections", "ejected_reason")
+
+    def __init__(self, name, pool):
+        self.name = name
+        self.pool = pool
+        self.healthy = True
+        self.lag_seconds = 0
+        self.latency = None  # moving average of the health check round trip, in seconds
+        self.ejections = 0
+        self.ejected_reason = None
+
+
+class ReplicaSet:
+    STRATEGIES = ('round_robin', 'least_latency')
+
+    def __init__(self, replicas, strategy='round_robin', max_lag_seconds=5, check_interval=5.0,
+                 sticky_seconds=10, latency_smoothing=0.3):
+        """
+        Read replicas of the primary that ConnectDB writes to (its `pool`).
+
+        replicas         -- (name, pool.ConnectionPool) pairs, one per read replica.
+        strategy         -- 'round_robin' over the healthy replicas, or 'least_latency' to pick
+                            the one with the lowest health check round trip.
+        max_lag_seconds  -- replicas further behind the primary than this (or whose replication
+                            has stopped) are ejected until they catch up.
+        check_interval   -- seconds between replica health checks (lag and latency).
+        sticky_seconds   -- how long a session reads from the primary after it wrote, so it
+                            sees its own bookings before the replicas have applied them.
+
+        When no replica is healthy, reads fall back to the primary.
+        """
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown replica selection strategy: {strategy}")
+        self.replicas = [Replica(name, pool) for name, pool in replicas]
+        self.strategy = strategy
+        self.max_lag_seconds = max_lag_seconds
+        self.check_interval = check_interval
+        self.sticky_seconds = sticky_seconds
+        self.latency_smoothing = latency_smoothing
+        self._round_robin = itertools.count()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        # Read connections handed out, by destination
+        self.replica_checkouts = 0
+        self.primary_fallbacks = 0  # no healthy replica
+        self.sticky_reads = 0       # session reading its own writes
+
+    def start(self):
+        """
+        Starts the background health checker (a daemon thread). Idempotent.
+        """
+        if self.replicas and self._thread is None:
+            self._thread = threading.Thread(target=self._check_loop, name='db-replica-check', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _check_loop(self):
+        while not self._stop.is_set():
+            self.check_replicas()
+            self._stop.wait(self.check_interval)
+
+    def check_replicas(self):
+        for replica in self.replicas:
+            self._check(replica)
+
+    def _check(self, replica):
+        started = time.perf_counter()
+        connection = None
+        try:
+            connection = replica.pool.acquire()
+            lag = replication_lag(connection)
+        except Exception as e:
+            if connection is not None:
+                replica.pool.invalidate(connection)
+            self._eject(replica, f"health check failed: {e}")
+            return
+        replica.pool.release(connection)
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            if replica.latency is None:
+                replica.latency = elapsed
+            else:
+                replica.latency += self.latency_smoothing * (elapsed - replica.latency)
+            replica.lag_seconds = lag
+        if lag is None:
+            self._eject(replica, "replication is not running")
+        elif lag > self.max_lag_seconds:
+            self._eject(replica, f"{lag}s behind the primary")
+        elif not replica.healthy:
+            with self._lock:
+                replica.healthy = True
+                replica.ejected_reason = None
+            logging.info("Topology - replica %s is back in rotation (%ss behind).", replica.name, lag)
+
+    def _eject(self, replica, reason):
+        with self._lock:
+            was_healthy = replica.healthy
+            if was_healthy:
+                replica.ejections += 1
+            replica.healthy = False
+            replica.ejected_reason = reason
+        if was_healthy:
+            logging.warning("Topology - replica %s ejected: %s", replica.name, reason)
+
+    def mark_failed(self, name, error):
+        """
+        Ejects a replica a reader could not use; the next successful health check restores it.
+        """
+        for replica in self.replicas:
+            if replica.name == name:
+                self._eject(replica, f"connection failed: {error}")
+
+    def choose_replica(self):
+        """
+        Returns the Replica to read from, or None to read from the primary.
+        Health checks may lag behind a replica going down, so callers report connection
+        failures with mark_failed() and fall back to the primary.
+        """
+        with self._lock:
+            healthy = [replica for replica in self.replicas if replica.healthy]
+            if not healthy:
+                self.primary_fallbacks += 1
+                return None
+            self.replica_checkouts += 1
+            if self.strategy == 'least_latency':
+                return min(healthy, key=lambda replica: replica.latency if replica.latency is not None else 0.0)
+            return healthy[next(self._round_robin) % len(healthy)]
+
+    def note_sticky_read(self):
+        with self._lock:
+            self.sticky_reads += 1
+
+    def sticky_until(self):
+        """
+        Wall-clock time until which a session that just wrote should keep reading the primary.
+        """
+        return time.time() + self.sticky_seconds
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                "replicas": len(self.replicas),
+                "healthy_replicas": sum(1 for replica in self.replicas if replica.healthy),
+                "replica_checkouts": self.replica_checkouts,
+                "primary_fallbacks": self.primary_fallbacks,
+                "sticky_reads": self.sticky_reads,
+            }
+            for replica in self.replicas:
+                prefix = replica.name.replace('.', '_').replace(':', '_').replace('-', '_')
+                stats[f"{prefix}_healthy"] = int(replica.healthy)
+                stats[f"{prefix}_lag_seconds"] = replica.lag_seconds if replica.lag_seconds is not None else -1
+                stats[f"{prefix}_latency_ms"] = round(replica.latency * 1000, 3) if replica.latency is not None else 0.0
+                stats[f"{prefix}_ejections"] = replica.ejections
+            return stats
+
+
+def replication_lag(connection):
+    """
+    Seconds the server behind `connection` lags its source: 0 for a server that is not a
+    replica, None when replication is configured but not running.
+    """
+    cursor = connection.cursor(dictionary=True)
+    try:
+        try:
+            cursor.execute("SHOW REPLICA STATUS;")  # MySQL 8.0.22+
+            row = cursor.fetchone()
+        except mysql.connector.Error:
+            cursor.execute("SHOW SLAVE STATUS;")
+            row = cursor.fetchone()
+    finally:
+        cursor.close()
+    if not row:
+        return 0
+    lag = row.get('Seconds_Behind_Source', row.get('Seconds_Behind_Master'))
+    return int(lag) if lag is not None else None
+
+
+def parse_replicas(spec):
+    """
+    Parses 'host[:port],host[:port],...' (the DB_REPLICAS setting) into (name, host, port) triples.
+    """
+    replicas = []
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        host, _, port = item.partition(':')
+        replicas.append((item, host, int(port) if port else 3306))
+    return replicas